@@ -0,0 +1,121 @@
+"""Run the fxproc benchmarks.
+
+	python benchmarks/bench.py                          # recording device, prints a table
+	python benchmarks/bench.py -k draw --scale 0.1      # a quick subset
+	python benchmarks/bench.py --json results.json
+	python benchmarks/bench.py --save-baseline          # writes benchmarks/baseline.json
+	python benchmarks/bench.py --compare --tolerance 0.1
+	python benchmarks/bench.py --backend numpy --trace job.fxtrace
+
+By default benchmarks run against the recording stand-in device (see
+recording.py), which measures the Python side of every call and runs on
+headless Linux. --backend numpy or d3d9 runs them on a real backend.
+
+--trace adds a benchmark replaying a trace recorded with Effect.record(),
+to compare backends or optimizations on a captured production job.
+
+--compare exits with status 1 when any benchmark is slower than the
+baseline by more than the tolerance. Baselines are only meaningful on the
+machine and Python they were recorded with, so none is committed.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fxproc import registerBackend, setBackend
+from fxproc.effect import releaseResources
+from fxproc.trace import Replayer
+
+import harness
+import bench_calls
+import bench_chains
+
+registerBackend("recording", "recording:RecordingBackend")
+
+
+def traceBenchmark(file_name):
+	@harness.benchmark("replay " + os.path.basename(file_name), number=1, group="traces")
+	def replay():
+		replayer = Replayer(file_name, kernels=harness.KERNELS)
+
+		def run(n):
+			for i in range(n):
+				replayer.run()
+
+		return run
+
+
+def main():
+	parser = argparse.ArgumentParser(description="fxproc benchmarks")
+	parser.add_argument("--backend", default="recording", help="backend to run on (default: recording)")
+	parser.add_argument("-k", dest="filter", default=None, help="only run benchmarks whose name contains this")
+	parser.add_argument("--scale", type=float, default=1.0, help="multiply iteration counts by this")
+	parser.add_argument("--json", default=None, help="write results to this file")
+	parser.add_argument("--baseline", default=os.path.join(HERE, "baseline.json"), help="baseline file")
+	parser.add_argument("--save-baseline", action="store_true", help="write results to the baseline file")
+	parser.add_argument("--compare", action="store_true", help="compare results with the baseline file")
+	parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown for --compare (default: 0.15)")
+	parser.add_argument("--trace", action="append", default=[], help="also time replaying this trace file")
+	args = parser.parse_args()
+
+	setBackend(args.backend)
+
+	for file_name in args.trace:
+		traceBenchmark(file_name)
+
+	results = {}
+	for bench in harness.benchmarks:
+		if args.filter and args.filter not in bench.name:
+			continue
+
+		result = harness.measure(bench, args.scale)
+		result["group"] = bench.group
+		results[bench.name] = result
+		releaseResources()
+
+		print("%-32s %-7s %12.3f us %12.3f us  x%d" % (bench.name, bench.group, result["min_us"], result["median_us"], result["number"]))
+
+	report = {"environment": harness.environment(args.backend), "results": results}
+
+	if args.json:
+		with open(args.json, "w") as f:
+			json.dump(report, f, indent=2)
+
+	if args.save_baseline:
+		with open(args.baseline, "w") as f:
+			json.dump(report, f, indent=2)
+
+		print("baseline written to " + args.baseline)
+
+	if args.compare:
+		try:
+			with open(args.baseline) as f:
+				baseline = json.load(f)
+		except IOError:
+			print("ERROR: no baseline " '"%s"' ", run with --save-baseline first" % (args.baseline))
+			return 2
+
+		if baseline["environment"] != report["environment"]:
+			print("WARNING: baseline was recorded in another environment")
+
+		regressions = harness.compare(results, baseline["results"], args.tolerance)
+
+		for name, old, new, ratio in regressions:
+			print("REGRESSION %-32s %12.3f us -> %12.3f us (%+.0f%%)" % (name, old, new, (ratio - 1.0) * 100.0))
+
+		if regressions:
+			return 1
+
+		print("no regressions beyond %.0f%%" % (args.tolerance * 100.0))
+
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,149 @@
+"""Per-call overhead of the Effect API"""
+
+from fxproc import Effect, TexturePool, arrays
+
+from harness import benchmark, demoEffect
+
+
+def target(size=256):
+	out = Effect.createRenderTarget(size, size, "A8R8G8B8")
+	Effect.setRenderTarget(out)
+
+	return out
+
+
+@benchmark("setFloat", number=20000)
+def setFloat():
+	fx = demoEffect("filter_demo")
+
+	def run(n):
+		for i in range(n):
+			fx.setFloat("fScale", 0.5)
+
+	return run
+
+
+@benchmark("setFloat4", number=20000)
+def setFloat4():
+	fx = demoEffect("filter_demo")
+
+	def run(n):
+		for i in range(n):
+			fx.setFloat4("vColor", 1.0, 0.5, 0.25, 1.0)
+
+	return run
+
+
+@benchmark("setTexture", number=20000)
+def setTexture():
+	fx = demoEffect("filter_demo")
+	tex = Effect.createRenderTarget(64, 64, "A8R8G8B8")
+
+	def run(n):
+		for i in range(n):
+			fx.setTexture("baseMapTexture", tex)
+
+	return run
+
+
+@benchmark("params.update unchanged", number=20000)
+def paramsUnchanged():
+	fx = demoEffect("filter_demo")
+	tex = Effect.createRenderTarget(64, 64, "A8R8G8B8")
+	params = {"fScale": 0.5, "vColor": (1.0, 0.5, 0.25, 1.0), "baseMapTexture": tex}
+	fx.params.update(params)
+
+	def run(n):
+		for i in range(n):
+			fx.params.update(params)
+
+	return run
+
+
+@benchmark("drawQuad", number=20000)
+def drawQuad():
+	fx = demoEffect("tri_demo")
+	target()
+
+	def run(n):
+		for i in range(n):
+			fx.drawQuad("RasterizeQuad")
+
+	return run
+
+
+@benchmark("drawQuad batched", number=20000)
+def drawQuadBatched():
+	fx = demoEffect("tri_demo")
+	target()
+
+	def run(n):
+		with Effect.batch():
+			for i in range(n):
+				fx.drawQuad("RasterizeQuad")
+
+	return run
+
+
+def drawTrisBenchmark(tri_count, number):
+	@benchmark("drawTris %d" % (tri_count), number=number)
+	def drawTris():
+		fx = demoEffect("tri_demo")
+		target()
+		tris = arrays.trisArray(tri_count)
+
+		def run(n):
+			for i in range(n):
+				fx.drawTris(tris, "RasterizeTri")
+
+		return run
+
+
+for tri_count, number in ((1, 20000), (1000, 5000), (1000000, 50)):
+	drawTrisBenchmark(tri_count, number)
+
+
+@benchmark("drawTris createTris 1000", number=5000)
+def drawTrisCtypes():
+	fx = demoEffect("tri_demo")
+	target()
+	tris = Effect.createTris(1000)
+
+	def run(n):
+		for i in range(n):
+			fx.drawTris(tris, "RasterizeTri")
+
+	return run
+
+
+@benchmark("drawBuffer 1000", number=20000)
+def drawBuffer():
+	fx = demoEffect("tri_demo")
+	target()
+	vb = Effect.createVertexBuffer(arrays.trisArray(1000))
+
+	def run(n):
+		for i in range(n):
+			fx.drawBuffer(vb, "RasterizeTri")
+
+	return run
+
+
+@benchmark("createRenderTarget/release", number=5000)
+def renderTargetChurn():
+	def run(n):
+		for i in range(n):
+			Effect.createRenderTarget(256, 256, "A8R8G8B8").release()
+
+	return run
+
+
+@benchmark("TexturePool acquire/release", number=20000)
+def poolChurn():
+	pool = TexturePool()
+
+	def run(n):
+		for i in range(n):
+			pool.release(pool.acquire(256, 256, "A8R8G8B8"))
+
+	return run
@@ -0,0 +1,100 @@
+"""End-to-end pipelines modelled on the demos"""
+
+import numpy as np
+
+from fxproc import Effect, TexturePool
+from fxproc.graph import Graph
+from fxproc.tiling import TiledProcessor, techniqueChain
+
+from harness import benchmark, demoEffect, LENA
+
+
+@benchmark("filter_demo chain", number=20, group="chains")
+def filterDemoChain():
+	fx = demoEffect("filter_demo")
+
+	def run(n):
+		for i in range(n):
+			lena = Effect.loadTexture(LENA)
+			out = Effect.createRenderTarget(lena.width, lena.height, "A8R8G8B8")
+			out2 = Effect.createRenderTarget(lena.width, lena.height, "A8R8G8B8")
+
+			fx.setTexture("baseMapTexture", lena)
+			Effect.setRenderTarget(out)
+			fx.drawQuad("LowPass")
+
+			fx.setRenderTarget(out2)
+			fx.setTexture("baseMap2Texture", out)
+			fx.drawQuad("HighPass")
+			out2.toNumpy()
+
+			for texture in (lena, out, out2):
+				texture.release()
+
+	return run
+
+
+@benchmark("tri_demo frame", number=2000, group="chains")
+def triDemoFrame():
+	fx = demoEffect("tri_demo")
+	out = Effect.createRenderTarget(32, 32, "A8R8G8B8")
+	tris = Effect.createTris(2)
+
+	def run(n):
+		for i in range(n):
+			fx.setRenderTarget(out)
+			fx.drawQuad("RasterizeQuad")
+			fx.drawTris(tris, "RasterizeTri")
+
+	return run
+
+
+@benchmark("batch 1000 draws", number=20, group="chains")
+def batchedDraws():
+	fx = demoEffect("filter_demo")
+	pool = TexturePool()
+	targets = [pool.acquire(64, 64, "A8R8G8B8") for i in range(4)]
+
+	def run(n):
+		for i in range(n):
+			with Effect.batch():
+				for j in range(1000):
+					fx.setTexture("baseMapTexture", targets[j % 4])
+					Effect.setRenderTarget(targets[(j + 1) % 4])
+					fx.drawQuad("LowPass")
+
+	return run
+
+
+@benchmark("graph 40 nodes", number=50, group="chains")
+def graphChain():
+	fx = demoEffect("filter_demo")
+	source = Effect.createRenderTarget(64, 64, "A8R8G8B8")
+
+	graph = Graph()
+	node = graph.input("source")
+	for i in range(40):
+		node = graph.node(fx, "LowPass", {"baseMapTexture": node})
+
+	def run(n):
+		for i in range(n):
+			graph.invalidate()
+			graph.run({"source": source})
+
+	return run
+
+
+@benchmark("tiled 4096x4096 tiles 1024", number=5, group="chains")
+def tiledChain():
+	fx = demoEffect("filter_demo")
+	pool = TexturePool()
+	tiler = TiledProcessor(techniqueChain(fx, ["LowPass", "LowPass"], pool), tile_size=1024, apron=10, pool=pool)
+
+	source = np.zeros((4096, 4096, 4), np.uint8)
+	dest = np.zeros_like(source)
+
+	def run(n):
+		for i in range(n):
+			tiler.run(source, dest)
+
+	return run
@@ -0,0 +1,140 @@
+"""Benchmark registry, timing and baseline comparison.
+
+A benchmark is a setup function returning `run(n)`, which performs the
+measured operation n times:
+
+	@benchmark("setFloat4", number=20000)
+	def setFloat4():
+		fx = effect()
+		def run(n):
+			for i in range(n):
+				fx.setFloat4("vColor", 1.0, 0.5, 0.25, 1.0)
+		return run
+
+Each benchmark is run `repeat` times after a warm-up; the fastest run is
+the figure compared against baselines, being the least disturbed by the
+rest of the machine.
+"""
+
+import gc
+import os
+import sys
+import time
+import platform
+import statistics
+
+import fxproc
+from fxproc import Effect
+
+benchmarks = []
+
+
+class Benchmark :
+
+	def __init__(self, name, setup, number, repeat, group):
+		self.name = name
+		self.setup = setup
+		self.number = number
+		self.repeat = repeat
+		self.group = group
+
+
+def benchmark(name, number=1000, repeat=5, group="calls"):
+	def register(setup):
+		benchmarks.append(Benchmark(name, setup, number, repeat, group))
+		return setup
+
+	return register
+
+
+def measure(bench, scale=1.0):
+	"""{"number", "repeat", "min_us", "median_us"}, microseconds per operation"""
+	number = max(1, int(bench.number * scale))
+	run = bench.setup()
+
+	run(max(1, number // 10))
+
+	times = []
+	gc_enabled = gc.isenabled()
+	gc.disable()
+
+	try:
+		for i in range(bench.repeat):
+			start = time.perf_counter()
+			run(number)
+			times.append((time.perf_counter() - start) / number * 1e6)
+	finally:
+		if gc_enabled:
+			gc.enable()
+
+	return {"number": number, "repeat": bench.repeat, "min_us": min(times), "median_us": statistics.median(times)}
+
+
+def environment(backend_name):
+	return {
+		"python": sys.version.split()[0],
+		"implementation": platform.python_implementation(),
+		"platform": platform.platform(),
+		"machine": platform.machine(),
+		"fxproc": fxproc.__version__,
+		"backend": backend_name,
+		}
+
+
+def compare(results, baseline, tolerance):
+	"""[(name, baseline_us, current_us, ratio)] of the benchmarks more than
+`tolerance` (0.1 = 10%) slower than in `baseline`
+"""
+	regressions = []
+
+	for name, result in results.items():
+		old = baseline.get(name)
+		if old is None:
+			continue
+
+		ratio = result["min_us"] / old["min_us"] if old["min_us"] > 0 else 1.0
+		if ratio > 1.0 + tolerance:
+			regressions.append((name, old["min_us"], result["min_us"], ratio))
+
+	return regressions
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LENA = os.path.join(ROOT, "scripts", "filter_demo", "lena.jpg")
+
+
+def lowPass(ctx):
+	clr = 0.0
+	for y in range(-5, 6):
+		for x in range(-5, 6):
+			clr = clr + ctx.sample("baseMapTexture", ctx.tc + ctx.offsetPixel(x, y), "clamp")
+
+	clr = clr / 121.0
+	clr[..., 3] = 1.0
+	return clr
+
+
+def highPass(ctx):
+	clr = ctx.sample("baseMap2Texture", ctx.tc) - ctx.sample("baseMapTexture", ctx.tc) + 0.5
+	clr[..., 3] = 1.0
+	return clr
+
+
+# Kernels of the demo techniques, for backends that don't compile HLSL
+KERNELS = {
+	"LowPass": lowPass,
+	"HighPass": highPass,
+	"RasterizeQuad": lambda ctx: (0.0, 1.0, 0.0, 0.0),
+	"RasterizeTri": lambda ctx: (1.0, 0.0, 0.0, 0.0),
+	}
+
+
+def demoEffect(name):
+	"""Effect of scripts/<name>/<name>.fx"""
+	fx = Effect.open(os.path.join(ROOT, "scripts", name, name + ".fx"))
+
+	if not fx.backend.compiles_effects:
+		for technique_name, kernel in KERNELS.items():
+			fx.registerTechnique(technique_name, kernel)
+
+	return fx
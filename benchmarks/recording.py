@@ -0,0 +1,182 @@
+"""Recording stand-in device for benchmarks.
+
+RecordingBackend implements the whole Backend interface without drawing
+anything: every call is counted in `calls` and returns at once, so timings
+measure the Python side of fxproc (Effect, batching, argument packing)
+and nothing else. It runs anywhere, including headless Linux.
+
+	from fxproc import registerBackend, setBackend
+	registerBackend("recording", "recording:RecordingBackend")
+	setBackend("recording")
+"""
+
+from collections import Counter
+
+import numpy as np
+
+from fxproc import arrays
+from fxproc.backend import Backend
+
+
+class RecordedTexture :
+	__slots__ = ("kind", "format", "width", "height", "levels", "slices")
+
+	def __init__(self, kind, format_str, width, height, levels, slices):
+		self.kind = kind
+		self.format = format_str
+		self.width = width
+		self.height = height
+		self.levels = levels or int(np.log2(max(width, height))) + 1
+		self.slices = slices if kind == "volume" else 0
+
+
+class RecordedEffect :
+	__slots__ = ("name", "techniques")
+
+	def __init__(self, name):
+		self.name = name
+		self.techniques = {}
+
+
+class RecordingBackend(Backend):
+	name = "recording"
+	max_render_targets = 4
+
+	def __init__(self):
+		self.calls = Counter()
+		self.target_size = (0, 0)
+
+	def createTexture(self, kind, width, height, format_str, levels=1, slices=1):
+		self.calls["createTexture"] += 1
+		return RecordedTexture(kind, format_str, width, height, levels, slices)
+
+	def describeTexture(self, texture):
+		return texture.kind, texture.format, texture.width, texture.height, texture.levels, texture.slices
+
+	def releaseTexture(self, texture):
+		self.calls["releaseTexture"] += 1
+
+	def loadTexture(self, file_name, levels=0):
+		from PIL import Image
+
+		self.calls["loadTexture"] += 1
+
+		# Only the header is read, nothing is decoded
+		with Image.open(file_name) as image:
+			width, height = image.size
+
+		return RecordedTexture("2d", "A8R8G8B8", width, height, levels, 1)
+
+	def saveTexture(self, texture, file_name, file_format):
+		self.calls["saveTexture"] += 1
+
+	def loadTextureFromMemory(self, data, levels=0):
+		self.calls["loadTextureFromMemory"] += 1
+		return RecordedTexture("2d", "A8R8G8B8", 256, 256, levels, 1)
+
+	def saveTextureToMemory(self, texture, file_format):
+		self.calls["saveTextureToMemory"] += 1
+		return b""
+
+	def readTexture(self, texture, level=0, face=0, out=None):
+		self.calls["readTexture"] += 1
+
+		depth = max(1, texture.slices >> level) if texture.kind == "volume" else None
+		shape = arrays.pixelShape(texture.format, max(1, texture.width >> level), max(1, texture.height >> level), depth)
+		data = np.zeros(shape, arrays.layout(texture.format)[0])
+
+		return data if out is None else arrays.copyInto(data, out)
+
+	def writeTexture(self, texture, array, level=0, face=0):
+		self.calls["writeTexture"] += 1
+
+	def createTextureFromArray(self, kind, array, format_str, levels=1):
+		self.calls["createTextureFromArray"] += 1
+		kind, width, height, slices = arrays.imageShape(array, format_str, kind)
+
+		return RecordedTexture(kind, format_str, width, height, levels, slices)
+
+	def copyLevel(self, src, src_level, src_face, dst, dst_level, dst_face, filter="linear"):
+		self.calls["copyLevel"] += 1
+
+	def copyLevelToVolumeSlice(self, src, src_level, src_face, volume, slice_index, volume_level=0):
+		self.calls["copyLevelToVolumeSlice"] += 1
+
+	def openEffect(self, file_name, defines=None, optimize=False):
+		self.calls["openEffect"] += 1
+		return RecordedEffect(file_name)
+
+	def createEffect(self, text, defines=None, optimize=False):
+		self.calls["createEffect"] += 1
+		return RecordedEffect("<string>")
+
+	def releaseEffect(self, effect):
+		self.calls["releaseEffect"] += 1
+
+	def registerTechnique(self, effect, technique_name, kernel):
+		effect.techniques[technique_name] = kernel
+
+	def setRenderTarget(self, texture, level=0, face=0):
+		self.calls["setRenderTarget"] += 1
+		self.target_size = (max(1, texture.width >> level), max(1, texture.height >> level))
+
+		return self.target_size
+
+	def setRenderTargets(self, textures, level=0, face=0):
+		self.calls["setRenderTargets"] += 1
+		self.target_size = (max(1, textures[0].width >> level), max(1, textures[0].height >> level))
+
+		return self.target_size
+
+	def clear(self, r, g, b, a):
+		self.calls["clear"] += 1
+
+	def drawQuad(self, effect, technique_name, do_flush=True):
+		self.calls["drawQuad"] += 1
+
+	def drawTris(self, effect, tri_list, technique_name, do_flush=True):
+		self.calls["drawTris"] += 1
+
+	def drawBuffer(self, effect, vertex_buffer, vertex_count, index_buffer, first, tri_count, technique_name, do_flush=True):
+		self.calls["drawBuffer"] += 1
+
+	def createVertexBuffer(self, data, vertex_count, dynamic=False):
+		self.calls["createVertexBuffer"] += 1
+		return object()
+
+	def updateVertexBuffer(self, handle, data, vertex_count, dynamic=False):
+		self.calls["updateVertexBuffer"] += 1
+
+	def createIndexBuffer(self, data, index_count, index_size, dynamic=False):
+		self.calls["createIndexBuffer"] += 1
+		return object()
+
+	def updateIndexBuffer(self, handle, data, index_count, index_size, dynamic=False):
+		self.calls["updateIndexBuffer"] += 1
+
+	def releaseBuffer(self, handle):
+		self.calls["releaseBuffer"] += 1
+
+	def flush(self):
+		self.calls["flush"] += 1
+
+	def setFloat(self, effect, name, x):
+		self.calls["setFloat"] += 1
+
+	def setInt(self, effect, name, x):
+		self.calls["setInt"] += 1
+
+	def setVector(self, effect, name, x, y, z, w):
+		self.calls["setVector"] += 1
+
+	def setFloatArray(self, effect, name, floats, count):
+		self.calls["setFloatArray"] += 1
+
+	def setVectorArray(self, effect, name, floats, count):
+		self.calls["setVectorArray"] += 1
+
+	def setMatrix(self, effect, name, floats):
+		self.calls["setMatrix"] += 1
+
+	def setTexture(self, effect, name, texture):
+		self.calls["setTexture"] += 1
@@ -0,0 +1,13 @@
+"""fxproc @ https://github.com/coderand/pyfxproc
+Direct3D .fx file interface for GPU based data processing.
+Created by Dmitry "AND" Andreev 2013-2021.
+License Creative Commons Zero v1.0 Universal.
+"""
+
+__version__ = '0.1.9'
+__all__ = ["Effect", "Texture", "VertexBuffer", "IndexBuffer", "TexturePool", "liveResources", "Device", "Backend", "setBackend", "getBackend", "registerBackend"]
+
+from .d3dtypes import D3DFORMAT, D3DXIMAGE_FILEFORMAT, TRI_VTX, QUAD_VTX
+from .backend import Backend, Device, setBackend, getBackend, registerBackend
+from .effect import Effect, Texture, VertexBuffer, IndexBuffer, liveResources
+from .pool import TexturePool
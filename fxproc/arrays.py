@@ -0,0 +1,142 @@
+"""Conversions between texture data and NumPy arrays.
+
+Arrays use the raw memory layout of their D3DFORMAT (see
+D3DFORMAT_LAYOUT): an A8R8G8B8 level is an (h, w, 4) uint8 array in
+B, G, R, A order, an R32F level is an (h, w) float32 array. Volumes get
+an extra leading depth axis.
+"""
+
+import ctypes
+
+import numpy as np
+
+from .d3dtypes import D3DFORMAT_LAYOUT
+
+CHANNEL_INDEX = {"r": 0, "g": 1, "b": 2, "a": 3, "l": 0, "x": 3}
+
+# One TRI_VTX vertex; an (n, 3) array of these has the layout of TRI_VTX * n
+VERTEX_DTYPE = np.dtype([("x", "<f4"), ("y", "<f4"), ("z", "<f4"), ("w", "<f4"), ("u", "<f4"), ("v", "<f4")])
+
+
+def trisArray(tri_count):
+	"""Zeroed (tri_count, 3) VERTEX_DTYPE array for Effect.drawTris/createVertexBuffer"""
+	tris = np.zeros((tri_count, 3), VERTEX_DTYPE)
+	tris["w"] = 1.0
+
+	return tris
+
+
+def layout(format_str):
+	try:
+		dtype, channels = D3DFORMAT_LAYOUT[format_str]
+	except KeyError:
+		raise TypeError('Format "%s" has no NumPy layout' % (format_str))
+
+	return np.dtype(dtype), channels
+
+
+def pixelShape(format_str, width, height, depth=None):
+	channels = layout(format_str)[1]
+	shape = (height, width) if len(channels) == 1 else (height, width, len(channels))
+
+	return shape if depth is None else (depth,) + shape
+
+
+def imageShape(array, format_str, kind=None):
+	"""(kind, width, height, slices) of the texture `array` describes"""
+	dtype, channels = layout(format_str)
+	image_ndim = 2 if len(channels) == 1 else 3
+	array = np.asarray(array)
+
+	if array.ndim == image_ndim:
+		kind = kind or "2d"
+	elif array.ndim != image_ndim + 1 or kind == "2d":
+		raise ValueError("Array of shape %r does not match format %s" % (array.shape, format_str))
+	elif kind is None:
+		kind = "volume"
+
+	if image_ndim == 3 and array.shape[-1] != len(channels):
+		raise ValueError("Format %s needs %d channels, got %d" % (format_str, len(channels), array.shape[-1]))
+
+	if kind == "cube" and (array.ndim != image_ndim + 1 or array.shape[0] != 6):
+		raise ValueError("Cube textures need an array of 6 faces")
+
+	offset = array.ndim - image_ndim
+	height, width = array.shape[offset:offset + 2]
+	slices = array.shape[0] if kind == "volume" else 1
+
+	return kind, width, height, slices
+
+
+def fromRgba(format_str, rgba):
+	"""Pack float RGBA values (..., 4) into the raw layout of `format_str`"""
+	dtype, channels = layout(format_str)
+	rgba = np.asarray(rgba, dtype=np.float32)
+
+	data = np.stack([rgba[..., CHANNEL_INDEX[c]] for c in channels], axis=-1)
+
+	if "x" in channels:
+		data[..., channels.index("x")] = 1.0
+
+	if dtype.kind == "u":
+		scale = float(np.iinfo(dtype).max)
+		data = np.round(np.clip(data, 0.0, 1.0) * scale)
+
+	data = data.astype(dtype)
+
+	return data[..., 0] if len(channels) == 1 else data
+
+
+def toRgba(format_str, data):
+	"""Unpack raw `format_str` pixels into float RGBA values (..., 4)"""
+	dtype, channels = layout(format_str)
+	data = np.asarray(data)
+
+	if len(channels) == 1:
+		data = data[..., None]
+
+	value = data.astype(np.float32)
+	if dtype.kind == "u":
+		value /= float(np.iinfo(dtype).max)
+
+	rgba = np.empty(value.shape[:-1] + (4,), np.float32)
+	rgba[...] = (0, 0, 0, 1) if channels == "a" else (1, 1, 1, 1)
+
+	for i, c in enumerate(channels):
+		if c == "l":
+			rgba[..., 0] = rgba[..., 1] = rgba[..., 2] = value[..., i]
+		elif c != "x":
+			rgba[..., "rgba".index(c)] = value[..., i]
+
+	return rgba
+
+
+def copyInto(data, out=None):
+	"""Copy of `data`, written into `out` when it is given"""
+	if out is None:
+		return data.copy()
+
+	if out.shape != data.shape:
+		raise ValueError("Can't copy a level of shape %r into an array of shape %r" % (data.shape, out.shape))
+
+	out[...] = data
+	return out
+
+
+def pitchedView(address, format_str, width, height, pitch, depth=None, slice_pitch=0):
+	"""Array view of locked texture memory with the given row/slice pitch"""
+	dtype, channels = layout(format_str)
+	shape = pixelShape(format_str, width, height, depth)
+
+	strides = (pitch, dtype.itemsize * len(channels))
+	if len(channels) > 1:
+		strides += (dtype.itemsize,)
+
+	size = pitch * height
+	if depth is not None:
+		strides = (slice_pitch,) + strides
+		size = slice_pitch * depth
+
+	buffer = (ctypes.c_char * size).from_address(address)
+
+	return np.ndarray(shape, dtype, buffer=buffer, strides=strides)
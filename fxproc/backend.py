@@ -0,0 +1,403 @@
+"""Backend interface used by Effect and Texture.
+
+A backend owns the device and implements the raw operations behind the
+Effect API. Texture and effect handles are opaque to the rest of fxproc:
+the Direct3D9 backend hands out COM pointers, the NumPy backend hands out
+plain Python objects.
+"""
+
+import os
+import sys
+import time
+import atexit
+import importlib
+
+
+class Backend :
+	"""Operations every backend implements
+
+- createTexture     ( kind, width, height, format_str, levels, slices )
+- describeTexture   ( handle ) -> ( kind, format_str, width, height, levels, slices )
+- releaseTexture    ( handle )
+- loadTexture       ( file_name, levels )
+- saveTexture       ( handle, file_name, file_format )
+- loadTextureFromMemory ( data, levels )
+- saveTextureToMemory   ( handle, file_format ) -> bytes
+- readTexture       ( handle, level, face, out ) -> ndarray
+- writeTexture      ( handle, array, level, face )
+- createTextureFromArray ( kind, array, format_str, levels ) -> handle
+- copyLevel         ( src, src_level, src_face, dst, dst_level, dst_face, filter )
+
+- openEffect        ( file_name, defines, optimize )
+- createEffect      ( text, defines, optimize )
+- compileEffect     ( source, file_name, defines, optimize ) -> bytes
+- loadCompiledEffect ( blob )
+- releaseEffect     ( handle )
+- registerTechnique ( effect, technique_name, kernel )
+- techniqueKey      ( effect, technique_name ) -> str
+
+- setRenderTarget   ( handle, level, face ) -> ( width, height )
+- setRenderTargets  ( handles, level, face ) -> ( width, height )
+- clear             ( r_byte, g_byte, b_byte, a_byte )
+- drawQuad          ( effect, technique_name, do_flush )
+- drawTris          ( effect, tri_list, technique_name, do_flush )
+- drawBuffer        ( effect, vertex_buffer, vertex_count, index_buffer, first, tri_count, technique_name, do_flush )
+- endScene          ()
+- flush             ()
+- submit            ( commands ) -> removed_state_changes
+- run               ( method_name, args )
+
+- issueFence        () -> fence
+- fenceDone         ( fence ) -> bool
+- releaseFence      ( fence )
+
+- beginTiming       () -> token
+- timestamp         () -> stamp
+- endTiming         ( token, stamps ) -> seconds or None
+
+- createVertexBuffer ( data, vertex_count, dynamic ) -> handle
+- updateVertexBuffer ( handle, data, vertex_count, dynamic )
+- createIndexBuffer ( data, index_count, index_size, dynamic ) -> handle
+- updateIndexBuffer ( handle, data, index_count, index_size, dynamic )
+- releaseBuffer     ( handle )
+
+- setFloat          ( effect, name, x )
+- setInt            ( effect, name, x )
+- setVector         ( effect, name, x, y, z, w )
+- setFloatArray     ( effect, name, floats, count )
+- setVectorArray    ( effect, name, floats, count )
+- setMatrix         ( effect, name, floats )
+- setTexture        ( effect, name, texture_handle )
+
+- cleanup           ()
+
+setRenderTargets binds up to `max_render_targets` targets of one size to
+COLOR0.. outputs and unbinds the slots a previous call left bound. Clears
+apply to every bound target.
+
+Texture kinds are "2d", "cube" and "volume". Vertex data is a TRI_VTX
+compatible buffer, 6 float32 per vertex, index data holds 2 or 4 byte
+unsigned indices. Array setters take a
+contiguous float32 buffer: `count` floats, `count` float4 vectors, or
+16 floats of a row-major 4x4 matrix.
+
+Setting a parameter the effect does not declare is not an error. The D3D9
+backend skips it and the NumPy backend stores it for technique kernels,
+which read only the names they know.
+"""
+
+	name = None
+	batch = None
+	profiler = None
+	recorder = None
+
+	# Most triangles one draw call may take, None when unlimited
+	max_primitives = None
+
+	# Targets one draw can write, see setRenderTargets
+	max_render_targets = 1
+
+	def createTexture(self, kind, width, height, format_str, levels=1, slices=1):
+		raise NotImplementedError
+
+	def describeTexture(self, handle):
+		raise NotImplementedError
+
+	def releaseTexture(self, handle):
+		raise NotImplementedError
+
+	def loadTexture(self, file_name, levels=0):
+		raise NotImplementedError
+
+	def saveTexture(self, handle, file_name, file_format):
+		raise NotImplementedError
+
+	def loadTextureFromMemory(self, data, levels=0):
+		raise NotImplementedError
+
+	def saveTextureToMemory(self, handle, file_format):
+		raise NotImplementedError
+
+	def readTexture(self, handle, level=0, face=0, out=None):
+		raise NotImplementedError
+
+	def writeTexture(self, handle, array, level=0, face=0):
+		raise NotImplementedError
+
+	def createTextureFromArray(self, kind, array, format_str, levels=1):
+		raise NotImplementedError
+
+	def copyLevel(self, src, src_level, src_face, dst, dst_level, dst_face, filter="linear"):
+		"""Scaled copy between render target levels (or cube faces), on the device"""
+		raise NotImplementedError
+
+	def copyLevelToVolumeSlice(self, src, src_level, src_face, volume, slice_index, volume_level=0):
+		"""Copy a render target level into one slice of a volume level of the same size and format"""
+		raise NotImplementedError
+
+	def openEffect(self, file_name, defines=None, optimize=False):
+		raise NotImplementedError
+
+	def createEffect(self, text, defines=None, optimize=False):
+		raise NotImplementedError
+
+	# Backends that compile effect source to a binary set compiles_effects
+	# and get their effects through compileEffect/loadCompiledEffect, so
+	# fxproc.effect_cache can store the binaries.
+	compiles_effects = False
+
+	def compilerId(self):
+		return self.name
+
+	def compileFlags(self, optimize=False):
+		return 0
+
+	def compileEffect(self, source, file_name=None, defines=None, optimize=False):
+		raise NotImplementedError
+
+	def loadCompiledEffect(self, blob):
+		raise NotImplementedError
+
+	def releaseEffect(self, handle):
+		raise NotImplementedError
+
+	def registerTechnique(self, effect, technique_name, kernel):
+		raise NotImplementedError("Backend %r compiles techniques from the effect source" % (self.name))
+
+	def techniqueKey(self, effect, technique_name):
+		"""What a technique depends on beyond the effect source, as a string"""
+		return ""
+
+	def setRenderTarget(self, handle, level=0, face=0):
+		raise NotImplementedError
+
+	def setRenderTargets(self, handles, level=0, face=0):
+		if len(handles) != 1:
+			raise NotImplementedError("Backend %r has no multiple render targets" % (self.name))
+
+		return self.setRenderTarget(handles[0], level, face)
+
+	def clear(self, r, g, b, a):
+		raise NotImplementedError
+
+	def drawQuad(self, effect, technique_name, do_flush=True):
+		raise NotImplementedError
+
+	def drawTris(self, effect, tri_list, technique_name, do_flush=True):
+		raise NotImplementedError
+
+	def drawBuffer(self, effect, vertex_buffer, vertex_count, index_buffer, first, tri_count, technique_name, do_flush=True):
+		raise NotImplementedError
+
+	def createVertexBuffer(self, data, vertex_count, dynamic=False):
+		raise NotImplementedError
+
+	def updateVertexBuffer(self, handle, data, vertex_count, dynamic=False):
+		raise NotImplementedError
+
+	def createIndexBuffer(self, data, index_count, index_size, dynamic=False):
+		raise NotImplementedError
+
+	def updateIndexBuffer(self, handle, data, index_count, index_size, dynamic=False):
+		raise NotImplementedError
+
+	def releaseBuffer(self, handle):
+		raise NotImplementedError
+
+	def endScene(self):
+		pass
+
+	def flush(self):
+		pass
+
+	def submit(self, commands):
+		"""Run recorded (method_name, args) commands with one flush at the end.
+Returns the number of redundant device state changes skipped.
+"""
+		for method, args in commands:
+			self.run(method, args)
+
+		self.run("flush", ())
+		return 0
+
+	def run(self, method, args):
+		"""Call one command, through the attached profiler if there is one"""
+		if self.profiler is not None:
+			return self.profiler.call(self, method, args)
+
+		return getattr(self, method)(*args)
+
+	# Completion fences, see fxproc.fence. Synchronous backends are done
+	# as soon as a call returns and have no fence to poll.
+	def issueFence(self):
+		return None
+
+	def fenceDone(self, fence):
+		return True
+
+	def releaseFence(self, fence):
+		pass
+
+	# GPU timestamps, see fxproc.profiler. Backends that draw synchronously
+	# on the CPU keep these defaults.
+	def beginTiming(self):
+		return None
+
+	def timestamp(self):
+		return time.perf_counter()
+
+	def endTiming(self, token, stamps):
+		"""Seconds of each stamp on a common clock, None if the clock was unreliable"""
+		return list(stamps)
+
+	def setFloat(self, effect, name, x):
+		raise NotImplementedError
+
+	def setInt(self, effect, name, x):
+		raise NotImplementedError
+
+	def setVector(self, effect, name, x, y, z, w):
+		raise NotImplementedError
+
+	def setFloatArray(self, effect, name, floats, count):
+		raise NotImplementedError
+
+	def setVectorArray(self, effect, name, floats, count):
+		raise NotImplementedError
+
+	def setMatrix(self, effect, name, floats):
+		raise NotImplementedError
+
+	def setTexture(self, effect, name, texture_handle):
+		raise NotImplementedError
+
+	def cleanup(self):
+		pass
+
+
+backend_factories = {
+	"d3d9": "fxproc.d3d9:D3D9Backend",
+	"numpy": "fxproc.numpy_backend:NumpyBackend",
+	}
+
+
+def registerBackend(name, factory):
+	"""Make a backend available to setBackend() under `name`.
+`factory` is a callable returning a Backend, or a "module:attribute" string.
+"""
+	backend_factories[name] = factory
+
+
+def defaultBackendName():
+	name = os.environ.get("FXPROC_BACKEND")
+	if name:
+		return name
+
+	return "d3d9" if sys.platform == "win32" else "numpy"
+
+
+def createBackend(name=None, **options):
+	name = name or defaultBackendName()
+
+	try:
+		factory = backend_factories[name]
+	except KeyError:
+		raise ValueError('Unknown backend "%s"' % (name))
+
+	if isinstance(factory, str):
+		module_name, attr = factory.split(":")
+		factory = getattr(importlib.import_module(module_name), attr)
+
+	return factory(**options)
+
+
+class Device :
+	"""A rendering device, created on first use or explicitly
+
+	device = Device("d3d9")   # nothing is loaded yet
+	device.create()           # probe DLLs and create the device now
+	device.makeCurrent()      # used by Effect and Texture from now on
+
+Device.current() is created on first use from FXPROC_BACKEND or the
+platform default, so importing fxproc never touches a DLL. Extra keyword
+options are passed to the backend constructor.
+"""
+
+	_current = None
+	created_devices = []
+
+	def __init__(self, backend=None, **options):
+		self.options = options
+		self._backend = None
+
+		if isinstance(backend, Backend):
+			self._backend = backend
+			self.backend_name = backend.name
+			Device.created_devices.append(self)
+			_registerCleanup()
+		else:
+			self.backend_name = backend or defaultBackendName()
+
+	@property
+	def backend(self):
+		return self.create()
+
+	@property
+	def created(self):
+		return self._backend is not None
+
+	def create(self):
+		if self._backend is None:
+			self._backend = createBackend(self.backend_name, **self.options)
+			Device.created_devices.append(self)
+			_registerCleanup()
+
+		return self._backend
+
+	def release(self):
+		"""Release the textures and effects created on this device, then destroy it"""
+		if self._backend is not None:
+			from .effect import releaseResources
+			releaseResources(self._backend)
+
+			self._backend.cleanup()
+			self._backend = None
+			Device.created_devices.remove(self)
+
+	def makeCurrent(self):
+		Device._current = self
+		return self
+
+	@staticmethod
+	def current():
+		if Device._current is None:
+			Device._current = Device()
+
+		return Device._current
+
+
+_cleanup_registered = False
+
+def _registerCleanup():
+	global _cleanup_registered
+
+	if not _cleanup_registered:
+		from .effect import _cleanup
+		atexit.register(_cleanup)
+		_cleanup_registered = True
+
+
+def setBackend(backend, **options):
+	"""Select the backend used by Effect and Texture, by name or instance"""
+	return Device(backend, **options).makeCurrent().backend
+
+
+def getBackend():
+	"""Backend of the current device, created on first use"""
+	return Device.current().backend
+
+
+def currentBackend():
+	"""Backend of the current device or None when nothing has been created yet"""
+	device = Device._current
+	return device._backend if device is not None else None
@@ -0,0 +1,137 @@
+"""Batched submission of Effect calls.
+
+	with fx.batch() as batch:
+		fx.setRenderTarget(out)
+		fx.drawQuad("LowPass")
+		fx.setRenderTarget(out2)
+		fx.setTexture("baseMap2Texture", out)
+		fx.drawQuad("HighPass")
+
+	print(batch.removed, "state changes removed")
+
+While a batch is active, setRenderTarget(s)/clear/set*/draw calls on the
+backend are recorded instead of executed. On exit they are submitted in
+one scene with a single flush at the end. Redundant parameter and render
+target changes are dropped before submission, and the backend skips
+repeated SetFVF/SetTechnique/vTargetSize calls while it replays them.
+Calls that need results (saveTexture, toNumpy, flush) submit what has
+been recorded so far and keep the batch open. batch.submit() does the same
+and returns a fxproc.fence.Fence to wait on.
+"""
+
+from .fence import Fence
+
+PARAM_SETTERS = ("setFloat", "setInt", "setVector", "setFloatArray", "setVectorArray", "setMatrix", "setTexture")
+TARGET_SETTERS = ("setRenderTarget", "setRenderTargets")
+DRAW_CALLS = ("drawQuad", "drawTris", "drawBuffer", "clear", "copyLevel", "copyLevelToVolumeSlice")
+
+
+class Batch :
+
+	def __init__(self, backend):
+		self.backend = backend
+		self.commands = []
+		self.refs = []
+		self.params = {}
+		self.target = None
+
+		self.recorded = 0
+		self.submitted = 0
+		self.removed = 0
+		self.submits = 0
+
+	def __enter__(self):
+		if self.backend.batch is not None:
+			raise RuntimeError("A batch is already active on this device")
+
+		self.backend.batch = self
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.backend.batch = None
+
+		try:
+			if exc_type is None:
+				self.submit()
+		finally:
+			self.commands = []
+			self.refs = []
+
+	def __str__(self):
+		return (
+			"recorded=" + str(self.recorded) +
+			" submitted=" + str(self.submitted) +
+			" removed=" + str(self.removed) +
+			" submits=" + str(self.submits)
+			)
+
+	def record(self, method, args, refs=()):
+		"""Queue backend.method(*args); `refs` are kept alive until the batch ends"""
+		self.commands.append((method, args))
+		self.refs.extend(refs)
+		self.recorded += 1
+
+	def submit(self):
+		"""Replay the recorded commands; returns a Fence for their completion"""
+		if self.commands:
+			commands = self.__collapse(self.commands)
+			self.commands = []
+
+			self.removed += self.backend.submit(commands) or 0
+
+			self.submitted += len(commands)
+			self.submits += 1
+
+		return Fence(self.backend)
+
+	def __collapse(self, commands):
+		out = []
+		pending = {}
+		pending_target = None
+
+		for method, args in commands:
+			if method in PARAM_SETTERS:
+				key = (id(args[0]), args[1])
+				value = args[2:]
+
+				if key in self.params and self.__same(self.params[key], value):
+					self.removed += 1
+					continue
+
+				# Overwritten before any draw used it
+				if key in pending:
+					out[pending[key]] = None
+					self.removed += 1
+
+				self.params[key] = value
+				pending[key] = len(out)
+
+			elif method in TARGET_SETTERS:
+				handles = args[0] if method == "setRenderTargets" else (args[0],)
+				key = (tuple(map(id, handles)), args[1], args[2])
+
+				if key == self.target:
+					self.removed += 1
+					continue
+
+				if pending_target is not None:
+					out[pending_target] = None
+					self.removed += 1
+
+				self.target = key
+				pending_target = len(out)
+
+			elif method in DRAW_CALLS:
+				pending = {}
+				pending_target = None
+
+			out.append((method, args))
+
+		return [c for c in out if c is not None]
+
+	@staticmethod
+	def __same(a, b):
+		if len(a) != len(b):
+			return False
+
+		return all(x is y or (type(x) is type(y) and isinstance(x, (int, float, str)) and x == y) for x, y in zip(a, b))
@@ -0,0 +1,1250 @@
+"""Direct3D9 backend: ctypes bindings to d3d9.dll and d3dx9_*.dll.
+Nothing is loaded at import time; the DLLs are probed once per process
+when the first D3D9Backend is created.
+"""
+
+import os
+import sys
+import time
+import ctypes
+
+from ctypes import WINFUNCTYPE
+from ctypes.wintypes import *
+
+from .d3dtypes import *
+from .backend import Backend
+
+HRESULT = DWORD
+
+# D3D9 Function Prototypes
+COM_Release = WINFUNCTYPE(UINT)(2, "COM_Release")
+D3D9_GetAdapterCount = WINFUNCTYPE(UINT)(4, "D3D9_GetAdapterCount")
+D3D9_CreateDevice = WINFUNCTYPE(HRESULT, UINT, UINT, HWND, DWORD, LPVOID, LPVOID)(16, "D3D9_CreateDevice")
+IDirect3DDevice9_GetDeviceCaps = WINFUNCTYPE(HRESULT, LPVOID)(7, "IDirect3DDevice9_GetDeviceCaps")
+IDirect3DDevice9_CreateTexture = WINFUNCTYPE(HRESULT, UINT, UINT, UINT, DWORD, UINT, UINT, LPVOID, LPVOID)(23, "IDirect3DDevice9_CreateTexture")
+IDirect3DDevice9_CreateVolumeTexture = WINFUNCTYPE(HRESULT, UINT, UINT, UINT, UINT, DWORD, UINT, UINT, LPVOID, LPVOID)(24, "IDirect3DDevice9_CreateVolumeTexture")
+IDirect3DDevice9_CreateCubeTexture = WINFUNCTYPE(HRESULT, UINT, UINT, DWORD, UINT, UINT, LPVOID, LPVOID)(25, "IDirect3DDevice9_CreateCubeTexture")
+IDirect3DDevice9_CreateVertexBuffer = WINFUNCTYPE(HRESULT, UINT, DWORD, DWORD, UINT, LPVOID, LPVOID)(26, "IDirect3DDevice9_CreateVertexBuffer")
+IDirect3DDevice9_CreateIndexBuffer = WINFUNCTYPE(HRESULT, UINT, DWORD, UINT, UINT, LPVOID, LPVOID)(27, "IDirect3DDevice9_CreateIndexBuffer")
+IDirect3DDevice9_UpdateSurface = WINFUNCTYPE(HRESULT, LPVOID, LPVOID, LPVOID, LPVOID)(30, "IDirect3DDevice9_UpdateSurface")
+IDirect3DDevice9_GetRenderTargetData = WINFUNCTYPE(HRESULT, LPVOID, LPVOID)(32, "IDirect3DDevice9_GetRenderTargetData")
+IDirect3DDevice9_StretchRect = WINFUNCTYPE(HRESULT, LPVOID, LPVOID, LPVOID, LPVOID, UINT)(34, "IDirect3DDevice9_StretchRect")
+IDirect3DDevice9_CreateOffscreenPlainSurface = WINFUNCTYPE(HRESULT, UINT, UINT, UINT, UINT, LPVOID, LPVOID)(36, "IDirect3DDevice9_CreateOffscreenPlainSurface")
+IDirect3DDevice9_SetRenderTarget = WINFUNCTYPE(HRESULT, DWORD, LPVOID)(37, "IDirect3DDevice9_SetRenderTarget")
+IDirect3DDevice9_GetRenderTarget = WINFUNCTYPE(HRESULT, DWORD, LPVOID)(38, "IDirect3DDevice9_GetRenderTarget")
+IDirect3DDevice9_BeginScene = WINFUNCTYPE(HRESULT)(41, "IDirect3DDevice9_BeginScene")
+IDirect3DDevice9_EndScene = WINFUNCTYPE(HRESULT)(42, "IDirect3DDevice9_EndScene")
+IDirect3DDevice9_Clear = WINFUNCTYPE(HRESULT, DWORD, LPVOID, DWORD, DWORD, FLOAT, DWORD)(43, "IDirect3DDevice9_Clear")
+IDirect3DDevice9_DrawPrimitive = WINFUNCTYPE(HRESULT, UINT, UINT, UINT)(81, "IDirect3DDevice9_DrawPrimitive")
+IDirect3DDevice9_DrawIndexedPrimitive = WINFUNCTYPE(HRESULT, UINT, INT, UINT, UINT, UINT, UINT)(82, "IDirect3DDevice9_DrawIndexedPrimitive")
+IDirect3DDevice9_DrawPrimitiveUP = WINFUNCTYPE(HRESULT, UINT, UINT, LPVOID, UINT)(83, "IDirect3DDevice9_DrawPrimitiveUP")
+IDirect3DDevice9_SetFVF = WINFUNCTYPE(HRESULT, DWORD)(89, "IDirect3DDevice9_SetFVF")
+IDirect3DDevice9_SetStreamSource = WINFUNCTYPE(HRESULT, UINT, LPVOID, UINT, UINT)(100, "IDirect3DDevice9_SetStreamSource")
+IDirect3DDevice9_SetIndices = WINFUNCTYPE(HRESULT, LPVOID)(104, "IDirect3DDevice9_SetIndices")
+IDirect3DDevice9_CreateQuery = WINFUNCTYPE(HRESULT, DWORD, LPVOID)(118, "IDirect3DDevice9_CreateQuery")
+IDirect3DQuery9_Issue = WINFUNCTYPE(HRESULT, DWORD)(6, "IDirect3DQuery9_Issue")
+IDirect3DQuery9_GetData = WINFUNCTYPE(HRESULT, LPVOID, DWORD, DWORD)(7, "IDirect3DQuery9_GetData")
+Direct3DBaseTexture9_GetType = WINFUNCTYPE(DWORD)(10, "Direct3DBaseTexture9_GetType")
+Direct3DBaseTexture9_GetLevelCount = WINFUNCTYPE(DWORD)(13, "Direct3DBaseTexture9_GetLevelCount")
+IDirect3DTexture9_GetLevelDesc = WINFUNCTYPE(DWORD, UINT, LPVOID)(17, "IDirect3DTexture9_GetLevelDesc")
+IDirect3DTexture9_GetSurfaceLevel = WINFUNCTYPE(DWORD, UINT, LPVOID)(18, "IDirect3DTexture9_GetSurfaceLevel")
+IDirect3DTexture9_LockRect = WINFUNCTYPE(DWORD, UINT, LPVOID, LPVOID, DWORD)(19, "IDirect3DTexture9_LockRect")
+IDirect3DTexture9_UnlockRect = WINFUNCTYPE(DWORD, UINT)(20, "IDirect3DTexture9_UnlockRect")
+IDirect3DCubeTexture9_GetLevelDesc = WINFUNCTYPE(DWORD, UINT, LPVOID)(17, "IDirect3DCubeTexture9_GetLevelDesc")
+IDirect3DCubeTexture9_GetCubeMapSurface = WINFUNCTYPE(DWORD, UINT, UINT, LPVOID)(18, "IDirect3DCubeTexture9_GetCubeMapSurface")
+IDirect3DCubeTexture9_LockRect = WINFUNCTYPE(DWORD, UINT, UINT, LPVOID, LPVOID, DWORD)(19, "IDirect3DCubeTexture9_LockRect")
+IDirect3DCubeTexture9_UnlockRect = WINFUNCTYPE(DWORD, UINT, UINT)(20, "IDirect3DCubeTexture9_UnlockRect")
+IDirect3DVolumeTexture9_GetLevelDesc = WINFUNCTYPE(DWORD, UINT, LPVOID)(17, "IDirect3DVolumeTexture9_GetLevelDesc")
+IDirect3DVolumeTexture9_LockBox = WINFUNCTYPE(DWORD, UINT, LPVOID, LPVOID, DWORD)(19, "IDirect3DVolumeTexture9_LockBox")
+IDirect3DVolumeTexture9_UnlockBox = WINFUNCTYPE(DWORD, UINT)(20, "IDirect3DVolumeTexture9_UnlockBox")
+IDirect3DSurface9_GetDesc = WINFUNCTYPE(DWORD, LPVOID)(12, "IDirect3DSurface9_GetDesc")
+IDirect3DSurface9_LockRect = WINFUNCTYPE(DWORD, LPVOID, LPVOID, DWORD)(13, "IDirect3DSurface9_LockRect")
+IDirect3DSurface9_UnlockRect = WINFUNCTYPE(DWORD)(14, "IDirect3DSurface9_UnlockRect")
+IDirect3DVertexBuffer9_Lock = WINFUNCTYPE(HRESULT, UINT, UINT, LPVOID, DWORD)(11, "IDirect3DVertexBuffer9_Lock")
+IDirect3DVertexBuffer9_Unlock = WINFUNCTYPE(HRESULT)(12, "IDirect3DVertexBuffer9_Unlock")
+IDirect3DIndexBuffer9_Lock = WINFUNCTYPE(HRESULT, UINT, UINT, LPVOID, DWORD)(11, "IDirect3DIndexBuffer9_Lock")
+IDirect3DIndexBuffer9_Unlock = WINFUNCTYPE(HRESULT)(12, "IDirect3DIndexBuffer9_Unlock")
+D3DXBUFFER_GetBufferPointer = WINFUNCTYPE(LPVOID)(3, "D3DXBUFFER_GetBufferPointer")
+D3DXBUFFER_GetBufferSize = WINFUNCTYPE(DWORD)(4, "D3DXBUFFER_GetBufferSize")
+ID3DXEffectCompiler_CompileEffect = WINFUNCTYPE(HRESULT, DWORD, LPVOID, LPVOID)(59, "ID3DXEffectCompiler_CompileEffect")
+ID3DXEffect_GetParameterByName = WINFUNCTYPE(LPVOID, LPCSTR, LPCSTR)(9, "ID3DXEffect_GetParameterByName")
+ID3DXEffect_SetInt = WINFUNCTYPE(HRESULT, LPCSTR, INT)(26, "ID3DXEffect_SetInt")
+ID3DXEffect_SetFloat = WINFUNCTYPE(HRESULT, LPCSTR, FLOAT)(30, "ID3DXEffect_SetFloat")
+ID3DXEffect_SetFloatArray = WINFUNCTYPE(HRESULT, LPCSTR, LPVOID, UINT)(32, "ID3DXEffect_SetFloatArray")
+ID3DXEffect_SetVector = WINFUNCTYPE(HRESULT, LPCSTR, LPVOID)(34, "ID3DXEffect_SetVector")
+ID3DXEffect_SetVectorArray = WINFUNCTYPE(HRESULT, LPCSTR, LPVOID, UINT)(36, "ID3DXEffect_SetVectorArray")
+ID3DXEffect_SetMatrix = WINFUNCTYPE(HRESULT, LPCSTR, LPVOID)(38, "ID3DXEffect_SetMatrix")
+ID3DXEffect_SetTexture = WINFUNCTYPE(HRESULT, LPCSTR, LPVOID)(52, "ID3DXEffect_SetTexture")
+ID3DXEffect_SetTechnique = WINFUNCTYPE(HRESULT, LPCSTR)(58, "ID3DXEffect_SetTechnique")
+ID3DXEffect_Begin = WINFUNCTYPE(HRESULT, LPVOID, DWORD)(63, "ID3DXEffect_Begin")
+ID3DXEffect_BeginPass = WINFUNCTYPE(HRESULT, UINT)(64, "ID3DXEffect_BeginPass")
+ID3DXEffect_EndPass = WINFUNCTYPE(HRESULT)(66, "ID3DXEffect_EndPass")
+ID3DXEffect_End = WINFUNCTYPE(HRESULT)(67, "ID3DXEffect_End")
+
+WS_OVERLAPPEDWINDOW = 0x00CF0000
+
+NULL = LPVOID(0)
+
+# copyLevel draws with this when StretchRect can't read the source:
+# textures outside D3DPOOL_DEFAULT, e.g. everything loaded or uploaded
+COPY_FX = """
+texture copyMapTexture;
+texture copyCubeTexture;
+
+sampler2D copyMap = sampler_state { Texture = <copyMapTexture>;
+	MinFilter = LINEAR; MagFilter = LINEAR; MipFilter = POINT; AddressU = Clamp; AddressV = Clamp; };
+sampler2D copyMapPoint = sampler_state { Texture = <copyMapTexture>;
+	MinFilter = POINT; MagFilter = POINT; MipFilter = POINT; AddressU = Clamp; AddressV = Clamp; };
+samplerCUBE copyCube = sampler_state { Texture = <copyCubeTexture>;
+	MinFilter = LINEAR; MagFilter = LINEAR; MipFilter = POINT; AddressU = Clamp; AddressV = Clamp; };
+samplerCUBE copyCubePoint = sampler_state { Texture = <copyCubeTexture>;
+	MinFilter = POINT; MagFilter = POINT; MipFilter = POINT; AddressU = Clamp; AddressV = Clamp; };
+
+// Source level, source cube face
+float4 vCopySource;
+
+void VSCopy(
+	out float4 outPos : POSITION,
+	out float2 outTc : TEXCOORD0,
+	in float3 inPos : POSITION
+	)
+{
+	outPos = float4(inPos.x * 2 - 1, inPos.y * 2 - 1, 0, 1);
+	outTc.x = inPos.x;
+	outTc.y = 1 - inPos.y;
+}
+
+// Direction through texel coordinates of a face, D3D9 face orientation
+float3 cubeDirection(float2 tc, float face)
+{
+	float s = tc.x * 2 - 1;
+	float t = tc.y * 2 - 1;
+
+	if (face < 0.5) return float3(1, -t, -s);
+	if (face < 1.5) return float3(-1, -t, s);
+	if (face < 2.5) return float3(s, 1, t);
+	if (face < 3.5) return float3(s, -1, -t);
+	if (face < 4.5) return float3(s, -t, 1);
+	return float3(-s, -t, -1);
+}
+
+float4 PSCopy(in float2 tc : TEXCOORD0) : COLOR { return tex2Dlod(copyMap, float4(tc, 0, vCopySource.x)); }
+float4 PSCopyPoint(in float2 tc : TEXCOORD0) : COLOR { return tex2Dlod(copyMapPoint, float4(tc, 0, vCopySource.x)); }
+float4 PSCopyCube(in float2 tc : TEXCOORD0) : COLOR { return texCUBElod(copyCube, float4(cubeDirection(tc, vCopySource.y), vCopySource.x)); }
+float4 PSCopyCubePoint(in float2 tc : TEXCOORD0) : COLOR { return texCUBElod(copyCubePoint, float4(cubeDirection(tc, vCopySource.y), vCopySource.x)); }
+
+technique Copy { pass P0 { VertexShader = compile vs_3_0 VSCopy(); PixelShader = compile ps_3_0 PSCopy(); } }
+technique CopyPoint { pass P0 { VertexShader = compile vs_3_0 VSCopy(); PixelShader = compile ps_3_0 PSCopyPoint(); } }
+technique CopyCube { pass P0 { VertexShader = compile vs_3_0 VSCopy(); PixelShader = compile ps_3_0 PSCopyCube(); } }
+technique CopyCubePoint { pass P0 { VertexShader = compile vs_3_0 VSCopy(); PixelShader = compile ps_3_0 PSCopyCubePoint(); } }
+"""
+
+# Device configurations tried in order until one succeeds
+DEVICE_CONFIGURATIONS = [
+	(D3DDEVTYPE_HAL, D3DCREATE_MULTITHREADED | D3DCREATE_HARDWARE_VERTEXPROCESSING),
+	(D3DDEVTYPE_HAL, D3DCREATE_MULTITHREADED | D3DCREATE_SOFTWARE_VERTEXPROCESSING),
+	(D3DDEVTYPE_REF, D3DCREATE_MULTITHREADED | D3DCREATE_HARDWARE_VERTEXPROCESSING),
+	]
+
+
+class Libraries :
+	"""d3d9.dll, the newest available d3dx9_*.dll and the functions fxproc
+imports from them. Probed once per process, see loadLibraries().
+"""
+
+	def __init__(self):
+		self.d3d9_dll = ctypes.windll.LoadLibrary('d3d9.dll')
+		self.d3dx9_dll = None
+		self.d3dx_version = None
+
+		for d3dx_version in range(43, 31, -1):
+			try:
+				self.d3dx9_dll = ctypes.windll.LoadLibrary('d3dx9_%d.dll' % (d3dx_version))
+				self.d3dx_version = d3dx_version
+				break
+			except WindowsError:
+				pass
+
+		if not self.d3dx9_dll :
+			raise Exception("Failed to find d3dx9_*.dll")
+
+		if self.d3dx_version != 43 :
+			print("WARNING: d3dx9_43.dll not found, falling back to lower version")
+
+		self.CreateWindowEx = self.__bind(ctypes.windll.user32, 'CreateWindowExA',
+			[DWORD, LPCSTR, LPCSTR, DWORD, UINT, UINT, UINT, UINT, HWND, HMENU, HINSTANCE, LPVOID], HWND)
+
+		self.Direct3DCreate9 = self.__bind(self.d3d9_dll, 'Direct3DCreate9', None, LPVOID)
+
+		self.D3DXCreateEffectFromFile = self.__bind(self.d3dx9_dll, 'D3DXCreateEffectFromFileA',
+			[LPVOID, LPCSTR, LPVOID, LPVOID, DWORD, LPVOID, LPVOID, LPVOID])
+
+		self.D3DXCreateEffect = self.__bind(self.d3dx9_dll, 'D3DXCreateEffect',
+			[LPVOID, LPCSTR, UINT, LPVOID, LPVOID, DWORD, LPVOID, LPVOID, LPVOID])
+
+		self.D3DXCreateEffectCompilerFromFile = self.__bind(self.d3dx9_dll, 'D3DXCreateEffectCompilerFromFileA',
+			[LPCSTR, LPVOID, LPVOID, DWORD, LPVOID, LPVOID])
+
+		self.D3DXCreateEffectCompiler = self.__bind(self.d3dx9_dll, 'D3DXCreateEffectCompiler',
+			[LPCSTR, UINT, LPVOID, LPVOID, DWORD, LPVOID, LPVOID])
+
+		self.D3DXGetImageInfoFromFile = self.__bind(self.d3dx9_dll, 'D3DXGetImageInfoFromFileA',
+			[LPCSTR, LPVOID])
+
+		self.D3DXCreateTextureFromFileEx = self.__bind(self.d3dx9_dll, 'D3DXCreateTextureFromFileExA',
+			[LPVOID, LPCSTR, UINT, UINT, UINT, DWORD, UINT, UINT, DWORD, DWORD, UINT, LPVOID, LPVOID, LPVOID])
+
+		self.D3DXCreateCubeTextureFromFileEx = self.__bind(self.d3dx9_dll, 'D3DXCreateCubeTextureFromFileExA',
+			[LPVOID, LPCSTR, UINT, UINT, DWORD, UINT, UINT, DWORD, DWORD, UINT, LPVOID, LPVOID, LPVOID])
+
+		self.D3DXSaveTextureToFile = self.__bind(self.d3dx9_dll, 'D3DXSaveTextureToFileA',
+			[LPCSTR, UINT, LPVOID, LPVOID])
+
+		self.D3DXGetImageInfoFromFileInMemory = self.__bind(self.d3dx9_dll, 'D3DXGetImageInfoFromFileInMemory',
+			[LPVOID, UINT, LPVOID])
+
+		self.D3DXCreateTextureFromFileInMemoryEx = self.__bind(self.d3dx9_dll, 'D3DXCreateTextureFromFileInMemoryEx',
+			[LPVOID, LPVOID, UINT, UINT, UINT, UINT, DWORD, UINT, UINT, DWORD, DWORD, UINT, LPVOID, LPVOID, LPVOID])
+
+		self.D3DXCreateCubeTextureFromFileInMemoryEx = self.__bind(self.d3dx9_dll, 'D3DXCreateCubeTextureFromFileInMemoryEx',
+			[LPVOID, LPVOID, UINT, UINT, UINT, DWORD, UINT, UINT, DWORD, DWORD, UINT, LPVOID, LPVOID, LPVOID])
+
+		self.D3DXSaveTextureToFileInMemory = self.__bind(self.d3dx9_dll, 'D3DXSaveTextureToFileInMemory',
+			[LPVOID, UINT, LPVOID, LPVOID])
+
+		self.D3DXFilterTexture = self.__bind(self.d3dx9_dll, 'D3DXFilterTexture',
+			[LPVOID, LPVOID, UINT, DWORD])
+
+	@staticmethod
+	def __bind(dll, name, argtypes, restype=HRESULT):
+		function = getattr(dll, name)
+		if argtypes is not None:
+			function.argtypes = argtypes
+		function.restype = restype
+		return function
+
+
+_libraries = None
+
+def loadLibraries():
+	global _libraries
+
+	if _libraries is None:
+		_libraries = Libraries()
+
+	return _libraries
+
+
+def _printD3DXBuffer(d3dxbuffer):
+	if d3dxbuffer:
+		sz = D3DXBUFFER_GetBufferSize(d3dxbuffer)
+		ptr = D3DXBUFFER_GetBufferPointer(d3dxbuffer)
+
+		if sz > 0:
+			text = ctypes.string_at(LPVOID(ptr), sz - 1)
+			print("")
+			print(text.rstrip())
+
+
+def _readD3DXBuffer(d3dxbuffer):
+	return ctypes.string_at(LPVOID(D3DXBUFFER_GetBufferPointer(d3dxbuffer)), D3DXBUFFER_GetBufferSize(d3dxbuffer))
+
+
+def _macros(defines):
+	"""NULL-terminated D3DXMACRO array from a dict or (name, value) pairs"""
+	if not defines:
+		return NULL
+
+	items = sorted(defines.items()) if isinstance(defines, dict) else list(defines)
+	macros = (D3DXMACRO * (len(items) + 1))()
+
+	for i, (name, value) in enumerate(items):
+		macros[i].Name = str(name).encode('ascii')
+		macros[i].Definition = str(value).encode('ascii')
+
+	return macros
+
+
+def adapterCount():
+	"""Number of adapters Direct3D9 can create a device on"""
+	d3d9 = LPVOID(loadLibraries().Direct3DCreate9(D3D_SDK_VERSION))
+
+	if not d3d9:
+		raise Exception("Failed to create D3D")
+
+	count = D3D9_GetAdapterCount(d3d9)
+	COM_Release(d3d9)
+
+	return count
+
+
+class D3D9Backend(Backend):
+	name = "d3d9"
+
+	def __init__(self, configurations=None, adapter=D3DADAPTER_DEFAULT):
+		dx = loadLibraries()
+
+		self.dx = dx
+		self.adapter = adapter
+		self.target_size = (0, 0)
+		self.bound_targets = 1
+		self.copy_effect = None
+		self.begin_called = False
+		self.state_cache = None
+		self.configuration = None
+		self.device = LPVOID(0)
+		self.flush_query = LPVOID(0)
+
+		# effect pointer -> {parameter name: D3DXHANDLE or None}
+		self.param_handles = {}
+
+		# query type -> idle queries, and every query created
+		self.query_pool = {}
+		self.queries = []
+
+		# (width, height, format) -> system memory surface for render target read back
+		self.staging_surfaces = {}
+
+		self.d3d9 = LPVOID(dx.Direct3DCreate9(D3D_SDK_VERSION))
+
+		if not self.d3d9:
+			raise Exception("Failed to create D3D")
+
+		if adapter >= D3D9_GetAdapterCount(self.d3d9):
+			COM_Release(self.d3d9)
+			raise ValueError("Adapter %d does not exist" % (adapter))
+
+		self.hwnd = dx.CreateWindowEx(0, "STATIC".encode("ascii"), "fxproc_window".encode("ascii"), WS_OVERLAPPEDWINDOW, 0, 0, 100, 100, 0, 0, 0, 0)
+
+		if self.hwnd == 0:
+			raise Exception("Failed to create window")
+
+		d3dpp = D3DPRESENT_PARAMETERS(Windowed=1, SwapEffect=D3DSWAPEFFECT_DISCARD)
+
+		for device_type, flags in (configurations or DEVICE_CONFIGURATIONS):
+			try:
+				hr = D3D9_CreateDevice(self.d3d9, adapter, device_type, self.hwnd, flags, ctypes.byref(d3dpp), ctypes.byref(self.device))
+			except WindowsError:
+				continue
+
+			if hr == 0 and self.device:
+				self.configuration = (device_type, flags)
+				break
+
+		if not self.configuration:
+			COM_Release(self.d3d9)
+			raise Exception("Failed to create D3D device")
+
+		try:
+			IDirect3DDevice9_CreateQuery(self.device, D3DQUERYTYPE_TIMESTAMP, ctypes.byref(self.flush_query))
+		except:
+			pass
+
+		self.caps = D3DCAPS9()
+		IDirect3DDevice9_GetDeviceCaps(self.device, ctypes.byref(self.caps))
+
+		self.max_primitives = self.caps.MaxPrimitiveCount or 0xFFFF
+		self.max_render_targets = max(1, self.caps.NumSimultaneousRTs)
+		self.independent_bit_depths = bool(self.caps.PrimitiveMiscCaps & D3DPMISCCAPS_MRTINDEPENDENTBITDEPTHS)
+		self.max_vertex_index = self.caps.MaxVertexIndex or 0xFFFF
+
+	def createTexture(self, kind, width, height, format_str, levels=1, slices=1):
+		format = D3DFORMAT.by_str[format_str]
+		texture = LPVOID(0)
+
+		if kind == "2d":
+			try:
+				IDirect3DDevice9_CreateTexture(self.device, width, height, levels, D3DUSAGE_RENDERTARGET, format, D3DPOOL_DEFAULT, ctypes.byref(texture), NULL)
+			except:
+				raise Exception("Can't create render target")
+
+		elif kind == "cube":
+			try:
+				IDirect3DDevice9_CreateCubeTexture(self.device, width, levels, D3DUSAGE_RENDERTARGET, format, D3DPOOL_DEFAULT, ctypes.byref(texture), NULL)
+			except:
+				raise Exception("Can't create render target cube")
+
+		elif kind == "volume":
+			try:
+				IDirect3DDevice9_CreateVolumeTexture(self.device, width, height, slices, levels, 0, format, D3DPOOL_MANAGED, ctypes.byref(texture), NULL)
+			except:
+				raise Exception("Can't create volume texture")
+
+		else:
+			raise TypeError("Unknown texture kind %r" % (kind))
+
+		return texture
+
+	def describeTexture(self, d3d_texture):
+		desc = D3DSURFACE_DESC()
+		slices = 0
+
+		ttype = Direct3DBaseTexture9_GetType(d3d_texture)
+
+		if ttype == D3DRTYPE_TEXTURE:
+			kind = "2d"
+			IDirect3DTexture9_GetLevelDesc(d3d_texture, 0, ctypes.byref(desc))
+
+		elif ttype == D3DRTYPE_CUBETEXTURE:
+			kind = "cube"
+			IDirect3DCubeTexture9_GetLevelDesc(d3d_texture, 0, ctypes.byref(desc))
+
+		elif ttype == D3DRTYPE_VOLUMETEXTURE:
+			kind = "volume"
+			volume_desc = D3DVOLUME_DESC()
+			IDirect3DVolumeTexture9_GetLevelDesc(d3d_texture, 0, ctypes.byref(volume_desc))
+
+			slices = volume_desc.Depth
+			desc.Width = volume_desc.Width
+			desc.Height = volume_desc.Height
+			desc.Format = volume_desc.Format
+
+		else:
+			raise TypeError("Unknown resource type")
+
+		levels = Direct3DBaseTexture9_GetLevelCount(d3d_texture)
+
+		return kind, D3DFORMAT.by_num[desc.Format], desc.Width, desc.Height, levels, slices
+
+	def releaseTexture(self, d3d_texture):
+		COM_Release(d3d_texture)
+
+	def __loadImage(self, source, get_info, create_texture, create_cube, levels):
+		# `source` is the leading arguments of the D3DX calls: a path, or a pointer and a size
+		texture = LPVOID(0)
+		info = D3DXIMAGE_INFO()
+
+		if get_info(*source, ctypes.byref(info)) != 0:
+			return None
+
+		if info.ResourceType == D3DRTYPE_CUBETEXTURE:
+			create_cube(
+				self.device, *source, D3DX_DEFAULT_NONPOW2,
+				int(levels), 0, info.Format, D3DPOOL_MANAGED, D3DX_DEFAULT, D3DX_DEFAULT,
+				0, NULL, NULL, ctypes.byref(texture)
+				)
+
+		elif info.ResourceType == D3DRTYPE_TEXTURE:
+			create_texture(
+				self.device, *source, D3DX_DEFAULT_NONPOW2, D3DX_DEFAULT_NONPOW2,
+				int(levels), 0, info.Format, D3DPOOL_MANAGED, D3DX_DEFAULT, D3DX_DEFAULT,
+				0, NULL, NULL, ctypes.byref(texture)
+				)
+
+		else:
+			raise TypeError("Unsupported resource")
+
+		return texture or None
+
+	def loadTexture(self, file_name, levels=0):
+		texture = self.__loadImage((file_name.encode('ascii'),), self.dx.D3DXGetImageInfoFromFile,
+			self.dx.D3DXCreateTextureFromFileEx, self.dx.D3DXCreateCubeTextureFromFileEx, levels)
+
+		if texture is None:
+			raise IOError("Can't load texture " '"%s"' % (file_name))
+
+		return texture
+
+	def loadTextureFromMemory(self, data, levels=0):
+		texture = self.__loadImage((data, len(data)), self.dx.D3DXGetImageInfoFromFileInMemory,
+			self.dx.D3DXCreateTextureFromFileInMemoryEx, self.dx.D3DXCreateCubeTextureFromFileInMemoryEx, levels)
+
+		if texture is None:
+			raise IOError("Can't decode texture from %d bytes" % (len(data)))
+
+		return texture
+
+	def saveTexture(self, d3d_texture, file_name, file_format):
+		if self.dx.D3DXSaveTextureToFile(file_name.encode('ascii'), file_format, d3d_texture, NULL) != 0:
+			raise IOError("Can't save texture " '"%s"' % (file_name))
+
+	def saveTextureToMemory(self, d3d_texture, file_format):
+		buffer = LPVOID(0)
+
+		if self.dx.D3DXSaveTextureToFileInMemory(ctypes.byref(buffer), file_format, d3d_texture, NULL) != 0 or not buffer:
+			raise IOError("Can't encode texture as %s" % (D3DXIMAGE_FILEFORMAT.by_num[file_format]))
+
+		try:
+			return _readD3DXBuffer(buffer)
+		finally:
+			COM_Release(buffer)
+
+	def __surface(self, d3d_texture, level, face):
+		surface = LPVOID(0)
+		ttype = Direct3DBaseTexture9_GetType(d3d_texture)
+
+		if ttype == D3DRTYPE_TEXTURE:
+			IDirect3DTexture9_GetSurfaceLevel(d3d_texture, level, ctypes.byref(surface))
+		elif ttype == D3DRTYPE_CUBETEXTURE:
+			IDirect3DCubeTexture9_GetCubeMapSurface(d3d_texture, face, level, ctypes.byref(surface))
+		else:
+			raise TypeError("Incorrect surface texture type")
+
+		return surface
+
+	def copyLevel(self, src_texture, src_level, src_face, dst_texture, dst_level, dst_face, filter="linear"):
+		src = self.__surface(src_texture, src_level, src_face)
+		desc = D3DSURFACE_DESC()
+		IDirect3DSurface9_GetDesc(src, ctypes.byref(desc))
+
+		# StretchRect only reads render targets in D3DPOOL_DEFAULT
+		if desc.Pool != D3DPOOL_DEFAULT or not desc.Usage & D3DUSAGE_RENDERTARGET:
+			COM_Release(src)
+			self.__drawCopy(src_texture, src_level, src_face, dst_texture, dst_level, dst_face, filter)
+			return
+
+		dst = self.__surface(dst_texture, dst_level, dst_face)
+
+		try:
+			self.endScene()
+			hr = IDirect3DDevice9_StretchRect(self.device, src, NULL, dst, NULL, D3DTEXF_LINEAR if filter == "linear" else D3DTEXF_POINT)
+		finally:
+			COM_Release(src)
+			COM_Release(dst)
+
+		if hr != 0:
+			raise Exception("Can't copy texture level (0x%08x)" % (hr))
+
+	def __drawCopy(self, src_texture, src_level, src_face, dst_texture, dst_level, dst_face, filter):
+		"""copyLevel as a draw sampling the source, restoring the bound render targets"""
+		if not self.copy_effect:
+			self.copy_effect = self.createEffect(COPY_FX)
+
+		effect = self.copy_effect
+		cube = Direct3DBaseTexture9_GetType(src_texture) == D3DRTYPE_CUBETEXTURE
+		technique_name = ("CopyCube" if cube else "Copy") + ("Point" if filter == "point" else "")
+
+		bound = []
+		for index in range(self.bound_targets):
+			surface = LPVOID(0)
+			IDirect3DDevice9_GetRenderTarget(self.device, index, ctypes.byref(surface))
+			bound.append(surface)
+
+		target_size = self.target_size
+
+		try:
+			self.setTexture(effect, "copyCubeTexture" if cube else "copyMapTexture", src_texture)
+			self.setVector(effect, "vCopySource", src_level, src_face, 0, 0)
+			self.setRenderTarget(dst_texture, dst_level, dst_face)
+			self.drawQuad(effect, technique_name, False)
+		finally:
+			self.setTexture(effect, "copyCubeTexture" if cube else "copyMapTexture", NULL)
+
+			for index, surface in enumerate(bound):
+				IDirect3DDevice9_SetRenderTarget(self.device, index, surface)
+				COM_Release(surface)
+
+			self.bound_targets = len(bound)
+			self.target_size = target_size
+
+	def __stagingSurface(self, width, height, format):
+		key = (width, height, format)
+		surface = self.staging_surfaces.get(key)
+
+		if surface is None:
+			surface = LPVOID(0)
+			IDirect3DDevice9_CreateOffscreenPlainSurface(self.device, width, height, format, D3DPOOL_SYSTEMMEM, ctypes.byref(surface), NULL)
+			if not surface:
+				raise Exception("Can't create staging surface")
+
+			self.staging_surfaces[key] = surface
+
+		return surface
+
+	def copyLevelToVolumeSlice(self, src_texture, src_level, src_face, volume, slice_index, volume_level=0):
+		from . import arrays
+
+		# Volumes can't be render targets or StretchRect destinations, so the slice
+		# goes through a cached system memory surface straight into the locked box
+		surface = self.__surface(src_texture, src_level, src_face)
+		desc = D3DSURFACE_DESC()
+		IDirect3DSurface9_GetDesc(surface, ctypes.byref(desc))
+
+		try:
+			staging = self.__stagingSurface(desc.Width, desc.Height, desc.Format)
+
+			self.endScene()
+			if IDirect3DDevice9_GetRenderTargetData(self.device, surface, staging) != 0:
+				raise IOError("Can't read back render target")
+		finally:
+			COM_Release(surface)
+
+		format_str = D3DFORMAT.by_num[desc.Format]
+		locked_rect = D3DLOCKED_RECT()
+		box = D3DLOCKED_BOX()
+		region = D3DBOX(0, 0, desc.Width, desc.Height, slice_index, slice_index + 1)
+
+		if IDirect3DSurface9_LockRect(staging, ctypes.byref(locked_rect), NULL, D3DLOCK_READONLY) != 0:
+			raise IOError("Can't lock staging surface")
+		try:
+			if IDirect3DVolumeTexture9_LockBox(volume, volume_level, ctypes.byref(box), ctypes.byref(region), 0) != 0:
+				raise IOError("Can't lock volume slice %d" % (slice_index))
+			try:
+				arrays.pitchedView(box.pBits, format_str, desc.Width, desc.Height, box.RowPitch)[...] = \
+					arrays.pitchedView(locked_rect.pBits, format_str, desc.Width, desc.Height, locked_rect.Pitch)
+			finally:
+				IDirect3DVolumeTexture9_UnlockBox(volume, volume_level)
+		finally:
+			IDirect3DSurface9_UnlockRect(staging)
+
+	def readTexture(self, d3d_texture, level=0, face=0, out=None):
+		from . import arrays
+
+		kind, format_str = self.describeTexture(d3d_texture)[:2]
+		locked_rect = D3DLOCKED_RECT()
+
+		if kind == "volume":
+			desc = D3DVOLUME_DESC()
+			box = D3DLOCKED_BOX()
+			IDirect3DVolumeTexture9_GetLevelDesc(d3d_texture, level, ctypes.byref(desc))
+
+			if IDirect3DVolumeTexture9_LockBox(d3d_texture, level, ctypes.byref(box), NULL, D3DLOCK_READONLY) != 0:
+				raise IOError("Can't lock volume level %d" % (level))
+			try:
+				return arrays.copyInto(arrays.pitchedView(box.pBits, format_str, desc.Width, desc.Height, box.RowPitch, desc.Depth, box.SlicePitch), out)
+			finally:
+				IDirect3DVolumeTexture9_UnlockBox(d3d_texture, level)
+
+		# Render targets live in D3DPOOL_DEFAULT and are copied to system memory first
+		surface = self.__surface(d3d_texture, level, face)
+		desc = D3DSURFACE_DESC()
+		IDirect3DSurface9_GetDesc(surface, ctypes.byref(desc))
+
+		# The staging surface is cached and stays alive
+		owned = desc.Pool != D3DPOOL_DEFAULT
+
+		if not owned:
+			self.endScene()
+
+			try:
+				staging = self.__stagingSurface(desc.Width, desc.Height, desc.Format)
+				if IDirect3DDevice9_GetRenderTargetData(self.device, surface, staging) != 0:
+					raise IOError("Can't read back render target")
+			finally:
+				COM_Release(surface)
+
+			surface = staging
+
+		try:
+			if IDirect3DSurface9_LockRect(surface, ctypes.byref(locked_rect), NULL, D3DLOCK_READONLY) != 0:
+				raise IOError("Can't lock texture level %d" % (level))
+			try:
+				return arrays.copyInto(arrays.pitchedView(locked_rect.pBits, format_str, desc.Width, desc.Height, locked_rect.Pitch), out)
+			finally:
+				IDirect3DSurface9_UnlockRect(surface)
+		finally:
+			if owned:
+				COM_Release(surface)
+
+	def writeTexture(self, d3d_texture, array, level=0, face=0):
+		from . import arrays
+
+		kind, format_str = self.describeTexture(d3d_texture)[:2]
+
+		if kind == "volume":
+			desc = D3DVOLUME_DESC()
+			box = D3DLOCKED_BOX()
+			IDirect3DVolumeTexture9_GetLevelDesc(d3d_texture, level, ctypes.byref(desc))
+
+			if IDirect3DVolumeTexture9_LockBox(d3d_texture, level, ctypes.byref(box), NULL, 0) != 0:
+				raise IOError("Can't lock volume level %d" % (level))
+			try:
+				arrays.pitchedView(box.pBits, format_str, desc.Width, desc.Height, box.RowPitch, desc.Depth, box.SlicePitch)[...] = array
+			finally:
+				IDirect3DVolumeTexture9_UnlockBox(d3d_texture, level)
+			return
+
+		surface = self.__surface(d3d_texture, level, face)
+		desc = D3DSURFACE_DESC()
+		IDirect3DSurface9_GetDesc(surface, ctypes.byref(desc))
+
+		try:
+			# Render targets can't be locked, they are updated from system memory
+			target = self.__stagingSurface(desc.Width, desc.Height, desc.Format) if desc.Pool == D3DPOOL_DEFAULT else surface
+			locked_rect = D3DLOCKED_RECT()
+
+			if IDirect3DSurface9_LockRect(target, ctypes.byref(locked_rect), NULL, 0) != 0:
+				raise IOError("Can't lock texture level %d" % (level))
+			try:
+				arrays.pitchedView(locked_rect.pBits, format_str, desc.Width, desc.Height, locked_rect.Pitch)[...] = array
+			finally:
+				IDirect3DSurface9_UnlockRect(target)
+
+			if target is not surface:
+				self.endScene()
+				if IDirect3DDevice9_UpdateSurface(self.device, target, NULL, surface, NULL) != 0:
+					raise IOError("Can't update render target")
+		finally:
+			COM_Release(surface)
+
+	def createTextureFromArray(self, kind, array, format_str, levels=1):
+		from . import arrays
+
+		format = D3DFORMAT.by_str[format_str]
+		kind, width, height, slices = arrays.imageShape(array, format_str, kind)
+		texture = LPVOID(0)
+
+		if kind == "2d":
+			IDirect3DDevice9_CreateTexture(self.device, width, height, levels, 0, format, D3DPOOL_MANAGED, ctypes.byref(texture), NULL)
+		elif kind == "cube":
+			IDirect3DDevice9_CreateCubeTexture(self.device, width, levels, 0, format, D3DPOOL_MANAGED, ctypes.byref(texture), NULL)
+		else:
+			IDirect3DDevice9_CreateVolumeTexture(self.device, width, height, slices, levels, 0, format, D3DPOOL_MANAGED, ctypes.byref(texture), NULL)
+
+		if not texture:
+			raise Exception("Can't create %s texture from array" % (kind))
+
+		if kind == "volume":
+			box = D3DLOCKED_BOX()
+			IDirect3DVolumeTexture9_LockBox(texture, 0, ctypes.byref(box), NULL, 0)
+			arrays.pitchedView(box.pBits, format_str, width, height, box.RowPitch, slices, box.SlicePitch)[...] = array
+			IDirect3DVolumeTexture9_UnlockBox(texture, 0)
+
+		else:
+			for face, data in enumerate(array if kind == "cube" else (array,)):
+				locked_rect = D3DLOCKED_RECT()
+
+				if kind == "cube":
+					IDirect3DCubeTexture9_LockRect(texture, face, 0, ctypes.byref(locked_rect), NULL, 0)
+				else:
+					IDirect3DTexture9_LockRect(texture, 0, ctypes.byref(locked_rect), NULL, 0)
+
+				arrays.pitchedView(locked_rect.pBits, format_str, width, height, locked_rect.Pitch)[...] = data
+
+				if kind == "cube":
+					IDirect3DCubeTexture9_UnlockRect(texture, face, 0)
+				else:
+					IDirect3DTexture9_UnlockRect(texture, 0)
+
+		if levels != 1:
+			self.dx.D3DXFilterTexture(texture, NULL, 0, D3DX_DEFAULT)
+
+		return texture
+
+	compiles_effects = True
+
+	def compilerId(self):
+		return "d3dx9_%d" % (self.dx.d3dx_version)
+
+	def compileFlags(self, optimize=False):
+		return D3DXSHADER_OPTIMIZATION_LEVEL3 if optimize else D3DXSHADER_SKIPOPTIMIZATION
+
+	def compileEffect(self, source, file_name=None, defines=None, optimize=False):
+		flags = self.compileFlags(optimize)
+		macros = _macros(defines)
+		compiler = LPVOID(0)
+		errors = LPVOID(0)
+		blob = LPVOID(0)
+
+		try:
+			if file_name:
+				self.dx.D3DXCreateEffectCompilerFromFile(
+					file_name.encode('ascii'), macros, NULL, flags,
+					ctypes.byref(compiler), ctypes.byref(errors)
+					)
+			else:
+				self.dx.D3DXCreateEffectCompiler(
+					source, len(source), macros, NULL, flags,
+					ctypes.byref(compiler), ctypes.byref(errors)
+					)
+
+			if compiler:
+				if errors:
+					COM_Release(errors)
+					errors = LPVOID(0)
+
+				ID3DXEffectCompiler_CompileEffect(compiler, flags, ctypes.byref(blob), ctypes.byref(errors))
+		except WindowsError:
+			pass
+		finally:
+			if compiler:
+				COM_Release(compiler)
+
+		if not blob:
+			_printD3DXBuffer(errors)
+
+		if errors:
+			COM_Release(errors)
+
+		if not blob:
+			if file_name:
+				raise IOError('Can\'t load effect file "%s"' % (file_name))
+			raise IOError('Can\'t create effect')
+
+		data = _readD3DXBuffer(blob)
+		COM_Release(blob)
+
+		return data
+
+	def loadCompiledEffect(self, blob):
+		errors = LPVOID(0)
+		d3d_effect = LPVOID(0)
+
+		try:
+			self.dx.D3DXCreateEffect(
+				self.device, blob, len(blob), NULL, NULL,
+				D3DXFX_NOT_CLONEABLE, NULL,
+				ctypes.byref(d3d_effect), ctypes.byref(errors)
+				)
+		except WindowsError:
+			pass
+
+		if not d3d_effect:
+			_printD3DXBuffer(errors)
+
+		if errors:
+			COM_Release(errors)
+
+		if not d3d_effect:
+			raise IOError('Can\'t create effect')
+
+		return d3d_effect
+
+	def openEffect(self, fx_name, defines=None, optimize=False):
+		return self.loadCompiledEffect(self.compileEffect(None, fx_name, defines, optimize))
+
+	def createEffect(self, text, defines=None, optimize=False):
+		return self.loadCompiledEffect(self.compileEffect(text.encode('ascii'), None, defines, optimize))
+
+	def releaseEffect(self, d3d_effect):
+		self.param_handles.pop(d3d_effect.value, None)
+		COM_Release(d3d_effect)
+
+	def parameterHandle(self, d3d_effect, name):
+		"""D3DXHANDLE of a top level parameter, looked up once per effect; None if missing"""
+		handles = self.param_handles.setdefault(d3d_effect.value, {})
+
+		try:
+			return handles[name]
+		except KeyError:
+			pass
+
+		handle = ID3DXEffect_GetParameterByName(d3d_effect, None, name.encode('ascii'))
+		handle = handles[name] = LPCSTR(handle) if handle else None
+
+		return handle
+
+	def __targetSurface(self, d3d_texture, level, face):
+		surface = LPVOID(0)
+		ttype = Direct3DBaseTexture9_GetType(d3d_texture)
+
+		desc = D3DSURFACE_DESC()
+
+		if ttype == D3DRTYPE_TEXTURE:
+			IDirect3DTexture9_GetLevelDesc(d3d_texture, level, ctypes.byref(desc))
+			IDirect3DTexture9_GetSurfaceLevel(d3d_texture, level, ctypes.byref(surface))
+
+		elif ttype == D3DRTYPE_CUBETEXTURE:
+			faces = [
+				D3DCUBEMAP_FACE_POSITIVE_X, D3DCUBEMAP_FACE_NEGATIVE_X,
+				D3DCUBEMAP_FACE_POSITIVE_Y, D3DCUBEMAP_FACE_NEGATIVE_Y,
+				D3DCUBEMAP_FACE_POSITIVE_Z, D3DCUBEMAP_FACE_NEGATIVE_Z,
+				]
+
+			dxface = faces[face]
+
+			IDirect3DCubeTexture9_GetLevelDesc(d3d_texture, level, ctypes.byref(desc))
+			IDirect3DCubeTexture9_GetCubeMapSurface(d3d_texture, dxface, level, ctypes.byref(surface))
+
+		else:
+			raise TypeError("Incorrect render target type")
+
+		return surface, desc
+
+	def setRenderTarget(self, d3d_texture, level=0, face=0):
+		return self.setRenderTargets((d3d_texture,), level, face)
+
+	def setRenderTargets(self, d3d_textures, level=0, face=0):
+		if not 1 <= len(d3d_textures) <= self.max_render_targets:
+			raise ValueError("%d render targets, the device takes 1..%d" % (len(d3d_textures), self.max_render_targets))
+
+		surfaces = []
+
+		try:
+			for d3d_texture in d3d_textures:
+				surfaces.append(self.__targetSurface(d3d_texture, level, face))
+
+			first = surfaces[0][1]
+			for surface, desc in surfaces[1:]:
+				if (desc.Width, desc.Height) != (first.Width, first.Height):
+					raise ValueError("Render targets differ in size, %dx%d and %dx%d" % (first.Width, first.Height, desc.Width, desc.Height))
+
+				if not self.independent_bit_depths and D3DFORMAT_BITS.get(D3DFORMAT.by_num[desc.Format]) != D3DFORMAT_BITS.get(D3DFORMAT.by_num[first.Format]):
+					raise ValueError("The device needs render targets of the same bit depth")
+
+			self.target_size = (float(first.Width), float(first.Height))
+
+			for index, (surface, desc) in enumerate(surfaces):
+				IDirect3DDevice9_SetRenderTarget(self.device, index, surface)
+
+			# Slots past the new targets would keep writing the old ones
+			for index in range(len(surfaces), self.bound_targets):
+				IDirect3DDevice9_SetRenderTarget(self.device, index, NULL)
+
+			self.bound_targets = len(surfaces)
+		finally:
+			for surface, desc in surfaces:
+				COM_Release(surface)
+
+		return self.target_size
+
+	def clear(self, r, g, b, a):
+		argb = UINT((a << 24) | (r << 16) | (g << 8) | b)
+
+		IDirect3DDevice9_Clear(self.device, 0, NULL, D3DCLEAR_TARGET, argb, 1.0, 0)
+
+	def __beginScene(self, d3d_effect, technique_name):
+		w = self.target_size[0]
+		h = self.target_size[1]
+
+		if not self.begin_called:
+			IDirect3DDevice9_BeginScene(self.device)
+			self.begin_called = True
+
+		if self.__changed(("vTargetSize", d3d_effect.value), (w, h)):
+			handle = self.parameterHandle(d3d_effect, "vTargetSize")
+			if handle is not None:
+				vec = D3DXVECTOR4(w, h, 1.0 / w, 1.0 / h)
+				ID3DXEffect_SetVector(d3d_effect, handle, ctypes.byref(vec))
+
+		if self.__changed(("technique", d3d_effect.value), technique_name):
+			try:
+				ID3DXEffect_SetTechnique(d3d_effect, technique_name.encode('ascii'))
+			except WindowsError:
+				raise ValueError('Can\'t set technique "%s"' % (technique_name))
+
+	def __changed(self, key, value):
+		"""False when a batch already set this state to `value`"""
+		if self.state_cache is None:
+			return True
+
+		if self.state_cache.get(key) == value:
+			self.skipped += 1
+			return False
+
+		self.state_cache[key] = value
+		return True
+
+	def submit(self, commands):
+		self.state_cache = {}
+		self.skipped = 0
+
+		try:
+			for method, args in commands:
+				self.run(method, args)
+
+			self.endScene()
+			self.run("flush", ())
+		finally:
+			self.state_cache = None
+
+		return self.skipped
+
+	def endScene(self):
+		if self.begin_called:
+			IDirect3DDevice9_EndScene(self.device)
+			self.begin_called = False
+
+	def __endScene(self, do_flush):
+		if do_flush:
+			self.endScene()
+			self.flush()
+
+	def drawQuad(self, d3d_effect, technique_name, do_flush=True):
+		x = -0.5
+		y = -0.5
+		w = self.target_size[0]
+		h = self.target_size[1]
+
+		q = QUAD_VTX(
+			x    , y    , 0, 1, 0, 0,
+			x + w, y    , 0, 1, 1, 0,
+			x    , y + h, 0, 1, 0, 1,
+			x + w, y + h, 0, 1, 1, 1,
+			)
+
+		self.__beginScene(d3d_effect, technique_name)
+		if self.__changed("fvf", QUAD_VTX.FVF):
+			IDirect3DDevice9_SetFVF(self.device, QUAD_VTX.FVF)
+
+		pass_count = UINT(0)
+		ID3DXEffect_Begin(d3d_effect, ctypes.byref(pass_count), 0)
+
+		for p in range(pass_count.value):
+
+			ID3DXEffect_BeginPass(d3d_effect, p)
+			IDirect3DDevice9_DrawPrimitiveUP(self.device, D3DPT_TRIANGLESTRIP, 2, ctypes.byref(q), int(ctypes.sizeof(QUAD_VTX) / 4))
+			ID3DXEffect_EndPass(d3d_effect)
+
+		ID3DXEffect_End(d3d_effect)
+
+		self.__endScene(do_flush)
+
+	def drawTris(self, d3d_effect, tri_list, technique_name, do_flush=True):
+		self.__beginScene(d3d_effect, technique_name)
+		if self.__changed("fvf", TRI_VTX.FVF):
+			IDirect3DDevice9_SetFVF(self.device, TRI_VTX.FVF)
+
+		pass_count = UINT(0)
+		ID3DXEffect_Begin(d3d_effect, ctypes.byref(pass_count), 0)
+
+		for p in range(pass_count.value):
+
+			ID3DXEffect_BeginPass(d3d_effect, p)
+
+			for start in range(0, len(tri_list), self.max_primitives):
+				count = min(self.max_primitives, len(tri_list) - start)
+				IDirect3DDevice9_DrawPrimitiveUP(self.device,
+					D3DPT_TRIANGLELIST, count, ctypes.byref(tri_list, start * ctypes.sizeof(TRI_VTX)), int(ctypes.sizeof(TRI_VTX) / 3))
+
+			ID3DXEffect_EndPass(d3d_effect)
+
+		ID3DXEffect_End(d3d_effect)
+
+		self.__endScene(do_flush)
+
+	def createVertexBuffer(self, data, vertex_count, dynamic=False):
+		size = vertex_count * (ctypes.sizeof(TRI_VTX) // 3)
+		usage = D3DUSAGE_WRITEONLY | (D3DUSAGE_DYNAMIC if dynamic else 0)
+		pool = D3DPOOL_DEFAULT if dynamic else D3DPOOL_MANAGED
+		buffer = LPVOID(0)
+
+		hr = IDirect3DDevice9_CreateVertexBuffer(self.device, size, usage, TRI_VTX.FVF, pool, ctypes.byref(buffer), NULL)
+		if hr != 0 or not buffer:
+			raise Exception("Can't create vertex buffer")
+
+		self.updateVertexBuffer(buffer, data, vertex_count, dynamic)
+		return buffer
+
+	def updateVertexBuffer(self, buffer, data, vertex_count, dynamic=False):
+		size = vertex_count * (ctypes.sizeof(TRI_VTX) // 3)
+		ptr = LPVOID(0)
+
+		hr = IDirect3DVertexBuffer9_Lock(buffer, 0, size, ctypes.byref(ptr), D3DLOCK_DISCARD if dynamic else 0)
+		if hr != 0 or not ptr:
+			raise Exception("Can't lock vertex buffer")
+
+		ctypes.memmove(ptr, data, size)
+		IDirect3DVertexBuffer9_Unlock(buffer)
+
+	def createIndexBuffer(self, data, index_count, index_size, dynamic=False):
+		if index_size == 4 and self.max_vertex_index <= 0xFFFF:
+			raise ValueError("Device does not support 32-bit indices")
+
+		usage = D3DUSAGE_WRITEONLY | (D3DUSAGE_DYNAMIC if dynamic else 0)
+		pool = D3DPOOL_DEFAULT if dynamic else D3DPOOL_MANAGED
+		format = D3DFMT_INDEX32 if index_size == 4 else D3DFMT_INDEX16
+		buffer = LPVOID(0)
+
+		hr = IDirect3DDevice9_CreateIndexBuffer(self.device, index_count * index_size, usage, format, pool, ctypes.byref(buffer), NULL)
+		if hr != 0 or not buffer:
+			raise Exception("Can't create index buffer")
+
+		self.updateIndexBuffer(buffer, data, index_count, index_size, dynamic)
+		return buffer
+
+	def updateIndexBuffer(self, buffer, data, index_count, index_size, dynamic=False):
+		ptr = LPVOID(0)
+
+		hr = IDirect3DIndexBuffer9_Lock(buffer, 0, index_count * index_size, ctypes.byref(ptr), D3DLOCK_DISCARD if dynamic else 0)
+		if hr != 0 or not ptr:
+			raise Exception("Can't lock index buffer")
+
+		ctypes.memmove(ptr, data, index_count * index_size)
+		IDirect3DIndexBuffer9_Unlock(buffer)
+
+	def releaseBuffer(self, buffer):
+		COM_Release(buffer)
+
+	def drawBuffer(self, d3d_effect, vertex_buffer, vertex_count, index_buffer, first, tri_count, technique_name, do_flush=True):
+		self.__beginScene(d3d_effect, technique_name)
+		if self.__changed("fvf", TRI_VTX.FVF):
+			IDirect3DDevice9_SetFVF(self.device, TRI_VTX.FVF)
+
+		IDirect3DDevice9_SetStreamSource(self.device, 0, vertex_buffer, 0, ctypes.sizeof(TRI_VTX) // 3)
+		if index_buffer is not None:
+			IDirect3DDevice9_SetIndices(self.device, index_buffer)
+
+		pass_count = UINT(0)
+		ID3DXEffect_Begin(d3d_effect, ctypes.byref(pass_count), 0)
+
+		for p in range(pass_count.value):
+
+			ID3DXEffect_BeginPass(d3d_effect, p)
+
+			for start in range(first, first + tri_count, self.max_primitives):
+				count = min(self.max_primitives, first + tri_count - start)
+
+				if index_buffer is not None:
+					IDirect3DDevice9_DrawIndexedPrimitive(self.device, D3DPT_TRIANGLELIST, 0, 0, vertex_count, start * 3, count)
+				else:
+					IDirect3DDevice9_DrawPrimitive(self.device, D3DPT_TRIANGLELIST, start * 3, count)
+
+			ID3DXEffect_EndPass(d3d_effect)
+
+		ID3DXEffect_End(d3d_effect)
+
+		self.__endScene(do_flush)
+
+	def flush(self):
+		"""Kick the queued commands to the GPU without waiting for them"""
+		if self.flush_query:
+			IDirect3DQuery9_Issue(self.flush_query, D3DISSUE_END)
+			IDirect3DQuery9_GetData(self.flush_query, NULL, 0, D3DGETDATA_FLUSH)
+
+	def setFloat(self, d3d_effect, name, x):
+		handle = self.parameterHandle(d3d_effect, name)
+		if handle is not None:
+			ID3DXEffect_SetFloat(d3d_effect, handle, x)
+
+	def setInt(self, d3d_effect, name, x):
+		handle = self.parameterHandle(d3d_effect, name)
+		if handle is not None:
+			ID3DXEffect_SetInt(d3d_effect, handle, x)
+
+	def setVector(self, d3d_effect, name, x, y, z, w):
+		vec = D3DXVECTOR4(x, y, z, w)
+
+		if self.state_cache is not None and name == "vTargetSize":
+			self.state_cache.pop(("vTargetSize", d3d_effect.value), None)
+
+		handle = self.parameterHandle(d3d_effect, name)
+		if handle is not None:
+			ID3DXEffect_SetVector(d3d_effect, handle, ctypes.byref(vec))
+
+	def setFloatArray(self, d3d_effect, name, floats, count):
+		handle = self.parameterHandle(d3d_effect, name)
+		if handle is not None:
+			ID3DXEffect_SetFloatArray(d3d_effect, handle, (FLOAT * count).from_buffer(floats), count)
+
+	def setVectorArray(self, d3d_effect, name, floats, count):
+		handle = self.parameterHandle(d3d_effect, name)
+		if handle is not None:
+			ID3DXEffect_SetVectorArray(d3d_effect, handle, (D3DXVECTOR4 * count).from_buffer(floats), count)
+
+	def setMatrix(self, d3d_effect, name, floats):
+		handle = self.parameterHandle(d3d_effect, name)
+		if handle is not None:
+			ID3DXEffect_SetMatrix(d3d_effect, handle, (FLOAT * 16).from_buffer(floats))
+
+	def setTexture(self, d3d_effect, name, d3d_texture):
+		handle = self.parameterHandle(d3d_effect, name)
+		if handle is not None:
+			ID3DXEffect_SetTexture(d3d_effect, handle, d3d_texture)
+
+	def __acquireQuery(self, query_type):
+		pool = self.query_pool.setdefault(query_type, [])
+		if pool:
+			return pool.pop()
+
+		query = LPVOID(0)
+		hr = IDirect3DDevice9_CreateQuery(self.device, query_type, ctypes.byref(query))
+		if hr != 0 or not query:
+			raise Exception("Can't create query of type %d" % (query_type))
+
+		self.queries.append(query)
+		return query
+
+	def __releaseQuery(self, query_type, query):
+		self.query_pool[query_type].append(query)
+
+	def __queryData(self, query, value):
+		"""Wait for a query result; False when the device cannot deliver it"""
+		while True:
+			hr = IDirect3DQuery9_GetData(query, ctypes.byref(value), ctypes.sizeof(value), D3DGETDATA_FLUSH)
+			if hr == 0:
+				return True
+			if hr != 1:
+				return False
+
+			time.sleep(0)
+
+	def issueFence(self):
+		query = self.__acquireQuery(D3DQUERYTYPE_EVENT)
+		IDirect3DQuery9_Issue(query, D3DISSUE_END)
+
+		return query
+
+	def fenceDone(self, query):
+		hr = IDirect3DQuery9_GetData(query, NULL, 0, D3DGETDATA_FLUSH)
+
+		if hr == 1:
+			return False
+		if hr != 0:
+			raise Exception("Can't read fence, device lost (0x%08x)" % (hr))
+
+		return True
+
+	def releaseFence(self, query):
+		self.__releaseQuery(D3DQUERYTYPE_EVENT, query)
+
+	def beginTiming(self):
+		disjoint = self.__acquireQuery(D3DQUERYTYPE_TIMESTAMPDISJOINT)
+		frequency = self.__acquireQuery(D3DQUERYTYPE_TIMESTAMPFREQ)
+
+		IDirect3DQuery9_Issue(disjoint, D3DISSUE_BEGIN)
+		IDirect3DQuery9_Issue(frequency, D3DISSUE_END)
+
+		return disjoint, frequency
+
+	def timestamp(self):
+		query = self.__acquireQuery(D3DQUERYTYPE_TIMESTAMP)
+		IDirect3DQuery9_Issue(query, D3DISSUE_END)
+
+		return query
+
+	def endTiming(self, token, stamps):
+		disjoint_query, frequency_query = token
+		IDirect3DQuery9_Issue(disjoint_query, D3DISSUE_END)
+
+		disjoint = BOOL(1)
+		frequency = ctypes.c_uint64(0)
+		valid = self.__queryData(disjoint_query, disjoint) and self.__queryData(frequency_query, frequency)
+
+		ticks = []
+		for query in stamps:
+			value = ctypes.c_uint64(0)
+			valid = self.__queryData(query, value) and valid
+			ticks.append(value.value)
+			self.__releaseQuery(D3DQUERYTYPE_TIMESTAMP, query)
+
+		self.__releaseQuery(D3DQUERYTYPE_TIMESTAMPDISJOINT, disjoint_query)
+		self.__releaseQuery(D3DQUERYTYPE_TIMESTAMPFREQ, frequency_query)
+
+		if not valid or disjoint.value or not frequency.value:
+			return None
+
+		return [float(tick) / frequency.value for tick in ticks]
+
+	def cleanup(self):
+		for query in self.queries:
+			COM_Release(query)
+
+		self.query_pool = {}
+		self.queries = []
+
+		for surface in self.staging_surfaces.values():
+			COM_Release(surface)
+
+		self.staging_surfaces = {}
+
+		if self.copy_effect:
+			self.releaseEffect(self.copy_effect)
+			self.copy_effect = None
+
+		if self.flush_query:
+			COM_Release(self.flush_query)
+			self.flush_query = LPVOID(0)
+
+		ref = 0
+
+		if self.device:
+			ref += COM_Release(self.device)
+			self.device = LPVOID(0)
+
+		if self.d3d9:
+			ref += COM_Release(self.d3d9)
+			self.d3d9 = LPVOID(0)
+
+		if ref != 0:
+			print("WARNING: leaking D3D resources")
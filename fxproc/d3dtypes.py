@@ -0,0 +1,386 @@
+"""Direct3D9 constants and structures shared by all fxproc backends.
+Nothing in here touches a DLL, so it can be imported on any platform.
+"""
+
+from ctypes import Structure
+from ctypes.wintypes import *
+
+# Direct3D9 constants
+D3D_SDK_VERSION = 32
+D3DADAPTER_DEFAULT = 0
+D3DDEVTYPE_HAL = 1
+D3DDEVTYPE_REF = 2
+D3DCREATE_MULTITHREADED             = 0x00000004
+D3DCREATE_SOFTWARE_VERTEXPROCESSING = 0x00000020
+D3DCREATE_HARDWARE_VERTEXPROCESSING = 0x00000040
+D3DCREATE_MIXED_VERTEXPROCESSING    = 0x00000080
+
+D3DPT_TRIANGLELIST = 4
+D3DPT_TRIANGLESTRIP = 5
+
+D3DSWAPEFFECT = UINT
+D3DSWAPEFFECT_DISCARD = 1
+
+D3DX_DEFAULT = UINT(-1)
+D3DX_DEFAULT_NONPOW2 = UINT(-2)
+D3DXFX_NOT_CLONEABLE = (1 << 11)
+D3DXSHADER_SKIPOPTIMIZATION = (1 << 2)
+D3DXSHADER_OPTIMIZATION_LEVEL3 = (1 << 15)
+
+D3DPOOL = UINT
+D3DPOOL_DEFAULT = 0
+D3DPOOL_MANAGED = 1
+D3DPOOL_SYSTEMMEM = 2
+
+D3DUSAGE_RENDERTARGET = 0x00000001
+D3DUSAGE_DEPTHSTENCIL = 0x00000002
+D3DUSAGE_WRITEONLY = 0x00000008
+D3DUSAGE_DYNAMIC = 0x00000200
+
+D3DFMT_INDEX16 = 101
+D3DFMT_INDEX32 = 102
+
+D3DCLEAR_TARGET = 0x00000001
+
+D3DPMISCCAPS_MRTINDEPENDENTBITDEPTHS = 0x00040000
+
+D3DTEXF_POINT = 1
+D3DTEXF_LINEAR = 2
+
+D3DLOCK_READONLY = 0x00000010
+D3DLOCK_DISCARD = 0x00002000
+
+D3DCUBEMAP_FACE_POSITIVE_X = 0
+D3DCUBEMAP_FACE_NEGATIVE_X = 1
+D3DCUBEMAP_FACE_POSITIVE_Y = 2
+D3DCUBEMAP_FACE_NEGATIVE_Y = 3
+D3DCUBEMAP_FACE_POSITIVE_Z = 4
+D3DCUBEMAP_FACE_NEGATIVE_Z = 5
+
+D3DRESOURCETYPE = UINT
+D3DRTYPE_SURFACE = 1
+D3DRTYPE_VOLUME = 2
+D3DRTYPE_TEXTURE = 3
+D3DRTYPE_VOLUMETEXTURE = 4
+D3DRTYPE_CUBETEXTURE = 5
+D3DRTYPE_VERTEXBUFFER = 6
+D3DRTYPE_INDEXBUFFER = 7
+
+D3DQUERYTYPE_EVENT = 8
+D3DQUERYTYPE_TIMESTAMP = 10
+D3DQUERYTYPE_TIMESTAMPDISJOINT = 11
+D3DQUERYTYPE_TIMESTAMPFREQ = 12
+D3DISSUE_END = (1 << 0)
+D3DISSUE_BEGIN = (1 << 1)
+D3DGETDATA_FLUSH = (1 << 0)
+
+
+class D3DFORMAT :
+	values = [
+		("UNKNOWN", 0),
+		("R8G8B8", 20),
+		("A8R8G8B8", 21),
+		("X8R8G8B8", 22),
+		("R5G6B5", 23),
+		("X1R5G5B5", 24),
+		("A1R5G5B5", 25),
+		("A4R4G4B4", 26),
+		("R3G3B2", 27),
+		("A8", 28),
+		("A8R3G3B2", 29),
+		("X4R4G4B4", 30),
+		("A2B10G10R10", 31),
+		("A8B8G8R8", 32),
+		("X8B8G8R8", 33),
+		("G16R16", 34),
+		("A2R10G10B10", 35),
+		("A16B16G16R16", 36),
+		("A8P8", 40),
+		("P8", 41),
+		("L8", 50),
+		("A8L8", 51),
+		("A4L4", 52),
+		("V8U8", 60),
+		("L6V5U5", 61),
+		("X8L8V8U8", 62),
+		("Q8W8V8U8", 63),
+		("V16U16", 64),
+		("A2W10V10U10", 67),
+		("L16", 81),
+		("DXT1", 0x31545844),
+		("DXT2", 0x32545844),
+		("DXT3", 0x33545844),
+		("DXT4", 0x34545844),
+		("DXT5", 0x35545844),
+
+		# Floating point surface formats
+		# s10e5 formats (16-bits per channel)
+		("R16F", 111),
+		("G16R16F", 112),
+		("A16B16G16R16F", 113),
+
+		# IEEE s23e8 formats (32-bits per channel)
+		("R32F", 114),
+		("G32R32F", 115),
+		("A32B32G32R32F", 116),
+		]
+
+	by_num = {}
+	by_str = {}
+
+	for x in values :
+		by_num[x[1]] = x[0]
+		by_str[x[0]] = x[1]
+
+
+# Bits per pixel of each D3DFORMAT
+D3DFORMAT_BITS = {
+	"R8G8B8": 24, "A8R8G8B8": 32, "X8R8G8B8": 32, "R5G6B5": 16,
+	"X1R5G5B5": 16, "A1R5G5B5": 16, "A4R4G4B4": 16, "R3G3B2": 8,
+	"A8": 8, "A8R3G3B2": 16, "X4R4G4B4": 16, "A2B10G10R10": 32,
+	"A8B8G8R8": 32, "X8B8G8R8": 32, "G16R16": 32, "A2R10G10B10": 32,
+	"A16B16G16R16": 64, "A8P8": 16, "P8": 8, "L8": 8, "A8L8": 16,
+	"A4L4": 8, "V8U8": 16, "L6V5U5": 16, "X8L8V8U8": 32, "Q8W8V8U8": 32,
+	"V16U16": 32, "A2W10V10U10": 32, "L16": 16,
+	"DXT1": 4, "DXT2": 8, "DXT3": 8, "DXT4": 8, "DXT5": 8,
+	"R16F": 16, "G16R16F": 32, "A16B16G16R16F": 64,
+	"R32F": 32, "G32R32F": 64, "A32B32G32R32F": 128,
+	}
+
+
+def textureBytes(kind, format_str, width, height, levels=1, slices=1):
+	"""Approximate memory used by a texture with its whole mip chain"""
+	bits = D3DFORMAT_BITS.get(format_str, 32)
+	faces = 6 if kind == "cube" else 1
+	total = 0
+
+	for level in range(max(levels, 1)):
+		texels = max(1, width >> level) * max(1, height >> level)
+		if kind == "volume":
+			texels *= max(1, slices >> level)
+
+		total += texels * bits // 8
+
+	return total * faces
+
+
+class D3DXIMAGE_FILEFORMAT :
+	values = [
+		("BMP", 0),
+		("JPG", 1),
+		("TGA", 2),
+		("PNG", 3),
+		("DDS", 4),
+		("PPM", 5),
+		("DIB", 6),
+		("HDR", 7),
+		("PFM", 8),
+		]
+
+	by_num = {}
+	by_str = {}
+
+	for x in values :
+		name = x[0].lower()
+		value = x[1]
+		by_num[value] = name
+		by_str[name] = value
+
+D3DMULTISAMPLE_TYPE = UINT
+
+class D3DPRESENT_PARAMETERS(Structure):
+	_fields_ = [
+		('BackBufferWidth', UINT),
+		('BackBufferHeight', UINT),
+		('BackBufferFormat', UINT), # D3DFORMAT
+		('BackBufferCount', UINT),
+		('MultiSampleType', D3DMULTISAMPLE_TYPE),
+		('MultiSampleQuality', DWORD),
+		('SwapEffect', D3DSWAPEFFECT),
+		('hDeviceWindow', HWND),
+		('Windowed', BOOL),
+		('EnableAutoDepthStencil', BOOL),
+		('AutoDepthStencilFormat', UINT), # D3DFORMAT
+		('Flags', DWORD),
+		('FullScreen_RefreshRateInHz', UINT),
+		('PresentationInterval', UINT),
+		]
+
+
+class D3DXIMAGE_INFO(Structure):
+	_fields_ = [
+		('Width', UINT),
+		('Height', UINT),
+		('Depth', UINT),
+		('MipLevels', UINT),
+		('Format', UINT), # D3DFORMAT
+		('ResourceType', D3DRESOURCETYPE),
+		('ImageFileFormat', UINT), # D3DXIMAGE_FILEFORMAT
+		]
+
+
+class D3DSURFACE_DESC(Structure):
+	_fields_ = [
+		('Format', UINT), # D3DFORMAT
+		('Type', D3DRESOURCETYPE),
+		('Usage', DWORD),
+		('Pool', D3DPOOL),
+		('MultiSampleType', D3DMULTISAMPLE_TYPE),
+		('MultiSampleQuality', DWORD),
+		('Width', UINT),
+		('Height', UINT),
+		]
+
+
+class D3DVOLUME_DESC(Structure):
+	_fields_ = [
+		('Format', UINT), # D3DFORMAT
+		('Type', D3DRESOURCETYPE),
+		('Usage', DWORD),
+		('Pool', D3DPOOL),
+		('Width', UINT),
+		('Height', UINT),
+		('Depth', UINT),
+		]
+
+
+class D3DXMACRO(Structure):
+	_fields_ = [
+		('Name', LPCSTR),
+		('Definition', LPCSTR),
+		]
+
+
+class D3DLOCKED_RECT(Structure):
+	_fields_ = [
+		('Pitch', INT),
+		('pBits', LPVOID),
+		]
+
+
+class D3DBOX(Structure):
+	_fields_ = [
+		('Left', UINT),
+		('Top', UINT),
+		('Right', UINT),
+		('Bottom', UINT),
+		('Front', UINT),
+		('Back', UINT),
+		]
+
+
+class D3DLOCKED_BOX(Structure):
+	_fields_ = [
+		('RowPitch', INT),
+		('SlicePitch', INT),
+		('pBits', LPVOID),
+		]
+
+
+class D3DVSHADERCAPS2_0(Structure):
+	_fields_ = [
+		('Caps', DWORD),
+		('DynamicFlowControlDepth', INT),
+		('NumTemps', INT),
+		('StaticFlowControlDepth', INT),
+		]
+
+
+class D3DPSHADERCAPS2_0(Structure):
+	_fields_ = [
+		('Caps', DWORD),
+		('DynamicFlowControlDepth', INT),
+		('NumTemps', INT),
+		('StaticFlowControlDepth', INT),
+		('NumInstructionSlots', INT),
+		]
+
+
+class D3DCAPS9(Structure):
+	_fields_ = [(name, DWORD) for name in (
+		'DeviceType', 'AdapterOrdinal', 'Caps', 'Caps2', 'Caps3', 'PresentationIntervals',
+		'CursorCaps', 'DevCaps', 'PrimitiveMiscCaps', 'RasterCaps', 'ZCmpCaps',
+		'SrcBlendCaps', 'DestBlendCaps', 'AlphaCmpCaps', 'ShadeCaps', 'TextureCaps',
+		'TextureFilterCaps', 'CubeTextureFilterCaps', 'VolumeTextureFilterCaps',
+		'TextureAddressCaps', 'VolumeTextureAddressCaps', 'LineCaps',
+		'MaxTextureWidth', 'MaxTextureHeight', 'MaxVolumeExtent', 'MaxTextureRepeat',
+		'MaxTextureAspectRatio', 'MaxAnisotropy',
+		)] + [
+		('MaxVertexW', FLOAT),
+		('GuardBandLeft', FLOAT),
+		('GuardBandTop', FLOAT),
+		('GuardBandRight', FLOAT),
+		('GuardBandBottom', FLOAT),
+		('ExtentsAdjust', FLOAT),
+		] + [(name, DWORD) for name in (
+		'StencilCaps', 'FVFCaps', 'TextureOpCaps', 'MaxTextureBlendStages',
+		'MaxSimultaneousTextures', 'VertexProcessingCaps', 'MaxActiveLights',
+		'MaxUserClipPlanes', 'MaxVertexBlendMatrices', 'MaxVertexBlendMatrixIndex',
+		)] + [
+		('MaxPointSize', FLOAT),
+		] + [(name, DWORD) for name in (
+		'MaxPrimitiveCount', 'MaxVertexIndex', 'MaxStreams', 'MaxStreamStride',
+		'VertexShaderVersion', 'MaxVertexShaderConst', 'PixelShaderVersion',
+		)] + [
+		('PixelShader1xMaxValue', FLOAT),
+		('DevCaps2', DWORD),
+		('MaxNpatchTessellationLevel', FLOAT),
+		] + [(name, DWORD) for name in (
+		'Reserved5', 'MasterAdapterOrdinal', 'AdapterOrdinalInGroup',
+		'NumberOfAdaptersInGroup', 'DeclTypes', 'NumSimultaneousRTs', 'StretchRectFilterCaps',
+		)] + [
+		('VS20Caps', D3DVSHADERCAPS2_0),
+		('PS20Caps', D3DPSHADERCAPS2_0),
+		] + [(name, DWORD) for name in (
+		'VertexTextureFilterCaps', 'MaxVShaderInstructionsExecuted',
+		'MaxPShaderInstructionsExecuted', 'MaxVertexShader30InstructionSlots',
+		'MaxPixelShader30InstructionSlots',
+		)]
+
+
+class D3DXVECTOR4(Structure):
+	_fields_ = [
+		('x', FLOAT), ('y', FLOAT), ('z', FLOAT), ('w', FLOAT),
+		]
+
+
+class TRI_VTX(Structure):
+	FVF = 0x00000104 # D3DFVF_XYZRHW | D3DFVF_TEXCOORDSIZE2( 0 ) | D3DFVF_TEX1
+	_fields_ = [
+		('x0', FLOAT), ('y0', FLOAT), ('z0', FLOAT), ('w0', FLOAT), ('u0', FLOAT), ('v0', FLOAT),
+		('x1', FLOAT), ('y1', FLOAT), ('z1', FLOAT), ('w1', FLOAT), ('u1', FLOAT), ('v1', FLOAT),
+		('x2', FLOAT), ('y2', FLOAT), ('z2', FLOAT), ('w2', FLOAT), ('u2', FLOAT), ('v2', FLOAT),
+		]
+
+
+class QUAD_VTX(Structure):
+	FVF = 0x00000104 # D3DFVF_XYZRHW | D3DFVF_TEXCOORDSIZE2( 0 ) | D3DFVF_TEX1
+	_fields_ = [
+		('x0', FLOAT), ('y0', FLOAT), ('z0', FLOAT), ('w0', FLOAT), ('u0', FLOAT), ('v0', FLOAT),
+		('x1', FLOAT), ('y1', FLOAT), ('z1', FLOAT), ('w1', FLOAT), ('u1', FLOAT), ('v1', FLOAT),
+		('x2', FLOAT), ('y2', FLOAT), ('z2', FLOAT), ('w2', FLOAT), ('u2', FLOAT), ('v2', FLOAT),
+		('x3', FLOAT), ('y3', FLOAT), ('z3', FLOAT), ('w3', FLOAT), ('u3', FLOAT), ('v3', FLOAT),
+		]
+
+
+# Raw pixel layout of the formats that map onto NumPy arrays:
+# D3DFORMAT -> (dtype, channels in memory order). "x" marks an unused channel.
+D3DFORMAT_LAYOUT = {
+	"R8G8B8": ("u1", "bgr"),
+	"A8R8G8B8": ("u1", "bgra"),
+	"X8R8G8B8": ("u1", "bgrx"),
+	"A8B8G8R8": ("u1", "rgba"),
+	"X8B8G8R8": ("u1", "rgbx"),
+	"A8": ("u1", "a"),
+	"L8": ("u1", "l"),
+	"A8L8": ("u1", "la"),
+	"G16R16": ("<u2", "rg"),
+	"A16B16G16R16": ("<u2", "rgba"),
+	"L16": ("<u2", "l"),
+	"R16F": ("<f2", "r"),
+	"G16R16F": ("<f2", "rg"),
+	"A16B16G16R16F": ("<f2", "rgba"),
+	"R32F": ("<f4", "r"),
+	"G32R32F": ("<f4", "rg"),
+	"A32B32G32R32F": ("<f4", "rgba"),
+	}
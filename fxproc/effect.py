@@ -0,0 +1,945 @@
+import os
+import array
+import ctypes
+import numbers
+import weakref
+from contextlib import contextmanager
+
+from .d3dtypes import *
+from .backend import Device, getBackend, currentBackend
+from .batch import Batch
+from .fence import Fence
+from .effect_cache import EffectCache, defaultCacheDir, sourceKey
+
+
+def _call(backend, method, args, refs=()):
+	"""Run a backend call now, or record it when a batch is active"""
+	if backend.batch is not None:
+		backend.batch.record(method, args, refs)
+	else:
+		return backend.run(method, args)
+
+
+def _sync(backend):
+	"""Submit recorded calls before something that needs their results"""
+	if backend.batch is not None:
+		backend.batch.submit()
+
+
+def _fileFormat(name):
+	try:
+		return D3DXIMAGE_FILEFORMAT.by_str[name.lstrip(".").lower()]
+	except KeyError:
+		raise ValueError("Unknown image file format %r" % (name))
+
+
+@contextmanager
+def _batched(backend):
+	"""The active batch, or a new one submitted on exit"""
+	if backend.batch is not None:
+		yield backend.batch
+	else:
+		with Batch(backend) as batch:
+			yield batch
+
+
+def _floats(values, size=None):
+	"""(contiguous float32 buffer, float count) of a NumPy array or a nested sequence"""
+	if hasattr(values, "__array_interface__"):
+		import numpy as np
+		data = np.ascontiguousarray(values, np.float32).reshape(-1)
+	else:
+		data = array.array('f')
+		for value in values:
+			if isinstance(value, numbers.Real):
+				data.append(value)
+			else:
+				data.extend(value)
+
+	if size is not None and len(data) % size != 0:
+		raise ValueError("Expected a multiple of %d floats, got %d" % (size, len(data)))
+
+	return data, len(data)
+
+
+def _triBuffer(tris):
+	"""TRI_VTX array over `tris`: a TRI_VTX array, or any contiguous buffer of
+float32 x, y, z, rhw, u, v vertices such as arrays.trisArray(). Writable
+buffers are used in place, read-only ones are copied.
+"""
+	if isinstance(tris, ctypes.Array) and tris._type_ is TRI_VTX:
+		return tris
+
+	view = memoryview(tris)
+	size = ctypes.sizeof(TRI_VTX)
+
+	if not view.c_contiguous:
+		raise ValueError("Triangle data must be contiguous")
+
+	if view.format.lstrip("<=@") not in ("f", "B", "b", "c") and not view.format.startswith("T{"):
+		raise TypeError("Triangle data must be float32, got format %r" % (view.format))
+
+	if view.nbytes % size != 0:
+		raise ValueError("Triangle data of %d bytes is not a whole number of TRI_VTX" % (view.nbytes))
+
+	array_type = TRI_VTX * (view.nbytes // size)
+
+	if view.readonly:
+		return array_type.from_buffer_copy(view)
+
+	return array_type.from_buffer(view)
+
+
+def _indexBuffer(indices):
+	"""(ctypes array, index count, index size) of 16 or 32-bit unsigned indices"""
+	try:
+		view = memoryview(indices)
+	except TypeError:
+		view = None
+
+	if view is not None and view.c_contiguous and view.format.lstrip("<=@") in ("H", "I", "L") and view.itemsize in (2, 4):
+		array_type = (ctypes.c_uint16 if view.itemsize == 2 else ctypes.c_uint32) * (view.nbytes // view.itemsize)
+		data = array_type.from_buffer_copy(view) if view.readonly else array_type.from_buffer(view)
+
+		return data, len(data), view.itemsize
+
+	flat = array.array('I')
+	for index in (view.tolist() if view is not None else indices):
+		if isinstance(index, numbers.Integral):
+			flat.append(index)
+		else:
+			flat.extend(index)
+
+	size = 2 if not flat or max(flat) < 0x10000 else 4
+	if size == 2:
+		flat = array.array('H', flat)
+
+	data = ((ctypes.c_uint16 if size == 2 else ctypes.c_uint32) * len(flat)).from_buffer(flat)
+
+	return data, len(flat), size
+
+
+def handleKey(handle):
+	"""Registry key of a backend handle: the COM pointer value, or the object id"""
+	return handle.value if isinstance(handle, ctypes.c_void_p) else id(handle)
+
+
+def _release(registry, key, backend, method, handle):
+	registry.pop(key, None)
+	getattr(backend, method)(handle)
+
+
+class Resource :
+	"""Base of Texture and Effect: registers the handle in `registry` and
+releases it through the backend exactly once, on release(), on garbage
+collection or when the device goes away, whichever comes first.
+
+	with Effect.createRenderTarget(512, 512, "R32F") as t:
+		...
+"""
+
+	registry = None
+	release_method = None
+
+	def _register(self, handle, backend, format_str=None, nbytes=0):
+		self.handle = handle
+		self.backend = backend
+
+		key = handleKey(handle)
+		finalizer = weakref.finalize(self, _release, self.registry, key, backend, self.release_method, handle)
+		finalizer.atexit = False
+
+		self.registry[key] = (finalizer, backend, format_str, nbytes)
+		self._finalizer = finalizer
+
+	def release(self):
+		if self.handle is not None:
+			_sync(self.backend)
+			self._finalizer()
+			self.handle = None
+
+	@property
+	def released(self):
+		return not self._finalizer.alive
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.release()
+
+
+class Texture(Resource):
+
+	# handle key -> (finalizer, backend, format, nbytes)
+	all_textures = {}
+	registry = all_textures
+	release_method = "releaseTexture"
+
+	def __init__(self, handle, name = "", backend = None):
+		assert(handle)
+
+		backend = backend or getBackend()
+
+		kind, format_name, width, height, levels, slices = backend.describeTexture(handle)
+
+		self.kind = kind
+		self.format = format_name
+		self.width = width
+		self.height = height
+		self.levels = levels
+		self.slices = slices
+		self.name = name
+
+		# Bumped whenever the texture may be written, see fxproc.graph
+		self.version = 0
+
+		self._register(handle, backend, format_name, self.nbytes)
+
+	@property
+	def d3d_texture(self):
+		return self.handle
+
+	@property
+	def nbytes(self):
+		return textureBytes(self.kind, self.format, self.width, self.height, self.levels, self.slices)
+
+	def toNumpy(self, level=0, face=0, out=None):
+		"""Copy of one level (and cube face) in the raw layout of the texture format,
+e.g. (h, w, 4) uint8 in B, G, R, A order for A8R8G8B8 or (h, w) float32 for R32F.
+Volume levels get a leading depth axis. With `out` the level is copied into
+that array (e.g. a memory-mapped file) and it is returned.
+"""
+		_sync(self.backend)
+		return self.backend.readTexture(self.handle, level, face, out)
+
+	def write(self, array, level=0, face=0):
+		"""Replace one level (and cube face) with an array in the raw layout of the
+texture format, the inverse of toNumpy(). Works on render targets too.
+"""
+		_sync(self.backend)
+		self.version += 1
+		self.backend.writeTexture(self.handle, array, level, face)
+
+	def __str__(self):
+		handle = handleKey(self.handle) if self.handle is not None else 0
+
+		return (
+			"width=" + str(self.width) +
+			" height=" + str(self.height) +
+			" format=" + self.format +
+			" levels=" + str(self.levels) +
+			" slices=" + str(self.slices) +
+			" d3d_texture=" + hex(handle) +
+			" name=" + '"' + self.name + '"'
+			)
+
+	@staticmethod
+	def check_type_of(obj):
+		assert isinstance(obj, Texture), "object %r is not a texture" % (obj)
+		assert not obj.released, "texture %r was released" % (obj.name)
+
+
+class VertexBuffer(Resource):
+	"""Triangle list vertices kept on the device, see Effect.createVertexBuffer()"""
+
+	# handle key -> (finalizer, backend, kind, nbytes), shared with IndexBuffer
+	all_buffers = {}
+	registry = all_buffers
+	release_method = "releaseBuffer"
+
+	def __init__(self, tris, dynamic=False, backend=None):
+		data = _triBuffer(tris)
+		backend = backend or getBackend()
+
+		self.count = len(data) * 3
+		self.dynamic = dynamic
+
+		handle = backend.createVertexBuffer(data, self.count, dynamic)
+		self._register(handle, backend, "vertex", ctypes.sizeof(data))
+
+	@property
+	def tri_count(self):
+		return self.count // 3
+
+	def update(self, tris):
+		"""Overwrite the first vertices, at most as many as the buffer was created with"""
+		data = _triBuffer(tris)
+
+		if len(data) * 3 > self.count:
+			raise ValueError("%d vertices do not fit a buffer of %d" % (len(data) * 3, self.count))
+
+		_sync(self.backend)
+		self.backend.updateVertexBuffer(self.handle, data, len(data) * 3, self.dynamic)
+
+
+class IndexBuffer(Resource):
+	"""Triangle list indices kept on the device, see Effect.createIndexBuffer()"""
+
+	registry = VertexBuffer.all_buffers
+	release_method = "releaseBuffer"
+
+	def __init__(self, indices, dynamic=False, backend=None):
+		data, count, size = _indexBuffer(indices)
+		backend = backend or getBackend()
+
+		if count % 3 != 0:
+			raise ValueError("Triangle lists need 3 indices per triangle, got %d" % (count))
+
+		self.count = count
+		self.index_size = size
+		self.dynamic = dynamic
+
+		handle = backend.createIndexBuffer(data, count, size, dynamic)
+		self._register(handle, backend, "index", count * size)
+
+	@property
+	def tri_count(self):
+		return self.count // 3
+
+	def update(self, indices):
+		data, count, size = _indexBuffer(indices)
+
+		if count > self.count:
+			raise ValueError("%d indices do not fit a buffer of %d" % (count, self.count))
+
+		if size != self.index_size:
+			data = ((ctypes.c_uint16 if self.index_size == 2 else ctypes.c_uint32) * count)(*data)
+
+		_sync(self.backend)
+		self.backend.updateIndexBuffer(self.handle, data, count, self.index_size, self.dynamic)
+
+
+class Effect(Resource):
+	"""Essential bindings for Effect manipulation
+
+- open                   ( file_name, defines = None, optimize = False )
+- fromstring             ( text, defines = None, optimize = False )
+- registerTechnique      ( technique_name, kernel )
+
+- createRenderTarget     ( width, height, format_str, levels = 1 )
+- createRenderTargetCube ( size,          format_str, levels = 1 )
+- createVolumeTexture    ( width, height, format_str, levels = 1, slices = 1 )
+
+- loadTexture            ( file_name, levels = 0 )
+- saveTexture            ( texture_or_render_target, file_name )
+- loadTextureFromMemory  ( data, levels = 0 )
+- saveTextureToMemory    ( texture_or_render_target, file_format ) -> bytes
+- textureFromNumpy       ( array, format_str, levels = 1, kind = None )
+
+- setRenderTarget        ( render_target, level = 0, face = 0 )
+- setRenderTargets       ( [render_target, ...], level = 0, face = 0 )
+- clear                  ( r_byte, g_byte, b_byte, a_byte )
+- drawQuad               ( technique_name )
+- createTris             ( tri_count )
+- drawTris               ( tris, technique_name )
+- createVertexBuffer     ( tris, dynamic = False )
+- createIndexBuffer      ( indices, dynamic = False )
+- drawBuffer             ( vertex_buffer, technique_name, index_buffer = None, first = 0, count = None )
+- copyLevelToVolumeSlice ( source, destination_volume, slice, src_level = 0, src_face = 0, dest_level = 0 )
+- renderToVolume         ( volume, technique_name, slice_param = "slice", group = 16 )
+- copyLevel              ( source, destination, src_level = 0, dst_level = 0, src_face = 0, dst_face = 0, filter = "linear" )
+- generateMips           ( render_target, technique_name = None )
+- buildPyramid           ( render_target, technique_name = None, levels = 0 )
+- reduce                 ( texture_or_render_target, op = "sum" ) -> (r, g, b, a)
+- histogram              ( texture_or_render_target, bins = 256, channel = "r" ) -> [count]
+- flush                  ()
+- submit                 () -> fence
+- batch                  ()
+- profile                ()
+- record                 ( trace_file_name )
+
+- setFloat               ( name, x )
+- setFloat4              ( name, x, y, z, w )
+- setInt                 ( name, x )
+- setFloatArray          ( name, floats )
+- setVectorArray         ( name, vectors )
+- setMatrix              ( name, matrix_4x4 )
+- setTexture             ( name, texture_or_render_target )
+- params.update          ( { name: value } )
+
+- release                ()
+
+Textures and effects are released on release(), when leaving a `with`
+block or when garbage collected. fxproc.liveResources() reports what is
+still alive.
+
+All calls go through the current backend, see fxproc.setBackend().
+Compiled effects are cached in Effect.cache, see fxproc.effect_cache.
+"""
+
+	# handle key -> (finalizer, backend, None, 0)
+	all_effects = {}
+	registry = all_effects
+	release_method = "releaseEffect"
+
+	curr_target_size = (0, 0)
+	cache = EffectCache(defaultCacheDir())
+
+	def __init__(self, handle, name = "", backend = None):
+		assert(handle)
+
+		self.name = name
+		self.params = EffectParams(self)
+		self._register(handle, backend or getBackend())
+
+		# Hash of the source, includes and macros, see fxproc.memo
+		self.source_key = None
+
+		# (fx_name, text, defines, optimize) it was created from and the kernels
+		# given to registerTechnique(), see fxproc.trace
+		self.origin = None
+		self.kernels = {}
+
+	@property
+	def d3d_effect(self):
+		return self.handle
+
+	@staticmethod
+	def open(fx_name, defines=None, optimize=False):
+		effect = Effect(Effect.cache.openEffect(getBackend(), fx_name, defines, optimize), name=fx_name)
+		effect.source_key = sourceKey(effect.backend, fx_name, None, defines, optimize)
+		effect.origin = (fx_name, None, defines, optimize)
+
+		return effect
+
+	@staticmethod
+	def fromstring(text, defines=None, optimize=False):
+		effect = Effect(Effect.cache.createEffect(getBackend(), text, defines, optimize), name="<string>")
+		effect.source_key = sourceKey(effect.backend, None, text, defines, optimize)
+		effect.origin = (None, text, defines, optimize)
+
+		return effect
+
+	def registerTechnique(self, technique_name, kernel):
+		self.backend.registerTechnique(self.handle, technique_name, kernel)
+		self.kernels[technique_name] = kernel
+
+	@staticmethod
+	def loadTexture(file_name, levels=0):
+		return Texture(getBackend().loadTexture(file_name, levels), name=file_name)
+
+	@staticmethod
+	def loadTextureFromMemory(data, levels=0):
+		"""Decode an image file held in a bytes-like object, e.g. fetched from storage"""
+		if not isinstance(data, bytes):
+			data = bytes(data)
+
+		return Texture(getBackend().loadTextureFromMemory(data, levels), name="<memory>")
+
+	@staticmethod
+	def saveTexture(pyobj, file_name):
+		Texture.check_type_of(pyobj)
+
+		format = _fileFormat(os.path.splitext(file_name)[1][1:])
+
+		_sync(pyobj.backend)
+		pyobj.backend.saveTexture(pyobj.handle, file_name, format)
+
+	@staticmethod
+	def saveTextureToMemory(pyobj, file_format):
+		"""Encoded image file as bytes; `file_format` is an extension such as "png" or "dds".
+The numpy backend has no "hdr" and writes 8-bit "dds"; "pfm" keeps float data.
+"""
+		Texture.check_type_of(pyobj)
+
+		format = _fileFormat(file_format)
+
+		_sync(pyobj.backend)
+		return pyobj.backend.saveTextureToMemory(pyobj.handle, format)
+
+	@staticmethod
+	def textureFromNumpy(array, format_str="A8R8G8B8", levels=1, kind=None):
+		"""Upload an array in the raw layout of `format_str` (see Texture.toNumpy).
+An extra leading axis makes a volume, or a cube with kind="cube" and 6 faces.
+Levels other than 1 are filled from the top level with a box filter.
+"""
+		from . import arrays
+
+		kind = arrays.imageShape(array, format_str, kind)[0]
+		texture = getBackend().createTextureFromArray(kind, array, format_str, levels)
+
+		return Texture(texture, name="<numpy>")
+
+	@staticmethod
+	def createRenderTarget(width, height, format_str, levels=1):
+		texture = getBackend().createTexture("2d", width, height, format_str, levels)
+		return Texture(texture, name="<renderTarget>")
+
+	@staticmethod
+	def createRenderTargetCube(size, format_str, levels=1):
+		texture = getBackend().createTexture("cube", size, size, format_str, levels)
+		return Texture(texture, name="<renderTargetCube>")
+
+	@staticmethod
+	def createVolumeTexture(width, height, format_str, levels=1, slices=1):
+		texture = getBackend().createTexture("volume", width, height, format_str, levels, slices)
+		return Texture(texture, name="<volumeTexture>")
+
+	@staticmethod
+	def copyLevelToVolumeSlice(src_pyobj, dest_pyobj, slice_index, src_level=0, src_face=0, dest_level=0):
+		"""Copy a render target level into one slice of a volume level of the same
+size and format, without a round trip through NumPy.
+"""
+		Texture.check_type_of(src_pyobj)
+		Texture.check_type_of(dest_pyobj)
+
+		if src_pyobj.kind == "volume" or dest_pyobj.kind != "volume":
+			raise TypeError("Expected a render target and a volume texture")
+
+		size = (max(1, src_pyobj.width >> src_level), max(1, src_pyobj.height >> src_level))
+		dest_size = (max(1, dest_pyobj.width >> dest_level), max(1, dest_pyobj.height >> dest_level))
+		slices = max(1, dest_pyobj.slices >> dest_level)
+
+		if size != dest_size or src_pyobj.format != dest_pyobj.format:
+			raise ValueError("Can't copy a %dx%d %s level into a %dx%d %s volume" % (size + (src_pyobj.format,) + dest_size + (dest_pyobj.format,)))
+
+		if not 0 <= slice_index < slices:
+			raise ValueError("Slice %d is outside of %d slices" % (slice_index, slices))
+
+		dest_pyobj.version += 1
+		args = (src_pyobj.handle, src_level, src_face, dest_pyobj.handle, slice_index, dest_level)
+		_call(src_pyobj.backend, "copyLevelToVolumeSlice", args, (src_pyobj, dest_pyobj))
+
+	def renderToVolume(self, pyobj, technique_name, slice_param="slice", pool=None, group=16):
+		"""Render every slice of volume level 0 with `technique_name` and copy it in,
+in one batched submission. `slice_param` is set to the depth texture
+coordinate of the slice, (i + 0.5) / slices. Slices are rendered `group`
+at a time into pooled targets before being copied, so the device keeps
+drawing while earlier slices are read back.
+"""
+		from .pool import TexturePool
+
+		Texture.check_type_of(pyobj)
+
+		if pyobj.kind != "volume":
+			raise TypeError("Expected a volume texture")
+
+		scratch = pool or TexturePool()
+
+		try:
+			with _batched(self.backend):
+				for first in range(0, pyobj.slices, group):
+					indices = range(first, min(first + group, pyobj.slices))
+					targets = []
+
+					try:
+						for i in indices:
+							target = scratch.acquire(pyobj.width, pyobj.height, pyobj.format)
+							targets.append(target)
+
+							self.setFloat(slice_param, (i + 0.5) / pyobj.slices)
+							Effect.setRenderTarget(target)
+							self.drawQuad(technique_name)
+
+						for i, target in zip(indices, targets):
+							Effect.copyLevelToVolumeSlice(target, pyobj, i)
+					finally:
+						for target in targets:
+							scratch.release(target)
+		finally:
+			if pool is None:
+				scratch.clear()
+
+	@staticmethod
+	def copyLevel(src_pyobj, dest_pyobj, src_level=0, dest_level=0, src_face=0, dest_face=0, filter="linear"):
+		"""Copy one texture level (or cube face) into a render target level on the
+device, scaled with "linear" or "point" filtering when the sizes differ.
+Sources that aren't render targets, e.g. loaded textures, are copied with
+a draw that samples them.
+"""
+		Texture.check_type_of(src_pyobj)
+		Texture.check_type_of(dest_pyobj)
+
+		dest_pyobj.version += 1
+		args = (src_pyobj.handle, src_level, src_face, dest_pyobj.handle, dest_level, dest_face, filter)
+		_call(src_pyobj.backend, "copyLevel", args, (src_pyobj, dest_pyobj))
+
+	def generateMips(self, pyobj, technique_name=None, input_name="baseMapTexture", pool=None):
+		"""Fill levels 1.. of every face of a render target from the level above,
+in one batched submission. Without a technique each level is a 2x2 box
+filter of the previous one. A technique reads a copy of the previous
+level through `input_name` and renders the next one.
+"""
+		from .pool import TexturePool
+
+		Texture.check_type_of(pyobj)
+
+		if pyobj.kind == "volume":
+			raise TypeError("Volume textures can't be render targets")
+
+		scratch = pool or TexturePool()
+
+		try:
+			with _batched(self.backend):
+				for face in range(6 if pyobj.kind == "cube" else 1):
+					for level in range(1, pyobj.levels):
+						if technique_name is None:
+							Effect.copyLevel(pyobj, pyobj, level - 1, level, face, face)
+							continue
+
+						# The previous level can't be sampled while its texture is the target
+						width = max(1, pyobj.width >> (level - 1))
+						height = max(1, pyobj.height >> (level - 1))
+
+						with scratch.lease(width, height, pyobj.format) as previous:
+							Effect.copyLevel(pyobj, previous, level - 1, 0, face, 0, "point")
+							self.setTexture(input_name, previous)
+							Effect.setRenderTarget(pyobj, level, face)
+							self.drawQuad(technique_name)
+		finally:
+			if pool is None:
+				scratch.clear()
+
+	def buildPyramid(self, pyobj, technique_name=None, levels=0, format_str=None, input_name="baseMapTexture"):
+		"""New render target (a cube for cube sources) holding `pyobj` in level 0
+and `levels` levels (0 for the full chain) made by generateMips(), e.g. a
+Gaussian pyramid with a blur technique. One batched submission. Block
+compressed sources get an A8R8G8B8 pyramid unless `format_str` is given.
+"""
+		Texture.check_type_of(pyobj)
+
+		# DXT formats can't be render targets
+		format_str = format_str or ("A8R8G8B8" if pyobj.format.startswith("DXT") else pyobj.format)
+
+		if pyobj.kind == "cube":
+			target = Effect.createRenderTargetCube(pyobj.width, format_str, levels)
+		else:
+			target = Effect.createRenderTarget(pyobj.width, pyobj.height, format_str, levels)
+
+		with _batched(self.backend):
+			for face in range(6 if pyobj.kind == "cube" else 1):
+				Effect.copyLevel(pyobj, target, 0, 0, face, face, "point")
+
+			self.generateMips(target, technique_name, input_name)
+
+		return target
+
+	@staticmethod
+	def reduce(pyobj, op="sum", level=0, face=0, pool=None):
+		"""(r, g, b, a) "sum", "min", "max" or "mean" of one level (and cube face),
+computed on the device with only a few bytes read back, see fxproc.reduction
+"""
+		from .reduction import reduce
+		return reduce(pyobj, op, level, face, pool)
+
+	@staticmethod
+	def histogram(pyobj, bins=256, channel="r", level=0, face=0, pool=None):
+		"""Texel counts in `bins` even ranges of 0..1 of `channel` ("r", "g", "b",
+"a" or "l" for luminance), see fxproc.reduction
+"""
+		from .reduction import histogram
+		return histogram(pyobj, bins, channel, level, face, pool)
+
+	@staticmethod
+	def setRenderTarget(pyobj, level=0, face=0):
+		Texture.check_type_of(pyobj)
+
+		Effect.curr_target_size = (float(max(1, pyobj.width >> level)), float(max(1, pyobj.height >> level)))
+		pyobj.version += 1
+		_call(pyobj.backend, "setRenderTarget", (pyobj.handle, level, face), (pyobj,))
+
+	@staticmethod
+	def setRenderTargets(pyobjs, level=0, face=0):
+		"""Bind targets of one size to COLOR0, COLOR1.. of the next draws, so a
+technique writes them all in one pass. Slots left over from a previous
+call are unbound.
+"""
+		pyobjs = list(pyobjs)
+
+		for pyobj in pyobjs:
+			Texture.check_type_of(pyobj)
+
+		if not pyobjs:
+			raise ValueError("No render targets given")
+
+		backend = pyobjs[0].backend
+
+		if len(pyobjs) > backend.max_render_targets:
+			raise ValueError("%d render targets, backend %r takes up to %d" % (len(pyobjs), backend.name, backend.max_render_targets))
+		if len(set(map(id, pyobjs))) != len(pyobjs):
+			raise ValueError("A texture is bound to more than one render target")
+
+		size = (max(1, pyobjs[0].width >> level), max(1, pyobjs[0].height >> level))
+
+		for pyobj in pyobjs:
+			if pyobj.backend is not backend:
+				raise ValueError("Render targets belong to different backends")
+			if pyobj.kind == "volume":
+				raise TypeError("Incorrect render target type")
+			if (max(1, pyobj.width >> level), max(1, pyobj.height >> level)) != size:
+				raise ValueError("Render target %r is %dx%d at level %d, expected %dx%d" % (pyobj.name, max(1, pyobj.width >> level), max(1, pyobj.height >> level), level, size[0], size[1]))
+
+		Effect.curr_target_size = (float(size[0]), float(size[1]))
+
+		for pyobj in pyobjs:
+			pyobj.version += 1
+
+		_call(backend, "setRenderTargets", (tuple(pyobj.handle for pyobj in pyobjs), level, face), tuple(pyobjs))
+
+	@staticmethod
+	def clear(r=0, g=0, b=0, a=0):
+		ir = min(max(int(r), 0), 255)
+		ig = min(max(int(g), 0), 255)
+		ib = min(max(int(b), 0), 255)
+		ia = min(max(int(a), 0), 255)
+
+		_call(getBackend(), "clear", (ir, ig, ib, ia))
+
+	def drawQuad(self, technique_name, do_flush=True):
+		if self.backend.batch is not None:
+			_call(self.backend, "drawQuad", (self.handle, technique_name, False), (self,))
+		else:
+			self.backend.run("drawQuad", (self.handle, technique_name, do_flush))
+
+	@staticmethod
+	def createTris(tri_count):
+		return (TRI_VTX * tri_count)()
+
+	def drawTris(self, tri_list, technique_name, do_flush=True):
+		"""Draw a TRI_VTX array, or a float32 NumPy/buffer array of the same layout
+(see arrays.trisArray), without copying it. Use a VertexBuffer to draw the
+same triangles many times.
+"""
+		tri_list = _triBuffer(tri_list)
+
+		if self.backend.batch is not None:
+			# Copy, the caller may refill the array before the batch is submitted
+			tri_copy = type(tri_list).from_buffer_copy(tri_list)
+			_call(self.backend, "drawTris", (self.handle, tri_copy, technique_name, False), (self,))
+		else:
+			self.backend.run("drawTris", (self.handle, tri_list, technique_name, do_flush))
+
+	@staticmethod
+	def createVertexBuffer(tris, dynamic=False):
+		"""Upload triangles once to draw them many times with drawBuffer().
+Dynamic buffers are meant to be refilled with update() every frame.
+"""
+		return VertexBuffer(tris, dynamic)
+
+	@staticmethod
+	def createIndexBuffer(indices, dynamic=False):
+		"""Indices into a VertexBuffer, 3 per triangle; 32-bit when any index needs it"""
+		return IndexBuffer(indices, dynamic)
+
+	def drawBuffer(self, vertex_buffer, technique_name, index_buffer=None, first=0, count=None, do_flush=True):
+		"""Draw `count` triangles from triangle `first` on. Draws larger than the
+device primitive limit are split.
+"""
+		assert isinstance(vertex_buffer, VertexBuffer) and not vertex_buffer.released, "object %r is not a vertex buffer" % (vertex_buffer)
+		assert index_buffer is None or isinstance(index_buffer, IndexBuffer), "object %r is not an index buffer" % (index_buffer)
+
+		total = (index_buffer or vertex_buffer).tri_count
+		count = total - first if count is None else count
+
+		if first < 0 or count < 0 or first + count > total:
+			raise ValueError("Triangles %d..%d are out of range 0..%d" % (first, first + count, total))
+
+		index_handle = index_buffer.handle if index_buffer is not None else None
+		args = (self.handle, vertex_buffer.handle, vertex_buffer.count, index_handle, first, count, technique_name)
+		refs = (self, vertex_buffer, index_buffer)
+
+		if self.backend.batch is not None:
+			_call(self.backend, "drawBuffer", args + (False,), refs)
+		else:
+			self.backend.run("drawBuffer", args + (do_flush,))
+
+	@staticmethod
+	def flush():
+		backend = getBackend()
+
+		if backend.batch is not None:
+			backend.batch.submit()
+		else:
+			backend.run("flush", ())
+
+	@staticmethod
+	def submit():
+		"""Send everything drawn or recorded so far to the GPU without waiting.
+Returns a fxproc.fence.Fence with done(), wait(timeout) and await.
+"""
+		backend = getBackend()
+
+		if backend.batch is not None:
+			return backend.batch.submit()
+
+		backend.endScene()
+		backend.run("flush", ())
+
+		return Fence(backend)
+
+	@staticmethod
+	def batch():
+		"""Context manager recording draws into one submission, see fxproc.batch"""
+		return Batch(getBackend())
+
+	@staticmethod
+	def profile():
+		"""Context manager timing draws on the GPU and CPU, see fxproc.profiler"""
+		from .profiler import Profiler
+		return Profiler(getBackend())
+
+	@staticmethod
+	def record(file_name):
+		"""Context manager writing every device call to a trace file, see fxproc.trace"""
+		from .trace import Recorder
+		return Recorder(file_name, getBackend())
+
+	def setFloat(self, name, x):
+		self.params.values[name] = float(x)
+		_call(self.backend, "setFloat", (self.handle, name, float(x)), (self,))
+
+	def setFloat4(self, name, x, y=0.0, z=0.0, w=0.0):
+		vec = (float(x), float(y), float(z), float(w))
+		self.params.values[name] = vec
+		_call(self.backend, "setVector", (self.handle, name) + vec, (self,))
+
+	def setInt(self, name, x):
+		self.params.values[name] = int(x)
+		_call(self.backend, "setInt", (self.handle, name, int(x)), (self,))
+
+	def setFloatArray(self, name, floats):
+		data, count = _floats(floats)
+		self.params.values[name] = data.tobytes()
+		_call(self.backend, "setFloatArray", (self.handle, name, data, count), (self,))
+
+	def setVectorArray(self, name, vectors):
+		"""Set float4 array elements from an (n, 4) array or a sequence of 4-tuples"""
+		data, count = _floats(vectors, 4)
+		self.params.values[name] = data.tobytes()
+		_call(self.backend, "setVectorArray", (self.handle, name, data, count // 4), (self,))
+
+	def setMatrix(self, name, matrix):
+		"""Set a float4x4 from 16 floats or a 4x4 array, row major like D3DXMATRIX"""
+		data, count = _floats(matrix)
+		if count != 16:
+			raise ValueError("A matrix needs 16 floats, got %d" % (count))
+
+		self.params.values[name] = data.tobytes()
+		_call(self.backend, "setMatrix", (self.handle, name, data), (self,))
+
+	def setTexture(self, name, pyobj):
+		Texture.check_type_of(pyobj)
+
+		self.params.values[name] = pyobj
+		_call(self.backend, "setTexture", (self.handle, name, pyobj.handle), (self, pyobj))
+
+
+class EffectParams :
+	"""Bulk parameter updates that skip values the effect already has
+
+	fx.params.update({"fScale": 2.0, "vColor": (1, 0, 0, 1), "baseMapTexture": tex})
+
+Values are dispatched on their type: Texture, int, float, a sequence of
+up to 4 floats (float4), a 4x4 array (matrix), an (n, 4) array (float4
+array) or any other float sequence (float array).
+"""
+
+	def __init__(self, effect):
+		self.effect = weakref.proxy(effect)
+
+		# Last value set through any Effect setter, by parameter name
+		self.values = {}
+		self.skipped = 0
+
+	def __getitem__(self, name):
+		return self.values[name]
+
+	def __contains__(self, name):
+		return name in self.values
+
+	def __setitem__(self, name, value):
+		self.update({name: value})
+
+	def update(self, params):
+		effect = self.effect
+
+		for name, value in params.items():
+			old = self.values.get(name)
+
+			if isinstance(value, Texture):
+				if old is value:
+					self.skipped += 1
+				else:
+					effect.setTexture(name, value)
+
+			elif isinstance(value, numbers.Integral):
+				if old == int(value) and type(old) is int:
+					self.skipped += 1
+				else:
+					effect.setInt(name, value)
+
+			elif isinstance(value, numbers.Real):
+				if old == float(value) and type(old) is float:
+					self.skipped += 1
+				else:
+					effect.setFloat(name, value)
+
+			else:
+				self.__setArray(name, value, old)
+
+	def __setArray(self, name, value, old):
+		data, count = _floats(value)
+
+		shape = getattr(value, "shape", None)
+		if shape is None:
+			shape = (count,) if count == len(value) else (len(value), count // max(len(value), 1))
+
+		if len(shape) == 1 and count <= 4:
+			vec = tuple(float(x) for x in data) + (0.0,) * (4 - count)
+			if old == vec:
+				self.skipped += 1
+			else:
+				self.effect.setFloat4(name, *vec)
+
+		elif old == data.tobytes():
+			self.skipped += 1
+
+		elif tuple(shape) == (4, 4):
+			self.effect.setMatrix(name, data)
+
+		elif len(shape) == 2 and shape[1] == 4:
+			self.effect.setVectorArray(name, data)
+
+		else:
+			self.effect.setFloatArray(name, data)
+
+
+def releaseResources(backend=None):
+	"""Release every live texture, buffer and effect, or only those of `backend`"""
+	for registry in (Effect.all_effects, Texture.all_textures, VertexBuffer.all_buffers):
+		for finalizer, owner, format_str, nbytes in list(registry.values()):
+			if backend is None or owner is backend:
+				finalizer()
+
+
+def liveResources():
+	"""Live texture count and bytes, total and by format, and live effect and buffer counts"""
+	by_format = {}
+	count = 0
+	total = 0
+
+	for finalizer, backend, format_str, nbytes in list(Texture.all_textures.values()):
+		stats = by_format.setdefault(format_str, {"count": 0, "bytes": 0})
+		stats["count"] += 1
+		stats["bytes"] += nbytes
+		count += 1
+		total += nbytes
+
+	buffers = list(VertexBuffer.all_buffers.values())
+
+	return {
+		"textures": count,
+		"bytes": total,
+		"effects": len(Effect.all_effects),
+		"buffers": len(buffers),
+		"buffer_bytes": sum(entry[3] for entry in buffers),
+		"by_format": by_format,
+		}
+
+
+def _cleanup():
+	for device in list(Device.created_devices):
+		device.release()
+
+	releaseResources()
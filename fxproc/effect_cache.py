@@ -0,0 +1,188 @@
+"""Cache of compiled effects, in process and on disk.
+
+Entries are keyed on a hash of the effect source, the contents of every
+file it #includes (resolved the way the D3DX default include handler
+does, relative to the including file), the macros, the compile flags and
+the compiler version. A warm start loads the stored binary and never
+runs the HLSL compiler.
+
+The disk cache lives in FXPROC_CACHE_DIR, or in the per-user cache
+directory by default. Set Effect.cache.directory = None to keep the cache
+in memory only.
+"""
+
+import os
+import re
+import sys
+import hashlib
+
+INCLUDE_RE = re.compile(br'^[ \t]*#[ \t]*include[ \t]*[<"]([^>"\r\n]+)[>"]', re.MULTILINE)
+
+
+def defaultCacheDir():
+	directory = os.environ.get("FXPROC_CACHE_DIR")
+	if directory is not None:
+		return directory or None
+
+	if sys.platform == "win32":
+		base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+	else:
+		base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+	return os.path.join(base, "fxproc", "effects")
+
+
+def includedFiles(source, base_dir, seen=None):
+	"""(path, contents) of every file `source` includes, depth first"""
+	seen = set() if seen is None else seen
+	found = []
+
+	for match in INCLUDE_RE.finditer(source):
+		name = match.group(1).decode('ascii', 'replace').replace("\\", "/")
+		path = os.path.normpath(os.path.join(base_dir, name))
+
+		if path in seen:
+			continue
+		seen.add(path)
+
+		try:
+			with open(path, "rb") as f:
+				data = f.read()
+		except OSError:
+			found.append((path, b""))
+			continue
+
+		found.append((path, data))
+		found.extend(includedFiles(data, os.path.dirname(path), seen))
+
+	return found
+
+
+def effectKey(backend, source, base_dir, defines=None, optimize=False):
+	h = hashlib.sha256()
+
+	h.update(backend.compilerId().encode('ascii'))
+	h.update(b"\0%d\0" % (backend.compileFlags(optimize)))
+	h.update(source)
+
+	for path, data in includedFiles(source, base_dir):
+		h.update(b"\0" + os.path.basename(path).encode('utf-8') + b"\0")
+		h.update(data)
+
+	items = sorted(defines.items()) if isinstance(defines, dict) else list(defines or [])
+	for name, value in items:
+		h.update(b"\0%s=%s" % (str(name).encode('ascii'), str(value).encode('ascii')))
+
+	return h.hexdigest()
+
+
+def sourceKey(backend, fx_name=None, text=None, defines=None, optimize=False):
+	"""effectKey() of an effect file or source string, None if the file can't be read"""
+	if fx_name is None:
+		return effectKey(backend, text.encode('ascii'), os.getcwd(), defines, optimize)
+
+	try:
+		with open(fx_name, "rb") as f:
+			source = f.read()
+	except OSError:
+		return None
+
+	return effectKey(backend, source, os.path.dirname(os.path.abspath(fx_name)), defines, optimize)
+
+
+class EffectCache :
+
+	def __init__(self, directory=None):
+		self.directory = directory
+		self.memory = {}
+		self.hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+
+	def __str__(self):
+		return (
+			"hits=" + str(self.hits) +
+			" disk_hits=" + str(self.disk_hits) +
+			" misses=" + str(self.misses) +
+			" entries=" + str(len(self.memory)) +
+			" directory=" + str(self.directory)
+			)
+
+	def __path(self, key):
+		return os.path.join(self.directory, key + ".fxo")
+
+	def get(self, key):
+		blob = self.memory.get(key)
+		if blob is not None:
+			self.hits += 1
+			return blob
+
+		if self.directory:
+			try:
+				with open(self.__path(key), "rb") as f:
+					blob = f.read()
+			except OSError:
+				blob = None
+
+			if blob:
+				self.memory[key] = blob
+				self.disk_hits += 1
+				return blob
+
+		self.misses += 1
+		return None
+
+	def put(self, key, blob):
+		self.memory[key] = blob
+
+		if self.directory:
+			# Write then rename, so concurrent workers never read a partial file
+			tmp = self.__path(key) + ".%d.tmp" % (os.getpid())
+			try:
+				os.makedirs(self.directory, exist_ok=True)
+				with open(tmp, "wb") as f:
+					f.write(blob)
+				os.replace(tmp, self.__path(key))
+			except OSError:
+				print("WARNING: can't write effect cache " '"%s"' % (self.directory))
+
+	def clear(self, disk=False):
+		self.memory = {}
+
+		if disk and self.directory and os.path.isdir(self.directory):
+			for name in os.listdir(self.directory):
+				if name.endswith(".fxo"):
+					os.remove(os.path.join(self.directory, name))
+
+	def openEffect(self, backend, fx_name, defines=None, optimize=False):
+		if not backend.compiles_effects:
+			return backend.openEffect(fx_name, defines, optimize)
+
+		try:
+			with open(fx_name, "rb") as f:
+				source = f.read()
+		except OSError:
+			raise IOError('Can\'t load effect file "%s"' % (fx_name))
+
+		key = effectKey(backend, source, os.path.dirname(os.path.abspath(fx_name)), defines, optimize)
+		blob = self.get(key)
+
+		if blob is None:
+			blob = backend.compileEffect(source, fx_name, defines, optimize)
+			self.put(key, blob)
+
+		return backend.loadCompiledEffect(blob)
+
+	def createEffect(self, backend, text, defines=None, optimize=False):
+		if not backend.compiles_effects:
+			return backend.createEffect(text, defines, optimize)
+
+		source = text.encode('ascii')
+		key = effectKey(backend, source, os.getcwd(), defines, optimize)
+		blob = self.get(key)
+
+		if blob is None:
+			blob = backend.compileEffect(source, None, defines, optimize)
+			self.put(key, blob)
+
+		return backend.loadCompiledEffect(blob)
@@ -0,0 +1,271 @@
+"""Multi-process executor with one device per worker.
+
+	def grade(file_name):
+		...
+		return out_name
+
+	with Executor(initializer=loadEffects) as ex:
+		for out_name in ex.map(grade, file_names):
+			print(out_name)
+
+Each worker process creates its own device. With the d3d9 backend the
+workers are spread over the adapters, one per adapter by default. With
+the numpy backend there is one worker per core. All workers pull from
+one shared task queue, so a worker that finishes early takes the next
+task instead of waiting on a fixed share.
+
+Functions, tasks and results travel by pickle, so they must be module
+level. Large arrays should not: pass a SharedArray (or a .npy file name)
+and have the workers write into it, see runTiled().
+"""
+
+import os
+import queue
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .backend import defaultBackendName, setBackend
+
+# Index of the current worker, None in the parent process
+worker_index = None
+
+_tilers = {}
+_arrays = {}
+
+
+class SharedArray :
+	"""NumPy array in shared memory. It pickles by name, so a worker
+attaches to the same memory instead of receiving a copy.
+"""
+
+	def __init__(self, shape, dtype, name=None):
+		self.shape = tuple(shape)
+		self.dtype = np.dtype(dtype)
+		self.owner = name is None
+
+		size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+		self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+		self.array = np.ndarray(self.shape, self.dtype, buffer=self.shm.buf)
+
+	def __reduce__(self):
+		return (SharedArray, (self.shape, self.dtype.str, self.shm.name))
+
+	def close(self):
+		"""Detach; the creating process also frees the memory"""
+		if self.array is not None:
+			self.array = None
+			self.shm.close()
+
+			if self.owner:
+				self.shm.unlink()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+def _openArray(ref, mode="r"):
+	if isinstance(ref, SharedArray):
+		return ref.array
+
+	array = _arrays.get((ref, mode))
+	if array is None:
+		array = _arrays[(ref, mode)] = np.load(ref, mmap_mode=mode)
+
+	return array
+
+
+def _tileTask(task):
+	make_tiler, source, dest, tile, tex_width, tex_height = task
+
+	tiler = _tilers.get(make_tiler)
+	if tiler is None:
+		tiler = _tilers[make_tiler] = make_tiler()
+
+	tiler.processTile(_openArray(source), _openArray(dest, "r+"), tile, tex_width, tex_height)
+
+
+def _worker(index, backend, options, initializer, initargs, tasks, results):
+	global worker_index
+	worker_index = index
+
+	try:
+		setBackend(backend, **options)
+
+		if initializer is not None:
+			initializer(*initargs)
+	except Exception:
+		results.put((None, index, False, traceback.format_exc()))
+		return
+
+	while True:
+		task = tasks.get()
+		if task is None:
+			break
+
+		i, func, arg = task
+
+		try:
+			results.put((i, index, True, func(arg)))
+		except Exception:
+			results.put((i, index, False, traceback.format_exc()))
+
+
+class Executor :
+
+	def __init__(self, workers=None, backend=None, adapters=None, initializer=None, initargs=(), **options):
+		self.backend_name = backend or defaultBackendName()
+
+		if adapters is None and self.backend_name == "d3d9":
+			from .d3d9 import adapterCount
+			adapters = list(range(adapterCount()))
+
+		self.adapters = adapters
+		self.workers = workers or (len(adapters) if adapters else os.cpu_count() or 1)
+
+		context = multiprocessing.get_context("spawn")
+		self.tasks = context.Queue()
+		self.results = context.Queue()
+		self.processes = []
+
+		# Tasks finished by each worker
+		self.completed = [0] * self.workers
+		self.calls = 0
+
+		for index in range(self.workers):
+			worker_options = dict(options)
+			if adapters:
+				worker_options["adapter"] = adapters[index % len(adapters)]
+
+			process = context.Process(target=_worker, daemon=True,
+				args=(index, self.backend_name, worker_options, initializer, initargs, self.tasks, self.results))
+			process.start()
+			self.processes.append(process)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None:
+			self.close()
+		else:
+			self.terminate()
+
+	def __str__(self):
+		return (
+			"workers=" + str(self.workers) +
+			" backend=" + self.backend_name +
+			" adapters=" + str(self.adapters) +
+			" completed=" + str(self.completed)
+			)
+
+	def __result(self):
+		while True:
+			try:
+				return self.results.get(timeout=1.0)
+			except queue.Empty:
+				if not any(process.is_alive() for process in self.processes):
+					raise RuntimeError("All executor workers exited")
+
+	def map(self, func, tasks, ordered=True):
+		"""Generator of func(task) for every task, computed by the workers.
+With ordered=False results come as soon as they are ready.
+"""
+		tasks = iter(tasks)
+		in_flight = 0
+		submitted = 0
+		next_result = 0
+		ready = {}
+
+		# Task ids carry the call, so results of an abandoned call are never taken for ours
+		call = self.calls
+		self.calls += 1
+
+		try:
+			while True:
+				# Keep a few tasks queued per worker, so idle workers never wait on the parent
+				while in_flight < 2 * self.workers:
+					try:
+						task = next(tasks)
+					except StopIteration:
+						break
+
+					self.tasks.put(((call, submitted), func, task))
+					submitted += 1
+					in_flight += 1
+
+				if not in_flight:
+					break
+
+				i, index, ok, value = self.__result()
+
+				if i is not None and i[0] != call:
+					continue
+
+				if i is not None:
+					in_flight -= 1
+
+				if not ok:
+					where = "initializer" if i is None else "task %d" % (i[1])
+					raise RuntimeError("Worker %d failed in %s:\n%s" % (index, where, value))
+
+				self.completed[index] += 1
+
+				if not ordered:
+					yield value
+					continue
+
+				ready[i[1]] = value
+				while next_result in ready:
+					yield ready.pop(next_result)
+					next_result += 1
+		finally:
+			# Wait out what this call still has queued when the caller stops early or a task failed
+			while in_flight:
+				try:
+					i, index, ok, value = self.__result()
+				except RuntimeError:
+					break
+
+				if i is not None and i[0] == call:
+					in_flight -= 1
+
+	def runTiled(self, make_tiler, source, dest):
+		"""Shard the tiles of `source` over the workers. `make_tiler` is a module
+level function returning the TiledProcessor, called once per worker.
+`source` and `dest` are SharedArrays or .npy file names.
+"""
+		from . import arrays
+
+		tiler = make_tiler()
+		shape_source = source.array if isinstance(source, SharedArray) else np.load(source, mmap_mode="r")
+
+		kind, width, height, slices = arrays.imageShape(shape_source, tiler.format, "2d")
+		tex_width, tex_height = tiler.textureSize(width, height)
+
+		tasks = [(make_tiler, source, dest, tile, tex_width, tex_height) for tile in tiler.tiles(width, height)]
+
+		for result in self.map(_tileTask, tasks, ordered=False):
+			pass
+
+		return len(tasks)
+
+	def close(self):
+		for process in self.processes:
+			self.tasks.put(None)
+
+		for process in self.processes:
+			process.join()
+
+		self.processes = []
+
+	def terminate(self):
+		for process in self.processes:
+			process.terminate()
+
+		self.processes = []
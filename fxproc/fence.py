@@ -0,0 +1,73 @@
+"""Completion fences for submitted GPU work.
+
+	fence = Effect.submit()
+	...                          # CPU work overlaps the GPU
+	fence.wait()
+
+	async def job():
+		fx.drawQuad("LowPass", do_flush=False)
+		await Effect.submit()    # the event loop keeps running meanwhile
+		return out.toNumpy()
+
+Effect.submit() and Batch.submit() return a Fence backed by a pooled
+D3DQUERYTYPE_EVENT query, issued after everything submitted so far.
+done() polls the query once, wait() and await poll with a growing
+interval, so nothing spins on GetData. Fences are polled from the thread
+that owns the device.
+"""
+
+import time
+
+# Polling interval of wait() and await, doubled up to the maximum
+POLL_MIN = 0.0002
+POLL_MAX = 0.005
+
+
+class Fence :
+
+	def __init__(self, backend):
+		self.backend = backend
+		self.handle = backend.issueFence()
+		self._done = self.handle is None
+
+	def __repr__(self):
+		return "<Fence %s>" % ("done" if self._done else "pending")
+
+	def done(self):
+		if not self._done and self.backend.fenceDone(self.handle):
+			self._done = True
+			self.backend.releaseFence(self.handle)
+			self.handle = None
+
+		return self._done
+
+	def wait(self, timeout=None):
+		"""Block until the GPU reached the fence; False if `timeout` seconds passed first"""
+		deadline = None if timeout is None else time.perf_counter() + timeout
+		interval = POLL_MIN
+
+		while not self.done():
+			if deadline is not None:
+				left = deadline - time.perf_counter()
+				if left <= 0:
+					return False
+				interval = min(interval, left)
+
+			time.sleep(interval)
+			interval = min(interval * 2, POLL_MAX)
+
+		return True
+
+	async def __poll(self):
+		import asyncio
+
+		interval = POLL_MIN
+
+		while not self.done():
+			await asyncio.sleep(interval)
+			interval = min(interval * 2, POLL_MAX)
+
+		return self
+
+	def __await__(self):
+		return self.__poll().__await__()
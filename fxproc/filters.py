@@ -0,0 +1,258 @@
+"""Separable filters from the FXPROC_FILTERS techniques of fxproc.fxh.
+
+	blurred = filters.gaussian(lena, sigma=8.0)
+	filters.box(lena, radius=5, dst=out)
+	half = filters.downsample(lena)
+	edges = filters.sobel(lena)                 # (dx, dy, magnitude, 1)
+
+A separable filter runs as a horizontal and a vertical pass, O(r) texel
+fetches per pixel instead of O(r^2) for a 2D loop. Neighbouring weights of
+the same sign are folded into one bilinear fetch between the two texels,
+halving the fetches again. Gaussians too wide for FXPROC_MAX_TAPS taps are
+split into several narrower passes, which compose to the same sigma.
+
+Every helper returns `dst`, or a new render target of the source size and
+format (half or twice the size for downsample/upsample, A32B32G32R32F for
+sobel). Intermediate targets come from `pool`, or a pool released on
+return. Filters read texels beyond the edges as the edge texel.
+
+On the NumPy backend the techniques are NumPy kernels with the same taps.
+"""
+
+import os
+import math
+import weakref
+
+import numpy as np
+
+from .backend import getBackend
+from .effect import Effect, Texture, _batched
+from .pool import TexturePool
+
+FXPROC_FXH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fxproc.fxh")
+
+# FXPROC_MAX_TAPS of fxproc.fxh
+MAX_TAPS = 64
+
+LUMINANCE = np.array((0.2126, 0.7152, 0.0722, 0.0), np.float32)
+
+
+def gaussianWeights(sigma, radius=None):
+	"""Normalized Gaussian weights for offsets -radius..radius, radius 3 sigma by default"""
+	if sigma <= 0:
+		raise ValueError("sigma must be positive, got %r" % (sigma))
+
+	radius = int(math.ceil(3.0 * sigma)) if radius is None else radius
+	x = np.arange(-radius, radius + 1, dtype=np.float64)
+	weights = np.exp(-0.5 * (x / sigma) ** 2)
+
+	return weights / weights.sum()
+
+
+def boxWeights(radius):
+	return np.full(2 * radius + 1, 1.0 / (2 * radius + 1))
+
+
+def lanczosWeights(scale, lobes=3):
+	"""Normalized Lanczos low-pass weights with a cutoff at 1 / scale of the
+sampling rate, e.g. scale 2 before halving an image
+"""
+	if scale < 1:
+		raise ValueError("Lanczos scale must be at least 1, got %r" % (scale))
+
+	radius = int(math.ceil(lobes * scale)) - 1
+	x = np.arange(-radius, radius + 1, dtype=np.float64) / scale
+	weights = np.sinc(x) * np.sinc(x / lobes)
+
+	return weights / weights.sum()
+
+
+def bilinearTaps(weights):
+	"""(n, 4) float32 taps (offset, weight, 0, 0) for symmetric `weights` of
+offsets -r..r, pairs of same-signed neighbours folded into one fetch
+"""
+	weights = np.asarray(weights, np.float64)
+	radius = len(weights) // 2
+	half = [(0.0, weights[radius])]
+
+	k = 1
+	while k <= radius:
+		a = weights[radius + k]
+		b = weights[radius + k + 1] if k < radius else 0.0
+
+		if b != 0.0 and (a > 0) == (b > 0):
+			half.append(((k * a + (k + 1) * b) / (a + b), a + b))
+			k += 2
+		else:
+			half.append((float(k), a))
+			k += 1
+
+	taps = [(-offset, weight) for offset, weight in reversed(half[1:])] + half
+	taps = np.array([(offset, weight, 0.0, 0.0) for offset, weight in taps], np.float32)
+
+	return taps
+
+
+def kernelFilterH(ctx):
+	return _convolve(ctx, 1.0, 0.0)
+
+
+def kernelFilterV(ctx):
+	return _convolve(ctx, 0.0, 1.0)
+
+
+def _convolve(ctx, dx, dy):
+	taps = np.asarray(ctx["vFilterTaps"], np.float32).reshape(-1, 4)[:ctx["iFilterTaps"]]
+	clr = 0.0
+
+	for offset, weight in taps[:, :2]:
+		clr = clr + ctx.sample("filterMapTexture", ctx.tc + ctx.offsetPixel(offset * dx, offset * dy), "clamp") * weight
+
+	return clr
+
+
+def kernelDownsample2x(ctx):
+	clr = 0.0
+	for du, dv in ((-0.375, -0.375), (0.375, -0.375), (-0.375, 0.375), (0.375, 0.375)):
+		clr = clr + ctx.sample("filterMapTexture", ctx.tc + ctx.offsetPixel(du, dv), "clamp")
+
+	return clr * 0.25
+
+
+def kernelUpsample2x(ctx):
+	return ctx.sample("filterMapTexture", ctx.tc, "clamp")
+
+
+def kernelSobel(ctx):
+	def luminance(du, dv):
+		return ctx.sample("filterMapTexture", ctx.tc + ctx.offsetPixel(du, dv), "clamp") @ LUMINANCE
+
+	dx = 2.0 * (luminance(1, -0.5) + luminance(1, 0.5) - luminance(-1, -0.5) - luminance(-1, 0.5))
+	dy = 2.0 * (luminance(-0.5, 1) + luminance(0.5, 1) - luminance(-0.5, -1) - luminance(0.5, -1))
+
+	return np.stack((dx, dy, np.sqrt(dx * dx + dy * dy), np.ones_like(dx)), axis=-1)
+
+
+KERNELS = {
+	"FilterH": kernelFilterH,
+	"FilterV": kernelFilterV,
+	"Downsample2x": kernelDownsample2x,
+	"Upsample2x": kernelUpsample2x,
+	"Sobel": kernelSobel,
+	}
+
+# Backend -> Effect of fxproc.fxh with FXPROC_FILTERS
+effects = weakref.WeakKeyDictionary()
+
+
+def filterEffect():
+	backend = getBackend()
+
+	effect = effects.get(backend)
+	if effect is None or effect.released:
+		effect = effects[backend] = Effect.open(FXPROC_FXH, {"FXPROC_FILTERS": "1"})
+
+		if not backend.compiles_effects:
+			for technique_name, kernel in KERNELS.items():
+				effect.registerTechnique(technique_name, kernel)
+
+	return effect
+
+
+def _target(src, dst, width, height, format_str=None):
+	if dst is not None:
+		Texture.check_type_of(dst)
+		return dst
+
+	return Effect.createRenderTarget(width, height, format_str or src.format)
+
+
+def _draw(effect, technique_name, src, dst):
+	effect.setTexture("filterMapTexture", src)
+	Effect.setRenderTarget(dst)
+	effect.drawQuad(technique_name)
+
+
+def separable(src, weights, dst=None, pool=None, passes=1):
+	"""Convolve `src` with symmetric `weights` of offsets -r..r along x, then y;
+`passes` times over when given
+"""
+	Texture.check_type_of(src)
+
+	taps = bilinearTaps(weights)
+	if len(taps) > MAX_TAPS:
+		raise ValueError("%d weights need %d taps, more than the %d of FXPROC_MAX_TAPS" % (len(weights), len(taps), MAX_TAPS))
+
+	effect = filterEffect()
+	dst = _target(src, dst, src.width, src.height)
+	scratch = pool or TexturePool()
+
+	try:
+		with _batched(effect.backend):
+			effect.setVectorArray("vFilterTaps", taps)
+			effect.setInt("iFilterTaps", len(taps))
+
+			with scratch.lease(src.width, src.height, dst.format) as tmp:
+				current = src
+				for i in range(passes):
+					_draw(effect, "FilterH", current, tmp)
+					_draw(effect, "FilterV", tmp, dst)
+					current = dst
+	finally:
+		if pool is None:
+			scratch.clear()
+
+	return dst
+
+
+def gaussian(src, sigma, dst=None, pool=None):
+	"""Gaussian blur of standard deviation `sigma` pixels"""
+	# n passes of sigma / sqrt(n) blur as much as one of sigma
+	passes = 1
+	while len(bilinearTaps(gaussianWeights(sigma / math.sqrt(passes)))) > MAX_TAPS:
+		passes += 1
+
+	return separable(src, gaussianWeights(sigma / math.sqrt(passes)), dst, pool, passes)
+
+
+def box(src, radius, dst=None, pool=None):
+	"""Mean of the (2 radius + 1)^2 pixels around each pixel"""
+	return separable(src, boxWeights(radius), dst, pool)
+
+
+def lanczos(src, scale=2.0, lobes=3, dst=None, pool=None):
+	"""Lanczos low-pass keeping frequencies below 1 / scale of the sampling rate"""
+	return separable(src, lanczosWeights(scale, lobes), dst, pool)
+
+
+def downsample(src, dst=None):
+	"""Half size copy through a [1 3 3 1] filter"""
+	Texture.check_type_of(src)
+
+	effect = filterEffect()
+	dst = _target(src, dst, max(1, src.width // 2), max(1, src.height // 2))
+	_draw(effect, "Downsample2x", src, dst)
+
+	return dst
+
+
+def upsample(src, dst=None):
+	"""Twice the size copy, bilinear"""
+	Texture.check_type_of(src)
+
+	effect = filterEffect()
+	dst = _target(src, dst, src.width * 2, src.height * 2)
+	_draw(effect, "Upsample2x", src, dst)
+
+	return dst
+
+
+def sobel(src, dst=None, format_str="A32B32G32R32F"):
+	"""Sobel gradient of the luminance, (dx, dy, magnitude, 1) per pixel"""
+	Texture.check_type_of(src)
+
+	effect = filterEffect()
+	dst = _target(src, dst, src.width, src.height, format_str)
+	_draw(effect, "Sobel", src, dst)
+
+	return dst
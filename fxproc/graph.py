@@ -0,0 +1,307 @@
+"""Declarative effect graphs with automatic intermediate targets.
+
+	fx = Effect.open("filter_demo.fx")
+
+	graph = Graph()
+	lena = graph.input("lena")
+	low = graph.node(fx, "LowPass", {"baseMapTexture": lena})
+	high = graph.node(fx, "HighPass", {"baseMapTexture": lena, "baseMap2Texture": low})
+
+	low_out, high_out = graph.run({"lena": fx.loadTexture("lena.jpg")}, [low, high])
+
+A node draws one technique of an effect into a new target, with its inputs
+(graph inputs, other nodes or plain textures) bound to sampler texture
+parameters. Its size and format default to those of its first input;
+`size` gives a fixed (width, height) and `scale` a factor of the first
+input's size. A node without inputs needs a `size`, its format defaults
+to A8R8G8B8.
+
+run() orders the nodes the requested outputs depend on, and records them
+into one batched submission. Intermediate targets come from a TexturePool
+and go back to it right after their last consumer has drawn, so peak
+memory follows the graph's working set, not its node count.
+
+Output targets are kept between runs and belong to the graph: they stay
+valid until a run with other outputs, or release(). An output is skipped
+when its effect, technique, params, size and inputs are the same as when
+it was drawn. Intermediates are not kept, so they are drawn again when an
+output that reads them has to be. Input textures count as changed when they are
+another texture or were rendered into since, see Texture.version.
+Parameters set on the effect outside of the node's `params` are not
+tracked; call invalidate() after changing them.
+"""
+
+import hashlib
+import numbers
+
+from .backend import getBackend
+from .effect import Effect, Texture, handleKey, _batched, _floats
+from .pool import TexturePool
+
+
+def _paramKey(value):
+	"""Bytes identifying a node param value; arrays by their whole contents"""
+	if isinstance(value, Texture):
+		return repr(("texture", handleKey(value.handle), value.version)).encode('utf-8')
+
+	if isinstance(value, numbers.Real):
+		return repr((type(value).__name__, value)).encode('utf-8')
+
+	data, count = _floats(value)
+	return repr(("floats", getattr(value, "shape", count))).encode('utf-8') + data.tobytes()
+
+
+class Node :
+
+	def __init__(self, graph, index, name, effect=None, technique_name=None, inputs=None, format_str=None, size=None, scale=None, params=None):
+		self.graph = graph
+		self.index = index
+		self.name = name
+		self.effect = effect
+		self.technique_name = technique_name
+		self.inputs = dict(inputs or {})
+		self.format = format_str
+		self.size = size
+		self.scale = scale
+		self.params = dict(params or {})
+
+		self.result = None
+
+		# Hash of everything the result depends on, when it was drawn
+		self.key = None
+
+	def __repr__(self):
+		return "<Node %s>" % (self.name)
+
+	@property
+	def is_input(self):
+		return self.effect is None
+
+
+class Graph :
+
+	def __init__(self, pool=None):
+		self.pool = pool or TexturePool()
+		self.nodes = []
+		self.outputs = set()
+
+		self.runs = 0
+		self.nodes_run = 0
+		self.nodes_skipped = 0
+		self.peak_bytes = 0
+
+	def __str__(self):
+		return (
+			"nodes=" + str(len(self.nodes)) +
+			" runs=" + str(self.runs) +
+			" nodes_run=" + str(self.nodes_run) +
+			" nodes_skipped=" + str(self.nodes_skipped) +
+			" peak_bytes=" + str(self.peak_bytes)
+			)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.release()
+
+	def input(self, name):
+		"""Placeholder for a texture passed to run() under `name`"""
+		node = Node(self, len(self.nodes), name)
+		self.nodes.append(node)
+
+		return node
+
+	def node(self, effect, technique_name, inputs, format_str=None, size=None, scale=None, params=None, name=None):
+		"""Node drawing `technique_name` with `inputs`, {texture parameter: Node or Texture}.
+`params` are set with EffectParams.update() before drawing.
+"""
+		for value in inputs.values():
+			if isinstance(value, Node):
+				if value.graph is not self:
+					raise ValueError("Node %s belongs to another graph" % (value.name))
+			else:
+				Texture.check_type_of(value)
+
+		if size is None and not inputs:
+			raise ValueError("Node %s has no input to take its size from" % (name or technique_name))
+
+		node = Node(self, len(self.nodes), name or technique_name, effect, technique_name, inputs, format_str, size, scale, params)
+		self.nodes.append(node)
+
+		return node
+
+	def order(self, outputs):
+		"""Nodes the `outputs` depend on, inputs before their consumers"""
+		needed = set()
+		stack = list(outputs)
+
+		while stack:
+			node = stack.pop()
+			if node.index not in needed:
+				needed.add(node.index)
+				stack.extend(value for value in node.inputs.values() if isinstance(value, Node))
+
+		# Nodes only refer to nodes created before them, so creation order is topological
+		return [node for node in self.nodes if node.index in needed]
+
+	def __texture(self, value, sources):
+		if not isinstance(value, Node):
+			return value
+		if value.is_input:
+			return sources[value.name]
+
+		return value.result
+
+	def __token(self, value, sources, keys):
+		if isinstance(value, Node) and not value.is_input:
+			return keys[value.index]
+
+		texture = self.__texture(value, sources)
+		return (handleKey(texture.handle), texture.version)
+
+	def __shape(self, node, sources, shapes):
+		first = next(iter(node.inputs.values()), None)
+		first_shape = None
+
+		if isinstance(first, Node) and not first.is_input:
+			first_shape = shapes[first.index]
+		elif first is not None:
+			texture = self.__texture(first, sources)
+			first_shape = (texture.width, texture.height, texture.format)
+
+		width, height = node.size if node.size is not None else first_shape[:2]
+
+		if node.scale is not None:
+			width = max(1, int(round(width * node.scale)))
+			height = max(1, int(round(height * node.scale)))
+
+		# Nodes without inputs default to the format of createRenderTarget()
+		return width, height, node.format or (first_shape[2] if first_shape is not None else "A8R8G8B8")
+
+	def run(self, sources=None, outputs=None):
+		"""Draw what the `outputs` nodes (all nodes without consumers by default)
+need, in one batched submission; returns their result textures in order.
+"""
+		sources = dict(sources or {})
+
+		if outputs is None:
+			consumed = set(value.index for node in self.nodes for value in node.inputs.values() if isinstance(value, Node))
+			outputs = [node for node in self.nodes if node.index not in consumed and not node.is_input]
+
+		order = self.order(outputs)
+
+		for node in order:
+			if node.is_input and node.name not in sources:
+				raise ValueError('Graph input "%s" is missing' % (node.name))
+
+		self.__releaseOutputs(set(node.index for node in outputs))
+		self.outputs = set(node.index for node in outputs)
+
+		keys, shapes = self.__plan(order, sources)
+		dirty = self.__dirty(order, keys)
+		drawn = [node for node in order if node.index in dirty]
+
+		# Last position in the draw order at which each result is read
+		last_use = {}
+		for i, node in enumerate(drawn):
+			for value in node.inputs.values():
+				if isinstance(value, Node) and not value.is_input:
+					last_use[value.index] = i
+
+		live_bytes = sum(node.result.nbytes for node in order if node.result is not None)
+		self.peak_bytes = max(self.peak_bytes, live_bytes)
+
+		with _batched(getBackend()):
+			for i, node in enumerate(drawn):
+				width, height, format_str = shapes[node.index]
+
+				result = node.result
+				if result is None or (result.width, result.height, result.format) != (width, height, format_str):
+					if result is not None:
+						self.pool.release(result)
+						live_bytes -= result.nbytes
+
+					result = self.pool.acquire(width, height, format_str)
+					live_bytes += result.nbytes
+					self.peak_bytes = max(self.peak_bytes, live_bytes)
+
+				node.effect.params.update(node.params)
+				for param_name, value in node.inputs.items():
+					node.effect.setTexture(param_name, self.__texture(value, sources))
+
+				Effect.setRenderTarget(result)
+				node.effect.drawQuad(node.technique_name)
+
+				node.result = result
+				node.key = keys[node.index]
+
+				# Recycle inputs nothing later in this run reads
+				for value in set(value for value in node.inputs.values() if isinstance(value, Node)):
+					if not value.is_input and value.index not in self.outputs and last_use.get(value.index) == i:
+						live_bytes -= value.result.nbytes
+						self.pool.release(value.result)
+						value.result = None
+						value.key = None
+
+		self.runs += 1
+		self.nodes_run += len(drawn)
+		self.nodes_skipped += len(order) - len(drawn) - sum(1 for node in order if node.is_input)
+
+		return [node.result for node in outputs]
+
+	def __plan(self, order, sources):
+		"""{node index: key} and {node index: (width, height, format)} of the results
+the nodes would draw now
+"""
+		keys = {}
+		shapes = {}
+
+		for node in order:
+			if not node.is_input:
+				shapes[node.index] = self.__shape(node, sources, shapes)
+
+				inputs = tuple(sorted((name, self.__token(value, sources, keys)) for name, value in node.inputs.items()))
+
+				h = hashlib.sha256(repr((handleKey(node.effect.handle), node.technique_name, inputs, shapes[node.index])).encode('utf-8'))
+				for name, value in sorted(node.params.items()):
+					h.update(repr(name).encode('utf-8'))
+					h.update(_paramKey(value))
+
+				keys[node.index] = h.hexdigest()
+
+		return keys, shapes
+
+	def __dirty(self, order, keys):
+		"""Indices of the nodes that have to draw this run: outputs whose result is
+out of date, and the inputs of drawing nodes that aren't held up to date
+"""
+		dirty = set()
+		needed = set(self.outputs)
+
+		for node in reversed(order):
+			if node.is_input or node.index not in needed:
+				continue
+
+			if node.result is None or node.key != keys[node.index]:
+				dirty.add(node.index)
+				needed.update(value.index for value in node.inputs.values() if isinstance(value, Node))
+
+		return dirty
+
+	def __releaseOutputs(self, keep):
+		for node in self.nodes:
+			if node.result is not None and node.index not in keep:
+				self.pool.release(node.result)
+				node.result = None
+				node.key = None
+
+	def invalidate(self, node=None):
+		"""Draw `node` (every node by default) on the next run"""
+		for each in ([node] if node is not None else self.nodes):
+			each.key = None
+
+	def release(self):
+		"""Give every held target back to the pool, and free the pool's idle targets"""
+		self.__releaseOutputs(set())
+		self.pool.clear()
@@ -0,0 +1,210 @@
+"""Memoized draws, in memory and on disk.
+
+	memo = DrawCache(max_bytes=1 << 30, directory="fxmemo")
+
+	lena = memo.loadTexture("lena.jpg")
+	fx.setTexture("baseMapTexture", lena)
+	memo.drawQuad(fx, "LowPass", out)        # drawn, or restored from the cache
+	fx.setTexture("baseMap2Texture", out)
+	memo.drawQuad(fx, "HighPass", out2)
+
+A draw is keyed on the effect source (see Effect.source_key), the
+technique, every parameter value set on the effect so far (used by the
+technique or not), the input textures and the target format, size, level
+and face. When the key was seen before, the target is filled from the
+cache instead of drawing. Only the draws after a changed parameter run
+again, because their inputs' keys change too.
+
+Textures are keyed by where they came from: the key of the draw that
+filled them, or the file name, size and modification time for
+loadTexture(). Any other texture is hashed by content the first time it
+is used in a given Texture.version, formats without a NumPy layout
+through their DDS encoding.
+
+The memory cache keeps a render target copy of each result, least
+recently used ones are freed beyond max_bytes. With a `directory` results
+are also written there as DDS files (fxproc.rawfiles), which reads them
+back from the device. Formats without a NumPy layout are kept in memory
+only. On the numpy backend kernels are keyed by their code, not by the
+values their closures capture.
+"""
+
+import os
+import hashlib
+import weakref
+from collections import OrderedDict
+
+from . import rawfiles
+from .effect import Effect, Texture
+
+
+class DrawCache :
+
+	def __init__(self, max_bytes=512 << 20, directory=None):
+		self.max_bytes = max_bytes
+		self.directory = directory
+
+		# Draw key -> render target holding its result, least recently used first
+		self.entries = OrderedDict()
+		self.bytes = 0
+
+		# Texture -> (version, content key)
+		self.texture_keys = weakref.WeakKeyDictionary()
+		self.loaded = {}
+
+		self.hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+
+	def __str__(self):
+		return (
+			"hits=" + str(self.hits) +
+			" disk_hits=" + str(self.disk_hits) +
+			" misses=" + str(self.misses) +
+			" entries=" + str(len(self.entries)) +
+			" bytes=" + str(self.bytes) +
+			" directory=" + str(self.directory)
+			)
+
+	def __path(self, key):
+		return os.path.join(self.directory, key + ".dds")
+
+	def textureKey(self, pyobj):
+		"""Content key of a texture, hashing its levels when its origin is unknown"""
+		known = self.texture_keys.get(pyobj)
+		if known is not None and known[0] == pyobj.version:
+			return known[1]
+
+		h = hashlib.sha256(repr((pyobj.kind, pyobj.format, pyobj.width, pyobj.height, pyobj.levels, pyobj.slices)).encode('ascii'))
+
+		try:
+			for level in range(pyobj.levels):
+				for face in range(6 if pyobj.kind == "cube" else 1):
+					h.update(pyobj.toNumpy(level, face).tobytes())
+		except TypeError:
+			# No NumPy layout (DXT, P8, ...), hash the texture as a DDS file
+			h.update(Effect.saveTextureToMemory(pyobj, "dds"))
+
+		key = h.hexdigest()
+		self.texture_keys[pyobj] = (pyobj.version, key)
+
+		return key
+
+	def drawKey(self, effect, technique_name, pyobj, level=0, face=0):
+		"""Key of drawing `technique_name` into a target level, None if the effect has no source key"""
+		if effect.source_key is None:
+			return None
+
+		h = hashlib.sha256()
+		h.update(repr((effect.source_key, technique_name, effect.backend.techniqueKey(effect.handle, technique_name))).encode('utf-8'))
+		h.update(repr((pyobj.kind, pyobj.format, max(1, pyobj.width >> level), max(1, pyobj.height >> level), level, face)).encode('ascii'))
+
+		for name, value in sorted(effect.params.values.items()):
+			if isinstance(value, Texture):
+				value = self.textureKey(value)
+
+			h.update(repr((name, value)).encode('utf-8'))
+
+		return h.hexdigest()
+
+	def loadTexture(self, file_name, levels=0):
+		"""Effect.loadTexture(), loading each version of a file once"""
+		path = os.path.abspath(file_name)
+
+		try:
+			stat = os.stat(path)
+		except OSError:
+			raise IOError("Can't load texture " '"%s"' % (file_name))
+
+		key = hashlib.sha256(repr((path, stat.st_size, stat.st_mtime_ns, levels)).encode('utf-8')).hexdigest()
+
+		pyobj = self.loaded.get(key)
+		if pyobj is None or pyobj.released:
+			pyobj = self.loaded[key] = Effect.loadTexture(file_name, levels)
+
+		self.texture_keys[pyobj] = (pyobj.version, key)
+
+		return pyobj
+
+	def drawQuad(self, effect, technique_name, pyobj, level=0, face=0):
+		"""Set `pyobj` as the render target and fill it like drawQuad(technique_name)
+would, from the cache when the same draw was done before.
+"""
+		key = self.drawKey(effect, technique_name, pyobj, level, face)
+		Effect.setRenderTarget(pyobj, level, face)
+
+		entry = self.entries.get(key) if key is not None else None
+
+		if entry is not None:
+			self.hits += 1
+			self.entries.move_to_end(key)
+			Effect.copyLevel(entry, pyobj, 0, level, 0, face, "point")
+
+		elif key is not None and self.directory and os.path.isfile(self.__path(key)):
+			self.disk_hits += 1
+
+			with rawfiles.openDDS(self.__path(key)) as image:
+				pyobj.write(image.level(0), level, face)
+
+			self.__store(key, pyobj, level, face)
+
+		else:
+			self.misses += 1
+			effect.drawQuad(technique_name)
+
+			if key is not None:
+				self.__store(key, pyobj, level, face)
+				self.__save(key, pyobj, level, face)
+
+		if key is not None:
+			self.texture_keys[pyobj] = (pyobj.version, key)
+
+		return pyobj
+
+	def __store(self, key, pyobj, level, face):
+		width = max(1, pyobj.width >> level)
+		height = max(1, pyobj.height >> level)
+
+		copy = Effect.createRenderTarget(width, height, pyobj.format)
+		Effect.copyLevel(pyobj, copy, level, 0, face, 0, "point")
+
+		self.entries[key] = copy
+		self.bytes += copy.nbytes
+
+		while self.bytes > self.max_bytes and len(self.entries) > 1:
+			old_key, old = self.entries.popitem(last=False)
+			self.bytes -= old.nbytes
+			old.release()
+
+	def __save(self, key, pyobj, level, face):
+		if not self.directory:
+			return
+
+		# Write then rename, so concurrent processes never read a partial file
+		path = self.__path(key)
+		tmp = path + ".%d.tmp" % (os.getpid())
+
+		try:
+			os.makedirs(self.directory, exist_ok=True)
+
+			with rawfiles.createDDS(tmp, pyobj.format, max(1, pyobj.width >> level), max(1, pyobj.height >> level)) as image:
+				pyobj.toNumpy(level, face, image.level(0))
+
+			os.replace(tmp, path)
+		except TypeError:
+			pass
+		except OSError:
+			print("WARNING: can't write draw cache " '"%s"' % (self.directory))
+
+	def clear(self, disk=False):
+		for entry in self.entries.values():
+			entry.release()
+
+		self.entries = OrderedDict()
+		self.bytes = 0
+		self.loaded = {}
+
+		if disk and self.directory and os.path.isdir(self.directory):
+			for name in os.listdir(self.directory):
+				if name.endswith(".dds"):
+					os.remove(os.path.join(self.directory, name))
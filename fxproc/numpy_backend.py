@@ -0,0 +1,699 @@
+"""NumPy backend: a CPU reference implementation of the Effect API.
+
+HLSL is not compiled here. Techniques are Python callables registered per
+technique name with Effect.registerTechnique(). A kernel takes a
+KernelContext and returns the output color for every pixel of the target,
+as an array broadcastable to (height, width, 4). With several render
+targets set it returns a tuple of such colors, COLOR0 first.
+
+Textures are kept as float32 RGBA arrays, quantized to the precision of
+their D3DFORMAT whenever they are written, so results match what the
+Direct3D9 backend stores in the same formats. Loading and saving image
+files needs Pillow.
+"""
+
+import io
+import os
+
+import numpy as np
+
+from .d3dtypes import D3DXIMAGE_FILEFORMAT
+from .backend import Backend
+from . import arrays
+from . import rawfiles
+
+
+# D3DFORMAT -> (stored channels, bits per channel or float precision)
+FORMATS = {
+	"R8G8B8": ("rgb", 8),
+	"A8R8G8B8": ("rgba", 8),
+	"X8R8G8B8": ("rgb", 8),
+	"R5G6B5": ("rgb", (5, 6, 5)),
+	"X1R5G5B5": ("rgb", 5),
+	"A1R5G5B5": ("rgba", (5, 5, 5, 1)),
+	"A4R4G4B4": ("rgba", 4),
+	"R3G3B2": ("rgb", (3, 3, 2)),
+	"A8": ("a", 8),
+	"A8R3G3B2": ("rgba", (3, 3, 2, 8)),
+	"X4R4G4B4": ("rgb", 4),
+	"A2B10G10R10": ("rgba", (10, 10, 10, 2)),
+	"A8B8G8R8": ("rgba", 8),
+	"X8B8G8R8": ("rgb", 8),
+	"G16R16": ("rg", 16),
+	"A2R10G10B10": ("rgba", (10, 10, 10, 2)),
+	"A16B16G16R16": ("rgba", 16),
+	"L8": ("l", 8),
+	"A8L8": ("la", 8),
+	"A4L4": ("la", 4),
+	"L16": ("l", 16),
+	"R16F": ("r", "f16"),
+	"G16R16F": ("rg", "f16"),
+	"A16B16G16R16F": ("rgba", "f16"),
+	"R32F": ("r", "f32"),
+	"G32R32F": ("rg", "f32"),
+	"A32B32G32R32F": ("rgba", "f32"),
+	}
+
+FILE_FORMATS = {
+	"bmp": "BMP",
+	"jpg": "JPEG",
+	"tga": "TGA",
+	"png": "PNG",
+	"dds": "DDS",
+	"ppm": "PPM",
+	"dib": "BMP",
+	}
+
+# Float formats go through fxproc.rawfiles instead of Pillow
+PFM_MAGICS = (b"PF", b"Pf")
+
+# Formats D3DX handles that this backend can't, with why
+UNSUPPORTED_FILE_FORMATS = {
+	"hdr": "Radiance HDR files are not supported by the numpy backend, use pfm or fxproc.rawfiles",
+	}
+
+
+def fullMipCount(width, height, depth=1):
+	return int(np.log2(max(width, height, depth))) + 1
+
+
+def storeFormat(format_str, rgba):
+	"""Quantize float RGBA values the way a `format_str` surface stores them"""
+	try:
+		channels, precision = FORMATS[format_str]
+	except KeyError:
+		raise TypeError('Format "%s" is not supported by the numpy backend' % (format_str))
+
+	src = np.asarray(rgba, dtype=np.float32)
+	out = np.empty(src.shape[:-1] + (4,), np.float32)
+	out[...] = (0, 0, 0, 1) if channels == "a" else (1, 1, 1, 1)
+
+	if not isinstance(precision, tuple):
+		precision = (precision,) * len(channels)
+
+	for c, bits in zip(channels, precision):
+		value = src[..., 0] if c == "l" else src[..., "rgba".index(c)]
+
+		if bits == "f16":
+			value = value.astype(np.float16).astype(np.float32)
+		elif bits != "f32":
+			scale = float((1 << bits) - 1)
+			value = np.round(np.clip(value, 0.0, 1.0) * scale) / scale
+
+		if c == "l":
+			out[..., 0] = out[..., 1] = out[..., 2] = value
+		else:
+			out[..., "rgba".index(c)] = value
+
+	return out
+
+
+def downsample(a):
+	"""2x box filter along the two (or, for volumes, three) leading image axes"""
+	for axis in range(a.ndim - 1):
+		n = a.shape[axis]
+		if n > 1:
+			n &= ~1
+			lo = a.take(np.arange(0, n, 2), axis=axis)
+			hi = a.take(np.arange(1, n, 2), axis=axis)
+			a = (lo + hi) * 0.5
+
+	return a
+
+
+class NumpyTexture :
+	def __init__(self, kind, format_str, width, height, levels=1, slices=1):
+		if levels == 0:
+			levels = fullMipCount(width, height, slices if kind == "volume" else 1)
+
+		storeFormat(format_str, np.zeros(4))
+
+		self.kind = kind
+		self.format = format_str
+		self.width = width
+		self.height = height
+		self.levels = levels
+		self.slices = slices if kind == "volume" else 0
+		self.faces = []
+
+		for face in range(6 if kind == "cube" else 1):
+			chain = []
+
+			for level in range(levels):
+				shape = (max(1, height >> level), max(1, width >> level), 4)
+				if kind == "volume":
+					shape = (max(1, slices >> level),) + shape
+
+				chain.append(storeFormat(format_str, np.zeros(shape, np.float32)))
+
+			self.faces.append(chain)
+
+	def level(self, level=0, face=0):
+		return self.faces[face][level]
+
+	def write(self, rgba, level=0, face=0, mask=None):
+		data = self.faces[face][level]
+		value = storeFormat(self.format, np.broadcast_to(rgba, data.shape))
+
+		if mask is None:
+			data[...] = value
+		else:
+			data[mask] = value[mask]
+
+	def generateMips(self, face=0):
+		chain = self.faces[face]
+
+		for level in range(1, self.levels):
+			chain[level][...] = storeFormat(self.format, downsample(chain[level - 1]))
+
+
+class NumpyEffect :
+	def __init__(self, name, source=None, defines=None):
+		self.name = name
+		self.source = source
+		self.defines = dict(defines or {})
+		self.params = {}
+		self.techniques = {}
+
+
+class KernelContext :
+	"""What a pixel kernel sees while shading the current render target
+
+- width, height    target size in pixels
+- tc               (h, w, 2) interpolated TEXCOORD0
+- vpos             (h, w, 2) pixel coordinates, like VPOS
+- mask             (h, w) pixels covered by the primitive, None for quads
+- vTargetSize      (w, h, 1 / w, 1 / h)
+- params           effect parameters set with the Effect set* calls
+
+- param            ( name )
+- offsetPixel      ( du, dv )
+- sample           ( texture_name, uv, address = "wrap", level = 0, filter = "linear" )
+- sampleCube       ( texture_name, direction, level = 0 )
+- load             ( texture_name, level = 0, face = 0 )
+"""
+
+	def __init__(self, width, height, params, tc=None, mask=None):
+		self.width = width
+		self.height = height
+		self.params = params
+		self.mask = mask
+		self.vTargetSize = np.array((width, height, 1.0 / width, 1.0 / height), np.float32)
+
+		y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+		self.vpos = np.stack((x, y), axis=-1)
+
+		if tc is None:
+			tc = (self.vpos + 0.5) * self.vTargetSize[2:]
+
+		self.tc = tc
+
+	def __getitem__(self, name):
+		return self.param(name)
+
+	def param(self, name):
+		try:
+			return self.params[name]
+		except KeyError:
+			raise ValueError('Parameter "%s" is not set' % (name))
+
+	def offsetPixel(self, du, dv):
+		return np.array((du, dv), np.float32) * self.vTargetSize[2:]
+
+	def __texture(self, name):
+		texture = self.param(name)
+		if not isinstance(texture, NumpyTexture):
+			raise TypeError('Parameter "%s" is not a texture' % (name))
+
+		return texture
+
+	def load(self, name, level=0, face=0):
+		return self.__texture(name).level(level, face)
+
+	def sample(self, name, uv, address="wrap", level=0, filter="linear"):
+		texture = self.__texture(name)
+		if texture.kind == "cube":
+			raise TypeError('Texture "%s" is a cube, use sampleCube' % (name))
+
+		return sample2D(texture.level(level), uv, address, filter)
+
+	def sampleCube(self, name, direction, level=0):
+		texture = self.__texture(name)
+		if texture.kind != "cube":
+			raise TypeError('Texture "%s" is not a cube' % (name))
+
+		return sampleCube([texture.level(level, face) for face in range(6)], direction)
+
+
+def _address(i, n, address):
+	if address == "clamp":
+		return np.clip(i, 0, n - 1)
+
+	if address == "mirror":
+		i = np.mod(i, 2 * n)
+		return np.where(i < n, i, 2 * n - 1 - i)
+
+	return np.mod(i, n)
+
+
+def sample2D(image, uv, address="wrap", filter="linear"):
+	"""Sample an (h, w, 4) image at normalized coordinates uv (..., 2)"""
+	h, w = image.shape[:2]
+	uv = np.asarray(uv, dtype=np.float32)
+
+	if filter == "point":
+		ix = _address(np.floor(uv[..., 0] * w).astype(np.intp), w, address)
+		iy = _address(np.floor(uv[..., 1] * h).astype(np.intp), h, address)
+		return image[iy, ix]
+
+	x = uv[..., 0] * w - 0.5
+	y = uv[..., 1] * h - 0.5
+	x0 = np.floor(x)
+	y0 = np.floor(y)
+	fx = (x - x0)[..., None]
+	fy = (y - y0)[..., None]
+
+	x0 = x0.astype(np.intp)
+	y0 = y0.astype(np.intp)
+	ix0 = _address(x0, w, address)
+	ix1 = _address(x0 + 1, w, address)
+	iy0 = _address(y0, h, address)
+	iy1 = _address(y0 + 1, h, address)
+
+	top = image[iy0, ix0] * (1 - fx) + image[iy0, ix1] * fx
+	bottom = image[iy1, ix0] * (1 - fx) + image[iy1, ix1] * fx
+
+	return top * (1 - fy) + bottom * fy
+
+
+def sampleCube(faces, direction):
+	"""Sample six (h, w, 4) faces along direction vectors (..., 3)"""
+	d = np.asarray(direction, dtype=np.float32)
+	x, y, z = d[..., 0], d[..., 1], d[..., 2]
+	ax, ay, az = np.abs(x), np.abs(y), np.abs(z)
+
+	face = np.where((ax >= ay) & (ax >= az), np.where(x >= 0, 0, 1),
+		np.where(ay >= az, np.where(y >= 0, 2, 3), np.where(z >= 0, 4, 5)))
+
+	# D3D9 cube face orientation: (sc, tc, ma) per face
+	sc = np.choose(face, (-z, z, x, x, x, -x))
+	tc = np.choose(face, (-y, -y, z, -z, -y, -y))
+	ma = np.maximum(np.choose(face, (ax, ax, ay, ay, az, az)), 1e-30)
+
+	uv = np.stack(((sc / ma + 1) * 0.5, (tc / ma + 1) * 0.5), axis=-1)
+	out = np.zeros(d.shape[:-1] + (4,), np.float32)
+
+	for f in range(6):
+		sel = face == f
+		if np.any(sel):
+			out[sel] = sample2D(faces[f], uv[sel], "clamp")
+
+	return out
+
+
+def rasterize(tris, width, height):
+	"""Coverage and perspective-correct TEXCOORD0 for XYZRHW triangles (n, 3, 6).
+Follows D3D9 defaults: pixel centers on integer coordinates, top-left fill
+rule and counter-clockwise culling.
+"""
+	mask = np.zeros((height, width), bool)
+	tc = np.zeros((height, width, 2), np.float32)
+
+	for t in np.asarray(tris, dtype=np.float64):
+		px, py, rhw, uv = t[:, 0], t[:, 1], t[:, 3], t[:, 4:6]
+
+		area = (px[1] - px[0]) * (py[2] - py[0]) - (py[1] - py[0]) * (px[2] - px[0])
+		if area <= 0:
+			continue
+
+		x0 = max(int(np.ceil(px.min())), 0)
+		x1 = min(int(np.floor(px.max())), width - 1)
+		y0 = max(int(np.ceil(py.min())), 0)
+		y1 = min(int(np.floor(py.max())), height - 1)
+		if x0 > x1 or y0 > y1:
+			continue
+
+		gy, gx = np.mgrid[y0:y1 + 1, x0:x1 + 1].astype(np.float64)
+		inside = np.ones(gx.shape, bool)
+		weights = []
+
+		for i in range(3):
+			ax, ay = px[(i + 1) % 3], py[(i + 1) % 3]
+			bx, by = px[(i + 2) % 3], py[(i + 2) % 3]
+			e = (bx - ax) * (gy - ay) - (by - ay) * (gx - ax)
+
+			top_left = (ay == by and bx > ax) or (by < ay)
+			inside &= (e > 0) | ((e == 0) & top_left)
+			weights.append(e / area)
+
+		if not np.any(inside):
+			continue
+
+		w = np.stack(weights, axis=-1) * rhw
+		q = w.sum(axis=-1, keepdims=True)
+		tuv = (w @ uv) / np.where(q == 0, 1, q)
+
+		mask[y0:y1 + 1, x0:x1 + 1] |= inside
+		tc[y0:y1 + 1, x0:x1 + 1][inside] = tuv[inside]
+
+	return mask, tc
+
+
+def readImage(file_name):
+	"""Load an image file (a name or a file object) as (format_str, float32 RGBA array)"""
+	try:
+		from PIL import Image
+	except ImportError:
+		raise ImportError("The numpy backend needs Pillow to read image files")
+
+	image = Image.open(file_name)
+
+	if image.mode in ("L", "F") or image.mode.startswith("I"):
+		format_str, scale = {"L": ("L8", 255.0), "F": ("R32F", 1.0)}.get(image.mode, ("L16", 65535.0))
+		value = np.asarray(image, np.float32) / scale
+		return format_str, storeFormat(format_str, np.stack((value,) * 4, axis=-1))
+
+	has_alpha = "A" in image.getbands() or "transparency" in image.info
+	format_str = "A8R8G8B8" if has_alpha else "X8R8G8B8"
+	data = np.asarray(image.convert("RGBA"), np.float32) / 255.0
+
+	return format_str, data
+
+
+def pfmImage(data):
+	"""(format_str, float32 RGBA array) of a top-down PFM array: R32F or A32B32G32R32F"""
+	if data.ndim == 2:
+		return "R32F", storeFormat("R32F", np.stack((data,) * 4, axis=-1))
+
+	return "A32B32G32R32F", np.concatenate((data, np.ones(data.shape[:2] + (1,), np.float32)), axis=-1)
+
+
+def writeImage(file_name, file_format, rgba, has_alpha):
+	try:
+		from PIL import Image
+	except ImportError:
+		raise ImportError("The numpy backend needs Pillow to write image files")
+
+	pil_format = FILE_FORMATS[D3DXIMAGE_FILEFORMAT.by_num[file_format]]
+	mode = "RGBA" if has_alpha and pil_format != "JPEG" else "RGB"
+
+	data = np.round(np.clip(rgba, 0.0, 1.0) * 255.0).astype(np.uint8)
+	Image.fromarray(data[..., :len(mode)], mode).save(file_name, pil_format)
+
+
+def _codeKey(code):
+	"""Bytecode and constants of a code object, nested code included, without addresses"""
+	consts = [_codeKey(value) if hasattr(value, "co_code") else repr(value) for value in code.co_consts]
+
+	return code.co_code.hex() + "(" + ",".join(consts) + ")"
+
+
+class NumpyBackend(Backend):
+	name = "numpy"
+	max_render_targets = 4
+
+	def __init__(self):
+		self.target = None
+		self.targets = []
+		self.target_level = 0
+		self.target_face = 0
+		self.target_size = (0, 0)
+
+	def createTexture(self, kind, width, height, format_str, levels=1, slices=1):
+		return NumpyTexture(kind, format_str, width, height, levels, slices)
+
+	def describeTexture(self, texture):
+		return texture.kind, texture.format, texture.width, texture.height, texture.levels, texture.slices
+
+	def releaseTexture(self, texture):
+		texture.faces = []
+
+	@staticmethod
+	def __imageTexture(format_str, data, levels):
+		height, width = data.shape[:2]
+
+		texture = NumpyTexture("2d", format_str, width, height, int(levels))
+		texture.write(data)
+		texture.generateMips()
+
+		return texture
+
+	def loadTexture(self, file_name, levels=0):
+		if not os.path.isfile(file_name):
+			raise IOError("Can't load texture " '"%s"' % (file_name))
+
+		extension = os.path.splitext(file_name)[1][1:].lower()
+
+		if extension in UNSUPPORTED_FILE_FORMATS:
+			raise IOError(UNSUPPORTED_FILE_FORMATS[extension])
+
+		if extension == "pfm":
+			with rawfiles.openPFM(file_name) as image:
+				format_str, data = pfmImage(np.asarray(image.level(0), np.float32))
+		else:
+			format_str, data = readImage(file_name)
+
+		return self.__imageTexture(format_str, data, levels)
+
+	def loadTextureFromMemory(self, data, levels=0):
+		if data.startswith(b"#?RADIANCE") or data.startswith(b"#?RGBE"):
+			raise IOError(UNSUPPORTED_FILE_FORMATS["hdr"])
+
+		try:
+			if data[:2] in PFM_MAGICS:
+				format_str, data = pfmImage(rawfiles.decodePFM(data))
+			else:
+				format_str, data = readImage(io.BytesIO(data))
+		except (OSError, ValueError):
+			raise IOError("Can't decode texture from %d bytes" % (len(data)))
+
+		return self.__imageTexture(format_str, data, levels)
+
+	@staticmethod
+	def __writeImage(texture, file, file_format):
+		name = D3DXIMAGE_FILEFORMAT.by_num[file_format]
+
+		if name in UNSUPPORTED_FILE_FORMATS:
+			raise IOError(UNSUPPORTED_FILE_FORMATS[name])
+
+		if texture.kind != "2d":
+			return False
+
+		if name == "pfm":
+			rgba = texture.level(0)
+			data = rgba[..., 0] if FORMATS[texture.format][0] in ("r", "l") else rgba[..., :3]
+
+			if isinstance(file, str):
+				rawfiles.writePFM(file, data)
+			else:
+				file.write(rawfiles.encodePFM(data))
+
+			return True
+
+		if name not in FILE_FORMATS:
+			return False
+
+		has_alpha = "a" in FORMATS[texture.format][0]
+
+		try:
+			writeImage(file, file_format, texture.level(0), has_alpha)
+		except (OSError, ValueError, KeyError):
+			return False
+
+		return True
+
+	def saveTexture(self, texture, file_name, file_format):
+		if not self.__writeImage(texture, file_name, file_format):
+			raise IOError("Can't save texture " '"%s"' % (file_name))
+
+	def saveTextureToMemory(self, texture, file_format):
+		stream = io.BytesIO()
+
+		if not self.__writeImage(texture, stream, file_format):
+			raise IOError("Can't encode texture as %s" % (D3DXIMAGE_FILEFORMAT.by_num[file_format]))
+
+		return stream.getvalue()
+
+	def readTexture(self, texture, level=0, face=0, out=None):
+		data = arrays.fromRgba(texture.format, texture.level(level, face))
+
+		return data if out is None else arrays.copyInto(data, out)
+
+	def writeTexture(self, texture, array, level=0, face=0):
+		texture.write(arrays.toRgba(texture.format, array), level, face)
+
+	def createTextureFromArray(self, kind, array, format_str, levels=1):
+		kind, width, height, slices = arrays.imageShape(array, format_str, kind)
+		texture = NumpyTexture(kind, format_str, width, height, levels, slices)
+
+		for face, data in enumerate(array if kind == "cube" else (array,)):
+			texture.write(arrays.toRgba(format_str, data), 0, face)
+			texture.generateMips(face)
+
+		return texture
+
+	def copyLevel(self, src, src_level, src_face, dst, dst_level, dst_face, filter="linear"):
+		image = src.level(src_level, src_face)
+		height, width = dst.level(dst_level, dst_face).shape[:2]
+
+		if image.shape[:2] != (height, width):
+			y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+			uv = np.stack(((x + 0.5) / width, (y + 0.5) / height), axis=-1)
+			image = sample2D(image, uv, "clamp", filter)
+
+		dst.write(image, dst_level, dst_face)
+
+	def copyLevelToVolumeSlice(self, src, src_level, src_face, volume, slice_index, volume_level=0):
+		volume.level(volume_level)[slice_index] = src.level(src_level, src_face)
+
+	def openEffect(self, fx_name, defines=None, optimize=False):
+		try:
+			with open(fx_name, "r") as f:
+				source = f.read()
+		except (OSError, UnicodeDecodeError):
+			raise IOError('Can\'t load effect file "%s"' % (fx_name))
+
+		return NumpyEffect(fx_name, source, defines)
+
+	def createEffect(self, text, defines=None, optimize=False):
+		return NumpyEffect("<string>", text, defines)
+
+	def releaseEffect(self, effect):
+		effect.params.clear()
+
+	def registerTechnique(self, effect, technique_name, kernel):
+		effect.techniques[technique_name] = kernel
+
+	def techniqueKey(self, effect, technique_name):
+		# Kernels are Python code; their closures and globals are not part of the key
+		kernel = effect.techniques.get(technique_name)
+		code = getattr(kernel, "__code__", None)
+
+		if code is None:
+			return repr(kernel)
+
+		return "%s.%s:%s" % (kernel.__module__, kernel.__qualname__, _codeKey(code))
+
+	def setRenderTarget(self, texture, level=0, face=0):
+		return self.setRenderTargets((texture,), level, face)
+
+	def setRenderTargets(self, textures, level=0, face=0):
+		if not 1 <= len(textures) <= self.max_render_targets:
+			raise ValueError("%d render targets, the device takes 1..%d" % (len(textures), self.max_render_targets))
+
+		for texture in textures:
+			if texture.kind not in ("2d", "cube"):
+				raise TypeError("Incorrect render target type")
+
+		sizes = set(texture.level(level, face).shape[:2] for texture in textures)
+		if len(sizes) > 1:
+			raise ValueError("Render targets differ in size")
+
+		height, width = sizes.pop()
+
+		self.target = textures[0]
+		self.targets = list(textures)
+		self.target_level = level
+		self.target_face = face
+		self.target_size = (float(width), float(height))
+
+		return self.target_size
+
+	def __targetOrFail(self):
+		if self.target is None:
+			raise ValueError("No render target set")
+
+		return self.target
+
+	def clear(self, r, g, b, a):
+		self.__targetOrFail()
+		color = np.array((r, g, b, a), np.float32) / 255.0
+
+		for target in self.targets:
+			target.write(color, self.target_level, self.target_face)
+
+	def __shade(self, effect, technique_name, tc=None, mask=None):
+		self.__targetOrFail()
+
+		try:
+			kernel = effect.techniques[technique_name]
+		except KeyError:
+			raise ValueError('Can\'t set technique "%s"' % (technique_name))
+
+		width, height = int(self.target_size[0]), int(self.target_size[1])
+		params = dict(effect.params)
+		params["vTargetSize"] = (float(width), float(height), 1.0 / width, 1.0 / height)
+
+		passes = kernel if isinstance(kernel, (list, tuple)) else (kernel,)
+
+		for kernel_pass in passes:
+			ctx = KernelContext(width, height, params, tc, mask)
+			colors = kernel_pass(ctx)
+
+			if len(self.targets) == 1 or not isinstance(colors, (list, tuple)):
+				colors = (colors,)
+
+			for target, color in zip(self.targets, colors):
+				color = np.asarray(color, dtype=np.float32)
+
+				if color.ndim and color.shape[-1] == 3:
+					color = np.concatenate((color, np.ones(color.shape[:-1] + (1,), np.float32)), axis=-1)
+
+				target.write(color, self.target_level, self.target_face, mask)
+
+	def drawQuad(self, effect, technique_name, do_flush=True):
+		self.__shade(effect, technique_name)
+
+	def drawTris(self, effect, tri_list, technique_name, do_flush=True):
+		self.__drawVertices(effect, np.frombuffer(tri_list, dtype=np.float32).reshape(-1, 3, 6), technique_name)
+
+	def __drawVertices(self, effect, tris, technique_name):
+		width, height = int(self.target_size[0]), int(self.target_size[1])
+
+		mask, tc = rasterize(tris, width, height)
+
+		self.__shade(effect, technique_name, tc, mask)
+
+	def createVertexBuffer(self, data, vertex_count, dynamic=False):
+		return np.frombuffer(data, np.float32, vertex_count * 6).reshape(vertex_count, 6).copy()
+
+	def updateVertexBuffer(self, buffer, data, vertex_count, dynamic=False):
+		buffer[:vertex_count] = np.frombuffer(data, np.float32, vertex_count * 6).reshape(vertex_count, 6)
+
+	def createIndexBuffer(self, data, index_count, index_size, dynamic=False):
+		return np.frombuffer(data, "<u%d" % (index_size), index_count).copy()
+
+	def updateIndexBuffer(self, buffer, data, index_count, index_size, dynamic=False):
+		buffer[:index_count] = np.frombuffer(data, "<u%d" % (index_size), index_count)
+
+	def releaseBuffer(self, buffer):
+		pass
+
+	def drawBuffer(self, effect, vertex_buffer, vertex_count, index_buffer, first, tri_count, technique_name, do_flush=True):
+		if index_buffer is not None:
+			vertices = vertex_buffer[index_buffer[first * 3:(first + tri_count) * 3]]
+		else:
+			vertices = vertex_buffer[first * 3:(first + tri_count) * 3]
+
+		self.__drawVertices(effect, vertices.reshape(-1, 3, 6), technique_name)
+
+	def setFloat(self, effect, name, x):
+		effect.params[name] = float(x)
+
+	def setInt(self, effect, name, x):
+		effect.params[name] = int(x)
+
+	def setVector(self, effect, name, x, y, z, w):
+		effect.params[name] = np.array((x, y, z, w), np.float32)
+
+	def setFloatArray(self, effect, name, floats, count):
+		effect.params[name] = np.frombuffer(floats, np.float32, count).copy()
+
+	def setVectorArray(self, effect, name, floats, count):
+		effect.params[name] = np.frombuffer(floats, np.float32, count * 4).reshape(count, 4).copy()
+
+	def setMatrix(self, effect, name, floats):
+		effect.params[name] = np.frombuffer(floats, np.float32, 16).reshape(4, 4).copy()
+
+	def setTexture(self, effect, name, texture):
+		effect.params[name] = texture
@@ -0,0 +1,229 @@
+"""Streaming frame pipeline with overlapped load, process and save.
+
+	fx = Effect.open("grade.fx")
+
+	def grade(src, dst, item):
+		fx.setTexture("baseMapTexture", src)
+		fx.setRenderTarget(dst)
+		fx.drawQuad("Grade")
+
+	pipe = Pipeline(grade, output="graded")
+	for file_name in pipe.run(sorted(glob.glob("frames/*.png"))):
+		pass
+
+	print(pipe)
+
+Decoding and encoding run on thread pools while the calling thread
+uploads, renders and reads back, so the device stays on one thread. Each
+frame's draw is submitted behind a fence (see fxproc.fence) into its own
+destination target, and read back only once `in_flight - 1` later frames
+are uploaded and drawn, so the GPU renders the next frames while one is
+read back instead of idling on every readback. At most `queue_size`
+frames wait between the other stages, which bounds memory. Results come
+out in input order.
+
+Items are file names by default. Pass `decode(item) -> array` and
+`encode(item, array) -> result` to stream anything else; arrays use the
+raw layout of their format (see fxproc.arrays).
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import arrays
+from .effect import Effect
+from .pool import TexturePool
+
+STAGES = ("decode", "upload", "render", "readback", "encode")
+
+
+def decodeImage(file_name, format_str="A8R8G8B8"):
+	"""Image file as an array in the raw layout of `format_str`"""
+	try:
+		from PIL import Image
+	except ImportError:
+		raise ImportError("fxproc.pipeline needs Pillow to decode image files")
+
+	with Image.open(file_name) as image:
+		rgba = np.asarray(image.convert("RGBA"), np.float32) / 255.0
+
+	return arrays.fromRgba(format_str, rgba)
+
+
+def encodeImage(file_name, array, format_str="A8R8G8B8"):
+	try:
+		from PIL import Image
+	except ImportError:
+		raise ImportError("fxproc.pipeline needs Pillow to encode image files")
+
+	rgba = arrays.toRgba(format_str, array)
+	data = np.round(np.clip(rgba, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+	has_alpha = "a" in arrays.layout(format_str)[1]
+	if os.path.splitext(file_name)[1].lower() in (".jpg", ".jpeg"):
+		has_alpha = False
+
+	mode = "RGBA" if has_alpha else "RGB"
+	Image.fromarray(data[..., :len(mode)], mode).save(file_name)
+
+
+class StageStats :
+
+	def __init__(self, name):
+		self.name = name
+		self.items = 0
+		self.seconds = 0.0
+
+	@property
+	def throughput(self):
+		"""Items per second of busy time, per worker"""
+		return self.items / self.seconds if self.seconds > 0 else 0.0
+
+	def __str__(self):
+		return "%-8s items=%d busy=%.3fs %.1f/s" % (self.name, self.items, self.seconds, self.throughput)
+
+
+class Pipeline :
+
+	def __init__(self, process, output=None, decode=None, encode=None, format_str="A8R8G8B8", out_format=None, workers=4, queue_size=8, in_flight=2):
+		if in_flight < 1:
+			raise ValueError("A pipeline needs at least one frame in flight")
+
+		self.process = process
+		self.output = output
+		self.format = format_str
+		self.out_format = out_format or format_str
+		self.workers = workers
+		self.queue_size = queue_size
+		self.in_flight = in_flight
+		self.pool = TexturePool()
+
+		self.decode = decode or (lambda item: decodeImage(item, self.format))
+		self.encode = encode or self.__save
+
+		self.stats = dict((name, StageStats(name)) for name in STAGES)
+		self.stats_lock = threading.Lock()
+		self.seconds = 0.0
+
+	def __str__(self):
+		lines = [str(self.stats[name]) for name in STAGES]
+		lines.append("total    items=%d wall=%.3fs %.1f/s" % (self.stats["encode"].items, self.seconds, self.fps))
+
+		return "\n".join(lines)
+
+	@property
+	def fps(self):
+		return self.stats["encode"].items / self.seconds if self.seconds > 0 else 0.0
+
+	def outputName(self, item):
+		if callable(self.output):
+			return self.output(item)
+
+		return os.path.join(self.output, os.path.basename(item))
+
+	def __save(self, item, array):
+		if self.output is None:
+			return array
+
+		file_name = self.outputName(item)
+		encodeImage(file_name, array, self.out_format)
+
+		return file_name
+
+	def __timed(self, stage, func, *args):
+		start = time.perf_counter()
+		result = func(*args)
+
+		with self.stats_lock:
+			stats = self.stats[stage]
+			stats.seconds += time.perf_counter() - start
+			stats.items += 1
+
+		return result
+
+	def __render(self, item, data):
+		"""(src, dst, fence) of a frame drawn and submitted, not waited for"""
+		src = self.__timed("upload", Effect.textureFromNumpy, data, self.format)
+		dst = None
+
+		try:
+			dst = self.pool.acquire(src.width, src.height, self.out_format)
+			self.__timed("render", self.process, src, dst, item)
+
+			return src, dst, Effect.submit()
+		except:
+			self.__release(src, dst)
+			raise
+
+	def __readback(self, src, dst, fence):
+		try:
+			fence.wait()
+			return dst.toNumpy()
+		finally:
+			self.__release(src, dst)
+
+	def __release(self, src, dst):
+		src.release()
+
+		if dst is not None:
+			self.pool.release(dst)
+
+	def run(self, inputs):
+		"""Generator of encode() results, in the order of `inputs`"""
+		if isinstance(self.output, str):
+			os.makedirs(self.output, exist_ok=True)
+
+		start = time.perf_counter()
+		items = iter(inputs)
+		decoding = deque()
+		rendering = deque()
+		encoding = deque()
+
+		def fill():
+			for item in items:
+				decoding.append((item, decoders.submit(self.__timed, "decode", self.decode, item)))
+				if len(decoding) >= self.queue_size:
+					break
+
+		def readback():
+			item, src, dst, fence = rendering.popleft()
+			result = self.__timed("readback", self.__readback, src, dst, fence)
+			encoding.append(encoders.submit(self.__timed, "encode", self.encode, item, result))
+
+		with ThreadPoolExecutor(self.workers) as decoders, ThreadPoolExecutor(self.workers) as encoders:
+			try:
+				fill()
+
+				while decoding:
+					item, future = decoding.popleft()
+					data = future.result()
+					fill()
+
+					rendering.append((item,) + self.__render(item, data))
+
+					# The oldest frame is read back while the newer ones render
+					if len(rendering) >= self.in_flight:
+						readback()
+
+					while encoding and (len(encoding) > self.queue_size or encoding[0].done()):
+						yield encoding.popleft().result()
+
+				while rendering:
+					readback()
+
+				while encoding:
+					yield encoding.popleft().result()
+			finally:
+				for item, future in decoding:
+					future.cancel()
+				for item, src, dst, fence in rendering:
+					self.__release(src, dst)
+				for future in encoding:
+					future.cancel()
+
+				self.seconds += time.perf_counter() - start
@@ -0,0 +1,124 @@
+"""Render target pool.
+
+	pool = TexturePool(max_bytes=512 << 20)
+
+	tmp = pool.acquire(512, 512, "A8R8G8B8")
+	...
+	pool.release(tmp)
+
+	with pool.lease(512, 512, "R32F") as tmp:
+		...
+
+Released targets go back to a free list bucketed by (kind, width, height,
+format, levels, slices) and are handed out again by the next acquire of
+the same shape, instead of allocating a new D3DPOOL_DEFAULT resource.
+Idle targets beyond max_bytes are freed, least recently used first.
+Released targets keep their old contents.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .d3dtypes import textureBytes
+from .effect import Effect, Texture
+
+
+class TexturePool :
+
+	def __init__(self, max_bytes=None):
+		self.max_bytes = max_bytes
+		self.buckets = {}
+		self.idle = OrderedDict()
+		self.leased = {}
+		self.idle_bytes = 0
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def __str__(self):
+		return (
+			"hits=" + str(self.hits) +
+			" misses=" + str(self.misses) +
+			" evictions=" + str(self.evictions) +
+			" leased=" + str(len(self.leased)) +
+			" idle=" + str(len(self.idle)) +
+			" idle_bytes=" + str(self.idle_bytes)
+			)
+
+	@staticmethod
+	def __create(kind, width, height, format_str, levels, slices):
+		if kind == "2d":
+			return Effect.createRenderTarget(width, height, format_str, levels)
+		if kind == "cube":
+			return Effect.createRenderTargetCube(width, format_str, levels)
+		if kind == "volume":
+			return Effect.createVolumeTexture(width, height, format_str, levels, slices)
+
+		raise TypeError("Unknown texture kind %r" % (kind))
+
+	def acquire(self, width, height, format_str, levels=1, kind="2d", slices=1):
+		if kind == "cube":
+			height = width
+		if kind != "volume":
+			slices = 1
+
+		key = (kind, width, height, format_str, levels, slices)
+		bucket = self.buckets.get(key)
+
+		if bucket:
+			texture = bucket.pop()
+			del self.idle[id(texture)]
+			self.idle_bytes -= texture.nbytes
+			self.hits += 1
+		else:
+			texture = self.__create(kind, width, height, format_str, levels, slices)
+			self.misses += 1
+
+		self.leased[id(texture)] = key
+		return texture
+
+	def acquireCube(self, size, format_str, levels=1):
+		return self.acquire(size, size, format_str, levels, kind="cube")
+
+	def acquireVolume(self, width, height, format_str, levels=1, slices=1):
+		return self.acquire(width, height, format_str, levels, kind="volume", slices=slices)
+
+	def release(self, texture):
+		Texture.check_type_of(texture)
+
+		try:
+			key = self.leased.pop(id(texture))
+		except KeyError:
+			raise ValueError("Texture was not acquired from this pool")
+
+		self.buckets.setdefault(key, []).append(texture)
+		self.idle[id(texture)] = (key, texture)
+		self.idle_bytes += texture.nbytes
+
+		if self.max_bytes is not None:
+			self.trim(self.max_bytes)
+
+	@contextmanager
+	def lease(self, width, height, format_str, levels=1, kind="2d", slices=1):
+		texture = self.acquire(width, height, format_str, levels, kind, slices)
+		try:
+			yield texture
+		finally:
+			self.release(texture)
+
+	def trim(self, max_bytes=0):
+		"""Free idle targets, oldest first, until at most max_bytes stay idle"""
+		while self.idle and self.idle_bytes > max_bytes:
+			key, texture = self.idle.popitem(last=False)[1]
+			self.buckets[key].remove(texture)
+			if not self.buckets[key]:
+				del self.buckets[key]
+
+			self.idle_bytes -= texture.nbytes
+			self.evictions += 1
+
+			texture.release()
+
+	def clear(self):
+		self.trim(0)
@@ -0,0 +1,200 @@
+"""GPU and CPU timing of draws.
+
+	with Effect.profile() as prof:
+		fx.setRenderTarget(out)
+		fx.drawQuad("LowPass")
+		...
+
+	print(prof.summary())
+	prof.saveChromeTrace("trace.json")   # chrome://tracing or ui.perfetto.dev
+
+While a profiler is attached, each drawQuad/drawTris/drawBuffer call,
+batched or not, is bracketed by GPU timestamps (D3DQUERYTYPE_TIMESTAMP
+inside a TIMESTAMPDISJOINT/TIMESTAMPFREQ pair on D3D9). The profiler
+records the GPU time, the CPU time spent submitting the draw, and the
+time spent waiting in flushes. Timestamps are resolved every
+RESOLVE_EVERY draws and when the profiler exits. Resolving waits for the
+GPU, so profiled runs are slower than normal ones. Draws whose timestamps
+were disjoint (clock change, device lost) keep their CPU times only.
+
+All passes of a technique are timed together. CPU backends run draws
+synchronously, so their GPU time is the time spent shading.
+"""
+
+import json
+import time
+
+TECHNIQUE_ARG = {"drawQuad": 1, "drawTris": 2, "drawBuffer": 6}
+RESOLVE_EVERY = 512
+
+
+class ProfileEvent :
+	__slots__ = ("name", "method", "cpu_start", "cpu_end", "gpu_start", "gpu_end")
+
+	def __init__(self, name, method, cpu_start, cpu_end):
+		self.name = name
+		self.method = method
+		self.cpu_start = cpu_start
+		self.cpu_end = cpu_end
+		self.gpu_start = None
+		self.gpu_end = None
+
+	@property
+	def cpu_seconds(self):
+		return self.cpu_end - self.cpu_start
+
+	@property
+	def gpu_seconds(self):
+		return self.gpu_end - self.gpu_start if self.gpu_start is not None else None
+
+
+class Profiler :
+
+	def __init__(self, backend):
+		self.backend = backend
+		self.events = []
+		self.pending = []
+		self.token = None
+		self.timing = False
+
+		self.start = None
+		self.end = None
+		self.disjoint = 0
+		self.state_calls = 0
+		self.state_seconds = 0.0
+
+	def __enter__(self):
+		if self.backend.profiler is not None:
+			raise RuntimeError("A profiler is already attached to this device")
+
+		self.backend.profiler = self
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		try:
+			self.resolve()
+		finally:
+			self.backend.profiler = None
+			self.end = time.perf_counter()
+
+	def call(self, backend, method, args):
+		"""Backend.run() hook"""
+		if method in TECHNIQUE_ARG:
+			return self.__draw(backend, method, args)
+
+		start = time.perf_counter()
+		try:
+			return getattr(backend, method)(*args)
+		finally:
+			if method == "flush":
+				self.events.append(ProfileEvent("flush", method, start, time.perf_counter()))
+			else:
+				self.state_calls += 1
+				self.state_seconds += time.perf_counter() - start
+
+	def __draw(self, backend, method, args):
+		# Time the flush on its own, not as part of the draw
+		do_flush = args[-1]
+		args = args[:-1] + (False,)
+
+		if not self.timing:
+			self.token = backend.beginTiming()
+			self.timing = True
+
+		cpu_start = time.perf_counter()
+		stamp_start = backend.timestamp()
+
+		result = getattr(backend, method)(*args)
+
+		stamp_end = backend.timestamp()
+		event = ProfileEvent(args[TECHNIQUE_ARG[method]], method, cpu_start, time.perf_counter())
+		self.pending.append((event, stamp_start, stamp_end))
+
+		if do_flush:
+			start = time.perf_counter()
+			backend.endScene()
+			backend.flush()
+			self.events.append(ProfileEvent("flush", "flush", start, time.perf_counter()))
+
+		if len(self.pending) >= RESOLVE_EVERY:
+			self.resolve()
+
+		return result
+
+	def resolve(self):
+		"""Wait for the pending GPU timestamps and attach them to their draws"""
+		if not self.timing:
+			return
+
+		pending = self.pending
+		stamps = [stamp for event, start, end in pending for stamp in (start, end)]
+		seconds = self.backend.endTiming(self.token, stamps)
+
+		self.token = None
+		self.timing = False
+		self.pending = []
+
+		if seconds is None:
+			self.disjoint += len(pending)
+		elif pending:
+			# Put GPU times on the CPU clock, aligned on the first draw
+			offset = pending[0][0].cpu_start - seconds[0]
+
+			for i, (event, start, end) in enumerate(pending):
+				event.gpu_start = seconds[2 * i] + offset
+				event.gpu_end = seconds[2 * i + 1] + offset
+
+		self.events.extend(event for event, start, end in pending)
+
+	def stats(self):
+		"""{technique: {"calls", "gpu", "cpu"}} in seconds; flushes are under "flush" """
+		stats = {}
+
+		for event in self.events:
+			entry = stats.setdefault(event.name, {"calls": 0, "gpu": 0.0, "cpu": 0.0})
+			entry["calls"] += 1
+			entry["cpu"] += event.cpu_seconds
+			entry["gpu"] += event.gpu_seconds or 0.0
+
+		return stats
+
+	def summary(self):
+		stats = self.stats()
+		flush = stats.pop("flush", {"calls": 0, "cpu": 0.0})
+
+		lines = ["%-24s %7s %10s %10s %10s" % ("technique", "calls", "gpu ms", "avg ms", "cpu ms")]
+
+		for name, entry in sorted(stats.items(), key=lambda item: -item[1]["gpu"]):
+			lines.append("%-24s %7d %10.3f %10.3f %10.3f" % (
+				name, entry["calls"], entry["gpu"] * 1000.0, entry["gpu"] * 1000.0 / entry["calls"], entry["cpu"] * 1000.0))
+
+		lines.append("%-24s %7d %10s %10s %10.3f" % ("flush wait", flush["calls"], "", "", flush["cpu"] * 1000.0))
+		lines.append("%-24s %7d %10s %10s %10.3f" % ("state changes", self.state_calls, "", "", self.state_seconds * 1000.0))
+
+		if self.disjoint:
+			lines.append("%d draws have no GPU time (disjoint timestamps)" % (self.disjoint))
+
+		return "\n".join(lines)
+
+	def chromeTrace(self):
+		"""Trace Event Format dict, CPU submission and GPU execution on separate rows"""
+		origin = self.start or 0.0
+		trace = [
+			{"ph": "M", "pid": 1, "tid": 1, "name": "thread_name", "args": {"name": "CPU submit"}},
+			{"ph": "M", "pid": 1, "tid": 2, "name": "thread_name", "args": {"name": "GPU"}},
+			]
+
+		for event in self.events:
+			trace.append({"ph": "X", "pid": 1, "tid": 1, "name": event.name, "cat": event.method,
+				"ts": (event.cpu_start - origin) * 1e6, "dur": event.cpu_seconds * 1e6})
+
+			if event.gpu_start is not None:
+				trace.append({"ph": "X", "pid": 1, "tid": 2, "name": event.name, "cat": event.method,
+					"ts": (event.gpu_start - origin) * 1e6, "dur": event.gpu_seconds * 1e6})
+
+		return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+	def saveChromeTrace(self, file_name):
+		with open(file_name, "w") as f:
+			json.dump(self.chromeTrace(), f)
@@ -0,0 +1,473 @@
+"""Memory-mapped DDS and PFM files for raw texture data.
+
+	out = Effect.createRenderTarget(8192, 8192, "A32B32G32R32F")
+	...
+	rawfiles.saveTexture(out, "checkpoint.dds")
+
+	with rawfiles.openDDS("checkpoint.dds") as image:
+		src = image.texture()                # uploaded straight from the mapping
+		detail = image.level(0)[100:200, :]  # reads only the pages it touches
+
+The pixel payload is exposed as NumPy views into the mapped file, in the
+raw layout of the format (see fxproc.arrays), so reading and writing cost
+about a memcpy and nothing is decoded. Cube files give (6, h, w, ...)
+levels and volume files (d, h, w, ...) levels.
+
+DDS files hold any format with a NumPy layout, with all mip levels. Float
+formats are tagged with their D3DFORMAT number as FOURCC, like D3DX does.
+Block compressed and DX10 header files are not supported.
+
+PFM files hold one float32 level, grayscale ("Pf", R32F) or RGB ("PF").
+Rows are stored bottom up, so views have a negative row stride. RGB data
+has no D3DFORMAT; texture() expands it to A32B32G32R32F, which copies,
+and writing an A32B32G32R32F level drops alpha.
+decodePFM() and encodePFM() convert PFM files held in memory, for the
+numpy backend's loadTextureFromMemory and saveTextureToMemory.
+"""
+
+import ctypes
+
+import numpy as np
+
+from . import arrays
+from .d3dtypes import D3DFORMAT
+
+DDS_MAGIC = b"DDS "
+
+DDSD_CAPS = 0x1
+DDSD_HEIGHT = 0x2
+DDSD_WIDTH = 0x4
+DDSD_PITCH = 0x8
+DDSD_PIXELFORMAT = 0x1000
+DDSD_MIPMAPCOUNT = 0x20000
+DDSD_DEPTH = 0x800000
+
+DDPF_ALPHAPIXELS = 0x1
+DDPF_ALPHA = 0x2
+DDPF_FOURCC = 0x4
+DDPF_RGB = 0x40
+DDPF_LUMINANCE = 0x20000
+
+DDSCAPS_COMPLEX = 0x8
+DDSCAPS_TEXTURE = 0x1000
+DDSCAPS_MIPMAP = 0x400000
+
+DDSCAPS2_CUBEMAP = 0x200
+DDSCAPS2_CUBEMAP_ALLFACES = 0xFC00
+DDSCAPS2_VOLUME = 0x200000
+
+# D3DFORMAT -> (DDPF flags, bit count, R, G, B, A masks); other formats use FOURCC
+DDS_MASKS = {
+	"R8G8B8": (DDPF_RGB, 24, 0xFF0000, 0xFF00, 0xFF, 0),
+	"A8R8G8B8": (DDPF_RGB | DDPF_ALPHAPIXELS, 32, 0xFF0000, 0xFF00, 0xFF, 0xFF000000),
+	"X8R8G8B8": (DDPF_RGB, 32, 0xFF0000, 0xFF00, 0xFF, 0),
+	"A8B8G8R8": (DDPF_RGB | DDPF_ALPHAPIXELS, 32, 0xFF, 0xFF00, 0xFF0000, 0xFF000000),
+	"X8B8G8R8": (DDPF_RGB, 32, 0xFF, 0xFF00, 0xFF0000, 0),
+	"G16R16": (DDPF_RGB, 32, 0xFFFF, 0xFFFF0000, 0, 0),
+	"A8": (DDPF_ALPHA, 8, 0, 0, 0, 0xFF),
+	"L8": (DDPF_LUMINANCE, 8, 0xFF, 0, 0, 0),
+	"A8L8": (DDPF_LUMINANCE | DDPF_ALPHAPIXELS, 16, 0xFF, 0, 0, 0xFF00),
+	"L16": (DDPF_LUMINANCE, 16, 0xFFFF, 0, 0, 0),
+	}
+
+# ctypes.wintypes.DWORD is not 32-bit everywhere, file headers use c_uint32
+class DDS_PIXELFORMAT(ctypes.LittleEndianStructure):
+	_fields_ = [
+		('dwSize', ctypes.c_uint32),
+		('dwFlags', ctypes.c_uint32),
+		('dwFourCC', ctypes.c_uint32),
+		('dwRGBBitCount', ctypes.c_uint32),
+		('dwRBitMask', ctypes.c_uint32),
+		('dwGBitMask', ctypes.c_uint32),
+		('dwBBitMask', ctypes.c_uint32),
+		('dwABitMask', ctypes.c_uint32),
+		]
+
+
+class DDS_HEADER(ctypes.LittleEndianStructure):
+	_fields_ = [
+		('dwSize', ctypes.c_uint32),
+		('dwFlags', ctypes.c_uint32),
+		('dwHeight', ctypes.c_uint32),
+		('dwWidth', ctypes.c_uint32),
+		('dwPitchOrLinearSize', ctypes.c_uint32),
+		('dwDepth', ctypes.c_uint32),
+		('dwMipMapCount', ctypes.c_uint32),
+		('dwReserved1', ctypes.c_uint32 * 11),
+		('ddspf', DDS_PIXELFORMAT),
+		('dwCaps', ctypes.c_uint32),
+		('dwCaps2', ctypes.c_uint32),
+		('dwCaps3', ctypes.c_uint32),
+		('dwCaps4', ctypes.c_uint32),
+		('dwReserved2', ctypes.c_uint32),
+		]
+
+DDS_DATA_OFFSET = len(DDS_MAGIC) + ctypes.sizeof(DDS_HEADER)
+
+
+def _levelSize(level, size):
+	return max(1, size >> level)
+
+
+class MappedImage :
+	"""Pixel payload of a mapped DDS or PFM file
+
+- format        D3DFORMAT name, None for RGB PFM files
+- kind          "2d", "cube" or "volume"
+- width, height, levels, slices
+
+- level         ( level = 0 ) -> view
+- texture       ( levels = 1 ) -> Texture
+- flush         ( )
+- close         ( )
+"""
+
+	def __init__(self, raw, format_str, kind, width, height, levels=1, slices=1, offset=0, dtype=None, channels=None, flipped=False):
+		self.raw = raw
+		self.format = format_str
+		self.kind = kind
+		self.width = width
+		self.height = height
+		self.levels = levels
+		self.slices = slices if kind == "volume" else 1
+		self.offset = offset
+		self.flipped = flipped
+
+		if format_str is not None:
+			dtype, layout_channels = arrays.layout(format_str)
+			channels = len(layout_channels)
+
+		self.dtype = np.dtype(dtype)
+		self.channels = channels
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def __levelBytes(self, level):
+		texels = _levelSize(level, self.width) * _levelSize(level, self.height) * _levelSize(level, self.slices)
+		return texels * self.channels * self.dtype.itemsize
+
+	@property
+	def nbytes(self):
+		chain = sum(self.__levelBytes(level) for level in range(self.levels))
+		return chain * (6 if self.kind == "cube" else 1)
+
+	def level(self, level=0):
+		"""Zero-copy view of one mip level; writable when the file was opened for writing"""
+		if not 0 <= level < self.levels:
+			raise ValueError("Level %d is outside of %d levels" % (level, self.levels))
+
+		width = _levelSize(level, self.width)
+		height = _levelSize(level, self.height)
+		texel = self.channels * self.dtype.itemsize
+
+		shape = (height, width)
+		strides = (width * texel, texel)
+		if self.channels > 1:
+			shape += (self.channels,)
+			strides += (self.dtype.itemsize,)
+
+		offset = self.offset + sum(self.__levelBytes(i) for i in range(level))
+
+		if self.flipped:
+			offset += (height - 1) * width * texel
+			strides = (-strides[0],) + strides[1:]
+
+		if self.kind == "cube":
+			# DDS cube files store the whole mip chain of one face after the other
+			shape = (6,) + shape
+			strides = (self.nbytes // 6,) + strides
+
+		elif self.kind == "volume":
+			depth = _levelSize(level, self.slices)
+			shape = (depth,) + shape
+			strides = (height * width * texel,) + strides
+
+		return np.ndarray(shape, self.dtype, buffer=self.raw, offset=offset, strides=strides)
+
+	@property
+	def array(self):
+		return self.level(0)
+
+	def texture(self, levels=1):
+		"""Texture with the top level uploaded from the mapping; other levels are
+box filtered like Effect.textureFromNumpy does.
+"""
+		from .effect import Effect
+
+		data = self.level(0)
+		format_str = self.format
+
+		# Big-endian PFM files have no matching D3DFORMAT
+		if format_str is None and self.channels == 1:
+			format_str = "R32F"
+			data = data.astype("<f4")
+		elif format_str is None:
+			format_str = "A32B32G32R32F"
+			data = np.concatenate((data.astype("<f4"), np.ones(data.shape[:-1] + (1,), np.float32)), axis=-1)
+
+		return Effect.textureFromNumpy(data, format_str, levels, self.kind)
+
+	def flush(self):
+		if self.raw is not None and self.raw.mode != "r":
+			self.raw.flush()
+
+	def close(self):
+		"""Flush and drop the mapping; views taken from it stay valid"""
+		self.flush()
+		self.raw = None
+
+
+def _mapFile(file_name, mode, size=None):
+	if size is None:
+		return np.memmap(file_name, np.uint8, mode)
+
+	return np.memmap(file_name, np.uint8, "w+", shape=(size,))
+
+
+def openDDS(file_name, mode="r"):
+	"""Map a DDS file; mode "r+" makes the views writable"""
+	raw = _mapFile(file_name, mode)
+
+	if raw.size < DDS_DATA_OFFSET or bytes(raw[:4]) != DDS_MAGIC:
+		raise IOError('"%s" is not a DDS file' % (file_name))
+
+	header = DDS_HEADER.from_buffer_copy(bytes(raw[4:DDS_DATA_OFFSET]))
+	pf = header.ddspf
+
+	if pf.dwFlags & DDPF_FOURCC:
+		if pf.dwFourCC not in D3DFORMAT.by_num:
+			raise TypeError('"%s" uses an unsupported FOURCC 0x%08x' % (file_name, pf.dwFourCC))
+
+		format_str = D3DFORMAT.by_num[pf.dwFourCC]
+	else:
+		masks = (pf.dwFlags, pf.dwRGBBitCount, pf.dwRBitMask, pf.dwGBitMask, pf.dwBBitMask, pf.dwABitMask)
+		matches = [name for name, value in DDS_MASKS.items() if value == masks]
+
+		if not matches:
+			raise TypeError('"%s" uses an unsupported pixel format' % (file_name))
+
+		format_str = matches[0]
+
+	if header.dwCaps2 & DDSCAPS2_CUBEMAP:
+		if header.dwCaps2 & DDSCAPS2_CUBEMAP_ALLFACES != DDSCAPS2_CUBEMAP_ALLFACES:
+			raise TypeError('"%s" is a partial cube map' % (file_name))
+		kind = "cube"
+	elif header.dwCaps2 & DDSCAPS2_VOLUME:
+		kind = "volume"
+	else:
+		kind = "2d"
+
+	levels = max(1, header.dwMipMapCount) if header.dwFlags & DDSD_MIPMAPCOUNT else 1
+	slices = max(1, header.dwDepth) if kind == "volume" else 1
+
+	image = MappedImage(raw, format_str, kind, header.dwWidth, header.dwHeight, levels, slices, DDS_DATA_OFFSET)
+
+	if raw.size < DDS_DATA_OFFSET + image.nbytes:
+		raise IOError('"%s" is truncated' % (file_name))
+
+	return image
+
+
+def createDDS(file_name, format_str, width, height, levels=1, kind="2d", slices=1):
+	"""New DDS file of the given layout, mapped for writing; fill its level() views"""
+	image = MappedImage(None, format_str, kind, width, height, levels, slices, DDS_DATA_OFFSET)
+
+	header = DDS_HEADER()
+	header.dwSize = ctypes.sizeof(DDS_HEADER)
+	header.dwFlags = DDSD_CAPS | DDSD_HEIGHT | DDSD_WIDTH | DDSD_PITCH | DDSD_PIXELFORMAT
+	header.dwHeight = height
+	header.dwWidth = width
+	header.dwPitchOrLinearSize = width * image.channels * image.dtype.itemsize
+	header.dwCaps = DDSCAPS_TEXTURE
+
+	if levels > 1:
+		header.dwFlags |= DDSD_MIPMAPCOUNT
+		header.dwMipMapCount = levels
+		header.dwCaps |= DDSCAPS_COMPLEX | DDSCAPS_MIPMAP
+
+	if kind == "cube":
+		header.dwCaps |= DDSCAPS_COMPLEX
+		header.dwCaps2 = DDSCAPS2_CUBEMAP | DDSCAPS2_CUBEMAP_ALLFACES
+	elif kind == "volume":
+		header.dwFlags |= DDSD_DEPTH
+		header.dwDepth = slices
+		header.dwCaps |= DDSCAPS_COMPLEX
+		header.dwCaps2 = DDSCAPS2_VOLUME
+
+	pf = header.ddspf
+	pf.dwSize = ctypes.sizeof(DDS_PIXELFORMAT)
+
+	if format_str in DDS_MASKS:
+		pf.dwFlags, pf.dwRGBBitCount, pf.dwRBitMask, pf.dwGBitMask, pf.dwBBitMask, pf.dwABitMask = DDS_MASKS[format_str]
+	else:
+		pf.dwFlags = DDPF_FOURCC
+		pf.dwFourCC = D3DFORMAT.by_str[format_str]
+
+	raw = _mapFile(file_name, "w+", DDS_DATA_OFFSET + image.nbytes)
+	raw[:DDS_DATA_OFFSET] = np.frombuffer(DDS_MAGIC + bytes(header), np.uint8)
+	image.raw = raw
+
+	return image
+
+
+def writeDDS(file_name, array, format_str, kind=None):
+	"""Write an array in the raw layout of `format_str` (or a list of them, one
+per mip level) as a DDS file. kind="cube" takes (6, h, w, ...) arrays.
+"""
+	levels = list(array) if isinstance(array, (list, tuple)) else [array]
+	kind, width, height, slices = arrays.imageShape(levels[0], format_str, kind)
+
+	with createDDS(file_name, format_str, width, height, len(levels), kind, slices) as image:
+		for level, data in enumerate(levels):
+			image.level(level)[...] = data
+
+
+def _pfmHeader(head, file_name):
+	"""(width, height, channels, dtype, data offset) from the start of a PFM file"""
+	# Three whitespace separated tokens follow the magic, then one whitespace byte
+	tokens = []
+	pos = 2
+
+	if head[:2] not in (b"PF", b"Pf"):
+		raise IOError('"%s" is not a PFM file' % (file_name))
+
+	while len(tokens) < 3:
+		while pos < len(head) and head[pos:pos + 1].isspace():
+			pos += 1
+		end = pos
+		while end < len(head) and not head[end:end + 1].isspace():
+			end += 1
+		if end >= len(head):
+			raise IOError('"%s" has a broken PFM header' % (file_name))
+
+		tokens.append(head[pos:end])
+		pos = end
+
+	try:
+		width, height, scale = int(tokens[0]), int(tokens[1]), float(tokens[2])
+	except ValueError:
+		raise IOError('"%s" has a broken PFM header' % (file_name))
+
+	channels = 3 if head[:2] == b"PF" else 1
+
+	return width, height, channels, "<f4" if scale < 0 else ">f4", pos + 1
+
+
+def openPFM(file_name, mode="r"):
+	"""Map a PFM file; mode "r+" makes the views writable"""
+	raw = _mapFile(file_name, mode)
+
+	width, height, channels, dtype, offset = _pfmHeader(bytes(raw[:256]), file_name)
+	format_str = "R32F" if channels == 1 and dtype == "<f4" else None
+
+	image = MappedImage(raw, format_str, "2d", width, height, offset=offset, dtype=dtype, channels=channels, flipped=True)
+
+	if raw.size < image.offset + image.nbytes:
+		raise IOError('"%s" is truncated' % (file_name))
+
+	return image
+
+
+def createPFM(file_name, width, height, channels=1):
+	"""New little-endian PFM file with 1 or 3 channels, mapped for writing"""
+	if channels not in (1, 3):
+		raise ValueError("PFM files have 1 or 3 channels, not %d" % (channels))
+
+	header = b"%s\n%d %d\n-1.0\n" % (b"PF" if channels == 3 else b"Pf", width, height)
+	image = MappedImage(None, "R32F" if channels == 1 else None, "2d", width, height,
+		offset=len(header), dtype="<f4", channels=channels, flipped=True)
+
+	raw = _mapFile(file_name, "w+", len(header) + image.nbytes)
+	raw[:len(header)] = np.frombuffer(header, np.uint8)
+	image.raw = raw
+
+	return image
+
+
+def _pfmArray(array):
+	array = np.asarray(array)
+
+	if array.ndim == 3 and array.shape[-1] == 4:
+		array = array[..., :3]
+
+	if array.ndim not in (2, 3) or (array.ndim == 3 and array.shape[-1] != 3):
+		raise ValueError("Can't write an array of shape %r as PFM" % (array.shape,))
+
+	return array
+
+
+def writePFM(file_name, array):
+	"""Write an (h, w) or (h, w, 3) float array, or (h, w, 4) without its alpha"""
+	array = _pfmArray(array)
+	height, width = array.shape[:2]
+
+	with createPFM(file_name, width, height, 1 if array.ndim == 2 else 3) as image:
+		image.level(0)[...] = array
+
+
+def decodePFM(data):
+	"""Top-down (h, w) or (h, w, 3) float32 array of a PFM file held in memory"""
+	width, height, channels, dtype, offset = _pfmHeader(bytes(data[:256]), "<memory>")
+	shape = (height, width) if channels == 1 else (height, width, channels)
+	size = width * height * channels * 4
+
+	if len(data) < offset + size:
+		raise IOError("PFM data is truncated")
+
+	return np.frombuffer(data, dtype, width * height * channels, offset).reshape(shape)[::-1].astype(np.float32)
+
+
+def encodePFM(array):
+	"""PFM file bytes of an array writePFM() takes"""
+	array = _pfmArray(array)
+	height, width = array.shape[:2]
+	header = b"%s\n%d %d\n-1.0\n" % (b"PF" if array.ndim == 3 else b"Pf", width, height)
+
+	return header + np.ascontiguousarray(array[::-1], "<f4").tobytes()
+
+
+def openFile(file_name, mode="r"):
+	"""Map a .dds or .pfm file, by extension"""
+	if file_name.lower().endswith(".pfm"):
+		return openPFM(file_name, mode)
+
+	return openDDS(file_name, mode)
+
+
+def loadTexture(file_name, levels=1):
+	with openFile(file_name) as image:
+		return image.texture(levels)
+
+
+def saveTexture(pyobj, file_name):
+	"""Read a texture back straight into a new .dds (every level and face) or
+.pfm (level 0 of an R32F or A32B32G32R32F 2d texture) file.
+"""
+	from .effect import Texture
+
+	Texture.check_type_of(pyobj)
+
+	if file_name.lower().endswith(".pfm"):
+		if pyobj.kind != "2d" or pyobj.format not in ("R32F", "A32B32G32R32F"):
+			raise TypeError("PFM files hold 2d R32F or A32B32G32R32F data, not %s %s" % (pyobj.kind, pyobj.format))
+
+		if pyobj.format == "R32F":
+			with createPFM(file_name, pyobj.width, pyobj.height) as image:
+				pyobj.toNumpy(0, 0, image.level(0))
+		else:
+			writePFM(file_name, pyobj.toNumpy())
+		return
+
+	with createDDS(file_name, pyobj.format, pyobj.width, pyobj.height, pyobj.levels, pyobj.kind, pyobj.slices) as image:
+		for level in range(pyobj.levels):
+			view = image.level(level)
+
+			if pyobj.kind == "cube":
+				for face in range(6):
+					pyobj.toNumpy(level, face, view[face])
+			else:
+				pyobj.toNumpy(level, 0, view)
@@ -0,0 +1,273 @@
+"""Reductions and histograms computed on the device.
+
+	mean = Effect.reduce(out, "mean")              # (r, g, b, a) floats
+	error = Effect.reduce(diff, "max")[0]
+	counts = Effect.histogram(lena, 256, "l")      # list of 256 ints
+
+Backends that compile effects run the reduction as a chain of drawQuad
+passes into A32B32G32R32F targets, each pass folding blocks of texels into
+one, and read back only the last, tiny target. A histogram's first pass
+counts the texels of a block falling into 4 bins per output texel, with
+groups of such texels tiled side by side for all the bins; the following
+passes sum within groups. The NumPy backend reads the level and reduces
+it with vectorized NumPy instead.
+
+Values are sampled like a shader sees them: normalized 0..1 for integer
+formats, missing channels read as 1. Histogram bins split 0..1 evenly;
+values outside it go to the first or last bin. Channel "l" is Rec. 709
+luminance. Counts are accumulated in float32 on the device, so they are
+exact up to 2^24 texels per bin.
+"""
+
+import math
+import weakref
+
+import numpy as np
+
+from . import arrays
+from .backend import getBackend
+from .effect import Effect, Texture, _batched
+from .pool import TexturePool
+
+OPS = ("sum", "min", "max", "mean")
+
+CHANNELS = {
+	"r": (1.0, 0.0, 0.0, 0.0),
+	"g": (0.0, 1.0, 0.0, 0.0),
+	"b": (0.0, 0.0, 1.0, 0.0),
+	"a": (0.0, 0.0, 0.0, 1.0),
+	"l": (0.2126, 0.7152, 0.0722, 0.0),
+	}
+
+REDUCTION_FORMAT = "A32B32G32R32F"
+
+# Texels folded per axis by each pass after the first
+BLOCK = 4
+
+REDUCTION_FX = """
+texture reduceMapTexture;
+sampler2D reduceMap = sampler_state {
+	Texture = <reduceMapTexture>;
+	Filter = MIN_MAG_MIP_POINT;
+	AddressU = Clamp;
+	AddressV = Clamp; };
+
+// Source group width and height in texels, 1 / source texture size
+float4 vSource;
+// Texels folded per output texel, output group width and height
+float4 vBlock;
+// Texels between source groups, groups per row, source mip level
+float4 vStride;
+// Bin count and channel weights of histograms
+float fBins;
+float4 vChannel;
+
+void VSReduce(
+	out float4 outPos : POSITION,
+	out float2 outTc : TEXCOORD0,
+	in float3 inPos : POSITION
+	)
+{
+	outPos = float4(inPos.x * 2 - 1, inPos.y * 2 - 1, 0, 1);
+	outTc.x = inPos.x;
+	outTc.y = 1 - inPos.y;
+}
+
+// op: 0 sum, 1 min, 2 max, 3 histogram
+float4 reduceBlock(float2 vpos, int op)
+{
+	float2 pixel = floor(vpos);
+	float2 group = floor(pixel / vBlock.zw);
+	float2 origin = group * vStride.xy;
+	float2 first = origin + (pixel - group * vBlock.zw) * vBlock.xy;
+	float2 end = origin + vSource.xy;
+
+	float4 acc = op == 1 ? 3.4e38 : (op == 2 ? -3.4e38 : 0);
+	float4 bins = 4 * (group.y * vStride.z + group.x) + float4(0, 1, 2, 3);
+
+	[loop] for (float y = 0; y < vBlock.y; y++)
+	[loop] for (float x = 0; x < vBlock.x; x++)
+	{
+		float2 texel = first + float2(x, y);
+
+		[branch] if (texel.x < end.x && texel.y < end.y)
+		{
+			float4 value = tex2Dlod(reduceMap, float4((texel + 0.5) * vSource.zw, 0, vStride.w));
+
+			if (op == 0) acc += value;
+			if (op == 1) acc = min(acc, value);
+			if (op == 2) acc = max(acc, value);
+			if (op == 3) acc += min(floor(saturate(dot(value, vChannel)) * fBins), fBins - 1) == bins ? 1 : 0;
+		}
+	}
+
+	return acc;
+}
+
+float4 PSReduceSum(in float2 stc : VPOS) : COLOR { return reduceBlock(stc, 0); }
+float4 PSReduceMin(in float2 stc : VPOS) : COLOR { return reduceBlock(stc, 1); }
+float4 PSReduceMax(in float2 stc : VPOS) : COLOR { return reduceBlock(stc, 2); }
+float4 PSHistogram(in float2 stc : VPOS) : COLOR { return reduceBlock(stc, 3); }
+
+technique ReduceSum { pass P0 { VertexShader = compile vs_3_0 VSReduce(); PixelShader = compile ps_3_0 PSReduceSum(); } }
+technique ReduceMin { pass P0 { VertexShader = compile vs_3_0 VSReduce(); PixelShader = compile ps_3_0 PSReduceMin(); } }
+technique ReduceMax { pass P0 { VertexShader = compile vs_3_0 VSReduce(); PixelShader = compile ps_3_0 PSReduceMax(); } }
+technique Histogram { pass P0 { VertexShader = compile vs_3_0 VSReduce(); PixelShader = compile ps_3_0 PSHistogram(); } }
+"""
+
+TECHNIQUES = {"sum": "ReduceSum", "mean": "ReduceSum", "min": "ReduceMin", "max": "ReduceMax"}
+
+# Backend -> Effect of REDUCTION_FX
+effects = weakref.WeakKeyDictionary()
+
+
+def reductionEffect():
+	backend = getBackend()
+
+	effect = effects.get(backend)
+	if effect is None or effect.released:
+		effect = effects[backend] = Effect.fromstring(REDUCTION_FX)
+
+	return effect
+
+
+def _checkSource(pyobj, level, face):
+	Texture.check_type_of(pyobj)
+
+	if pyobj.kind == "volume":
+		raise TypeError("Volume textures can't be reduced")
+	if not 0 <= level < pyobj.levels:
+		raise ValueError("Level %d is out of range 0..%d" % (level, pyobj.levels - 1))
+
+
+def _rgba(pyobj, level, face):
+	"""Float RGBA (h, w, 4) of one level, for the NumPy path"""
+	return arrays.toRgba(pyobj.format, pyobj.toNumpy(level, face))
+
+
+def _reduceOnDevice(pyobj, level, face, technique_name, combine_name, groups, first_block, params, pool):
+	"""(gy, gx, 4) float RGBA of `groups` (gx, gy) groups, each the result of
+`technique_name` over the level followed by `combine_name` passes.
+"""
+	effect = reductionEffect()
+	scratch = pool or TexturePool()
+	leased = []
+
+	width = max(1, pyobj.width >> level)
+	height = max(1, pyobj.height >> level)
+	gx, gy = groups
+
+	try:
+		with _batched(effect.backend):
+			effect.params.update(params)
+
+			source = pyobj
+			source_level = level
+
+			# Cube faces are sampled from a 2D copy, which copyLevel draws for
+			# cubes that aren't render targets. Float keeps what a shader reads
+			# from any source format, block compressed ones included.
+			if pyobj.kind == "cube":
+				source = scratch.acquire(width, height, REDUCTION_FORMAT)
+				leased.append(source)
+				Effect.copyLevel(pyobj, source, level, 0, face, 0, "point")
+				source_level = 0
+
+			# Every group of the first pass reads the whole level when stride is 0
+			group_w, group_h = width, height
+			stride = (0.0, 0.0) if technique_name == "Histogram" else (width, height)
+			block_w, block_h = first_block
+			technique = technique_name
+
+			while True:
+				out_w = -(-group_w // block_w)
+				out_h = -(-group_h // block_h)
+
+				target = scratch.acquire(gx * out_w, gy * out_h, REDUCTION_FORMAT)
+				leased.append(target)
+
+				effect.setTexture("reduceMapTexture", source)
+				effect.setFloat4("vSource", group_w, group_h, 1.0 / max(1, source.width >> source_level), 1.0 / max(1, source.height >> source_level))
+				effect.setFloat4("vBlock", block_w, block_h, out_w, out_h)
+				effect.setFloat4("vStride", stride[0], stride[1], gx, source_level)
+
+				Effect.setRenderTarget(target)
+				effect.drawQuad(technique)
+
+				if out_w == 1 and out_h == 1:
+					break
+
+				source, source_level = target, 0
+				group_w, group_h = out_w, out_h
+				stride = (out_w, out_h)
+				block_w, block_h = min(BLOCK, out_w), min(BLOCK, out_h)
+				technique = combine_name
+
+		return arrays.toRgba(REDUCTION_FORMAT, target.toNumpy()).reshape(gy, gx, 4)
+	finally:
+		for texture in leased:
+			scratch.release(texture)
+
+		if pool is None:
+			scratch.clear()
+
+
+def reduce(pyobj, op="sum", level=0, face=0, pool=None):
+	"""(r, g, b, a) sum, min, max or mean of the texels of one level (and cube face)"""
+	_checkSource(pyobj, level, face)
+
+	if op not in OPS:
+		raise ValueError("Unknown reduction %r, expected one of %s" % (op, ", ".join(OPS)))
+
+	width = max(1, pyobj.width >> level)
+	height = max(1, pyobj.height >> level)
+
+	if pyobj.backend.compiles_effects:
+		technique_name = TECHNIQUES[op]
+		block = (min(BLOCK, width), min(BLOCK, height))
+
+		value = _reduceOnDevice(pyobj, level, face, technique_name, technique_name, (1, 1), block, {}, pool)[0, 0].astype(np.float64)
+	else:
+		rgba = _rgba(pyobj, level, face).reshape(-1, 4)
+
+		if op == "min":
+			value = rgba.min(axis=0).astype(np.float64)
+		elif op == "max":
+			value = rgba.max(axis=0).astype(np.float64)
+		else:
+			value = rgba.sum(axis=0, dtype=np.float64)
+
+	if op == "mean":
+		value = value / (width * height)
+
+	return tuple(float(x) for x in value)
+
+
+def histogram(pyobj, bins=256, channel="r", level=0, face=0, pool=None):
+	"""Texel counts of one level (and cube face) in `bins` even ranges of 0..1
+of `channel`: "r", "g", "b", "a" or "l" for luminance.
+"""
+	_checkSource(pyobj, level, face)
+
+	if channel not in CHANNELS:
+		raise ValueError("Unknown channel %r, expected one of %s" % (channel, ", ".join(sorted(CHANNELS))))
+	if bins < 1:
+		raise ValueError("A histogram needs at least one bin")
+
+	if pyobj.backend.compiles_effects:
+		# 4 bins per texel, groups tiled in a square so targets stay as small as the source
+		group_count = -(-bins // 4)
+		gx = int(math.ceil(math.sqrt(group_count)))
+		gy = -(-group_count // gx)
+		block = max(BLOCK, gx, gy)
+
+		params = {"fBins": float(bins), "vChannel": CHANNELS[channel]}
+		counts = _reduceOnDevice(pyobj, level, face, "Histogram", "ReduceSum", (gx, gy), (block, block), params, pool)
+
+		return [int(round(x)) for x in counts.reshape(-1)[:bins]]
+
+	rgba = _rgba(pyobj, level, face)
+	value = np.clip(rgba @ np.array(CHANNELS[channel], np.float32), 0.0, 1.0)
+	index = np.minimum((value * bins).astype(np.int64), bins - 1)
+
+	return np.bincount(index.reshape(-1), minlength=bins).tolist()
@@ -0,0 +1,154 @@
+"""Tiled processing of images larger than a render target.
+
+	fx = Effect.open("filter_demo.fx")
+
+	def highpass(src, dst, tile):
+		fx.setTexture("baseMapTexture", src)
+		with tiler.pool.lease(src.width, src.height, "A8R8G8B8") as low:
+			fx.setRenderTarget(low)
+			fx.drawQuad("LowPass")
+			fx.setTexture("baseMap2Texture", low)
+			fx.setRenderTarget(dst)
+			fx.drawQuad("HighPass")
+
+	source = numpy.load("scan.npy", mmap_mode="r")
+	dest = numpy.lib.format.open_memmap("out.npy", "w+", source.dtype, source.shape)
+
+	tiler = TiledProcessor(highpass, tile_size=4096, apron=5)
+	tiler.run(source, dest)
+
+The source is split into tiles of at most tile_size x tile_size texels.
+Each tile carries `apron` extra texels on every side, so a kernel that
+reads up to `apron` texels away sees the same neighbourhood it would see
+on the whole image, and the stitched output has no seams. Outside the
+image the edge texels are repeated, which matches clamp addressing.
+
+Sources and destinations are arrays in the raw layout of their format
+(see fxproc.arrays). Only one tile of the source is read at a time, so
+with np.memmap / np.load(mmap_mode="r") arrays peak memory is bounded by
+the tile size, not by the image size. A callable `dest(x, y, array)` is
+called with each finished tile instead of writing into an array.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from . import arrays
+from .effect import Effect
+from .pool import TexturePool
+
+# Core rectangle of a tile in the image, and its offset in the tile texture
+Tile = namedtuple("Tile", "x y width height left top")
+
+
+def techniqueChain(effect, techniques, pool, input_name="baseMapTexture"):
+	"""process() running `techniques` one after another, each reading the previous
+result through `input_name`. Intermediate targets come from `pool`.
+"""
+	def process(src, dst, tile):
+		current = src
+		leased = []
+
+		try:
+			for i, technique_name in enumerate(techniques):
+				if i == len(techniques) - 1:
+					target = dst
+				else:
+					target = pool.acquire(src.width, src.height, dst.format)
+					leased.append(target)
+
+				effect.setTexture(input_name, current)
+				effect.setRenderTarget(target)
+				effect.drawQuad(technique_name)
+				current = target
+		finally:
+			for target in leased:
+				pool.release(target)
+
+	return process
+
+
+class TiledProcessor :
+
+	def __init__(self, process, tile_size=4096, apron=0, format_str="A8R8G8B8", out_format=None, pool=None):
+		if tile_size <= 2 * apron:
+			raise ValueError("Tile size %d leaves no room inside an apron of %d" % (tile_size, apron))
+
+		self.process = process
+		self.tile_size = tile_size
+		self.apron = apron
+		self.format = format_str
+		self.out_format = out_format or format_str
+		self.pool = pool or TexturePool()
+
+		self.tiles_done = 0
+
+	def tiles(self, width, height):
+		"""Core rectangles covering a width x height image, row by row"""
+		step = self.tile_size - 2 * self.apron
+
+		for y in range(0, height, step):
+			for x in range(0, width, step):
+				yield Tile(x, y, min(step, width - x), min(step, height - y), self.apron, self.apron)
+
+	def textureSize(self, width, height):
+		"""Size of the tile textures used for a width x height image"""
+		step = self.tile_size - 2 * self.apron
+
+		return min(step, width) + 2 * self.apron, min(step, height) + 2 * self.apron
+
+	def read(self, source, tile, tex_width, tex_height):
+		"""Tile texels of `source` with the apron, edge texels repeated outside the image"""
+		height, width = source.shape[:2]
+
+		x0 = tile.x - tile.left
+		y0 = tile.y - tile.top
+		x1 = x0 + tex_width
+		y1 = y0 + tex_height
+
+		data = np.asarray(source[max(y0, 0):min(y1, height), max(x0, 0):min(x1, width)])
+
+		pad = [(max(-y0, 0), max(y1 - height, 0)), (max(-x0, 0), max(x1 - width, 0))]
+		pad += [(0, 0)] * (data.ndim - 2)
+
+		if any(before or after for before, after in pad):
+			data = np.pad(data, pad, mode="edge")
+
+		return np.ascontiguousarray(data)
+
+	def processTile(self, source, dest, tile, tex_width, tex_height):
+		"""Render one tile of `source` and store its core rectangle in `dest`"""
+		src = Effect.textureFromNumpy(self.read(source, tile, tex_width, tex_height), self.format)
+
+		try:
+			with self.pool.lease(tex_width, tex_height, self.out_format) as dst:
+				self.process(src, dst, tile)
+
+				data = dst.toNumpy()
+		finally:
+			src.release()
+
+		data = data[tile.top:tile.top + tile.height, tile.left:tile.left + tile.width]
+
+		if callable(dest):
+			dest(tile.x, tile.y, data)
+		else:
+			dest[tile.y:tile.y + tile.height, tile.x:tile.x + tile.width] = data
+
+		self.tiles_done += 1
+
+	def run(self, source, dest=None):
+		"""Process every tile of `source`; returns `dest`, a new array if it was None"""
+		kind, width, height, slices = arrays.imageShape(source, self.format, "2d")
+
+		if dest is None:
+			dtype = arrays.layout(self.out_format)[0]
+			dest = np.empty(arrays.pixelShape(self.out_format, width, height), dtype)
+
+		tex_width, tex_height = self.textureSize(width, height)
+
+		for tile in self.tiles(width, height):
+			self.processTile(source, dest, tile, tex_width, tex_height)
+
+		return dest
@@ -0,0 +1,638 @@
+"""Recording device calls to a file and replaying them.
+
+	with Effect.record("job.fxtrace"):
+		fx = Effect.open("filter_demo.fx")
+		...
+
+	replayer = Replayer("job.fxtrace")      # on the current backend
+	seconds = replayer.run()
+
+	with Effect.profile() as prof:         # profile a production job offline
+		replayer.run()
+
+While a Recorder is attached, every state, draw, copy, transfer and
+resource call reaching the backend is written to the trace, with its
+parameter values, triangle and index data, arrays and file contents, so
+the trace needs nothing but itself to run. Calls are recorded as the
+device receives them, after batches have dropped redundant ones.
+
+Resources are numbered in the order they appear. Textures created before
+recording started are stored with their contents when first used, effects
+with their source and #included files. Loaded image files are stored as
+file contents and replayed with loadTextureFromMemory(). Identical data
+(the same triangles drawn every frame) is stored once.
+
+NumPy backend kernels are Python code. They are recorded by module and
+qualified name when they can be imported back, other kernels have to be
+given to the Replayer in `kernels`, {technique name: kernel}. Backends that
+compile effects ignore them.
+
+The Replayer decodes the whole trace up front, and run() only issues the
+calls. Saved files go to `output_dir` when one is given, otherwise
+saveTexture encodes to memory. Readbacks are done and dropped. Everything
+the trace leaves alive is released at the end of each run.
+
+The file is FILE_MAGIC followed by records: data blobs, effect sources and
+calls, each starting with a one byte tag.
+"""
+
+import os
+import array
+import ctypes
+import struct
+import hashlib
+import numbers
+import zlib
+import time
+import tempfile
+import importlib
+
+from .d3dtypes import TRI_VTX, D3DXIMAGE_FILEFORMAT
+from .backend import getBackend
+from .effect import Effect, handleKey, _sync
+from .effect_cache import includedFiles
+
+# Method codes are indices into the sorted command names, new commands change the version
+FILE_MAGIC = b"FXTRACE2"
+
+# method -> (argument kinds, kind of the handle returned)
+#   x value, t texture, l textures, e effect, b buffer (or None), v triangle data,
+#   i index data, f float data, a NumPy array, y bytes, k kernel, o output array (not recorded)
+COMMANDS = {
+	"createTexture": ("xxxxxx", "t"),
+	"releaseTexture": ("t", None),
+	"loadTextureFromMemory": ("yx", "t"),
+	"saveTexture": ("txx", None),
+	"saveTextureToMemory": ("tx", None),
+	"readTexture": ("txxo", None),
+	"writeTexture": ("taxx", None),
+	"createTextureFromArray": ("xaxx", "t"),
+	"copyLevel": ("txxtxxx", None),
+	"copyLevelToVolumeSlice": ("txxtxx", None),
+	"registerTechnique": ("exk", None),
+	"releaseEffect": ("e", None),
+	"setRenderTarget": ("txx", None),
+	"setRenderTargets": ("lxx", None),
+	"clear": ("xxxx", None),
+	"drawQuad": ("exx", None),
+	"drawTris": ("evxx", None),
+	"drawBuffer": ("ebxbxxxx", None),
+	"createVertexBuffer": ("vxx", "b"),
+	"updateVertexBuffer": ("bvxx", None),
+	"createIndexBuffer": ("ixxx", "b"),
+	"updateIndexBuffer": ("bixxx", None),
+	"releaseBuffer": ("b", None),
+	"endScene": ("", None),
+	"flush": ("", None),
+	"setFloat": ("exx", None),
+	"setInt": ("exx", None),
+	"setVector": ("exxxxx", None),
+	"setFloatArray": ("exfx", None),
+	"setVectorArray": ("exfx", None),
+	"setMatrix": ("exf", None),
+	"setTexture": ("ext", None),
+	}
+
+METHODS = sorted(COMMANDS)
+METHOD_CODES = dict((name, code) for code, name in enumerate(METHODS))
+
+RELEASE_METHODS = {"t": "releaseTexture", "e": "releaseEffect", "b": "releaseBuffer"}
+RELEASED_BY = set(RELEASE_METHODS.values())
+
+# Calls intercepted on the backend; loadTexture is recorded as loadTextureFromMemory
+INTERCEPTED = METHODS + ["loadTexture"]
+
+
+class Ref :
+	"""A resource number in a trace"""
+	__slots__ = ("id",)
+
+	def __init__(self, id):
+		self.id = id
+
+
+class Blob :
+	"""A data blob number in a trace"""
+	__slots__ = ("id",)
+
+	def __init__(self, id):
+		self.id = id
+
+
+def _pack(out, value):
+	if value is None:
+		out.append(b"N")
+	elif value is True:
+		out.append(b"T")
+	elif value is False:
+		out.append(b"F")
+	elif isinstance(value, Ref):
+		out.append(b"r" + struct.pack("<I", value.id))
+	elif isinstance(value, Blob):
+		out.append(b"d" + struct.pack("<I", value.id))
+	elif isinstance(value, numbers.Integral):
+		out.append(b"i" + struct.pack("<q", int(value)))
+	elif isinstance(value, numbers.Real):
+		out.append(b"f" + struct.pack("<d", float(value)))
+	elif isinstance(value, str):
+		data = value.encode('utf-8')
+		out.append(b"s" + struct.pack("<I", len(data)) + data)
+	elif isinstance(value, bytes):
+		out.append(b"y" + struct.pack("<I", len(value)) + value)
+	elif isinstance(value, (tuple, list)):
+		out.append(b"t" + struct.pack("<I", len(value)))
+		for item in value:
+			_pack(out, item)
+	elif isinstance(value, dict):
+		out.append(b"m" + struct.pack("<I", len(value)))
+		for item in sorted(value.items()):
+			_pack(out, item)
+	else:
+		raise TypeError("Can't record value %r" % (value,))
+
+
+class _Reader :
+
+	def __init__(self, data):
+		self.data = data
+		self.pos = 0
+
+	def take(self, size):
+		start = self.pos
+		self.pos += size
+
+		if self.pos > len(self.data):
+			raise IOError("Trace is truncated")
+
+		return self.data[start:self.pos]
+
+	def unpack(self, fmt):
+		return struct.unpack(fmt, self.take(struct.calcsize(fmt)))
+
+	def value(self):
+		tag = self.take(1)
+
+		if tag == b"N":
+			return None
+		if tag == b"T":
+			return True
+		if tag == b"F":
+			return False
+		if tag == b"r":
+			return Ref(self.unpack("<I")[0])
+		if tag == b"d":
+			return Blob(self.unpack("<I")[0])
+		if tag == b"i":
+			return self.unpack("<q")[0]
+		if tag == b"f":
+			return self.unpack("<d")[0]
+		if tag == b"s":
+			return bytes(self.take(self.unpack("<I")[0])).decode('utf-8')
+		if tag == b"y":
+			return bytes(self.take(self.unpack("<I")[0]))
+		if tag == b"t":
+			return tuple(self.value() for i in range(self.unpack("<I")[0]))
+		if tag == b"m":
+			return dict(self.value() for i in range(self.unpack("<I")[0]))
+
+		raise IOError("Bad value tag %r in trace" % (bytes(tag)))
+
+
+def kernelName(kernel):
+	""""module:qualname" a kernel can be imported back with, None if it can't"""
+	module_name = getattr(kernel, "__module__", None)
+	qualname = getattr(kernel, "__qualname__", "")
+
+	if not module_name or module_name == "__main__" or "<" in qualname:
+		return None
+
+	try:
+		obj = importlib.import_module(module_name)
+		for part in qualname.split("."):
+			obj = getattr(obj, part)
+	except (ImportError, AttributeError):
+		return None
+
+	return module_name + ":" + qualname if obj is kernel else None
+
+
+def importKernel(name):
+	module_name, qualname = name.split(":")
+	obj = importlib.import_module(module_name)
+
+	for part in qualname.split("."):
+		obj = getattr(obj, part)
+
+	return obj
+
+
+class Recorder :
+
+	def __init__(self, file_name, backend=None):
+		self.file_name = file_name
+		self.backend = backend or getBackend()
+
+		self.file = None
+		self.depth = 0
+
+		# handle key -> resource number
+		self.ids = {}
+		self.next_id = 1
+
+		# sha1 -> blob number
+		self.blobs = {}
+
+		self.calls = 0
+		self.data_bytes = 0
+
+	def __str__(self):
+		return (
+			"calls=" + str(self.calls) +
+			" resources=" + str(self.next_id - 1) +
+			" blobs=" + str(len(self.blobs)) +
+			" data_bytes=" + str(self.data_bytes) +
+			" file=" + '"' + self.file_name + '"'
+			)
+
+	def __enter__(self):
+		if self.backend.recorder is not None:
+			raise RuntimeError("A recorder is already attached to this device")
+
+		_sync(self.backend)
+
+		self.file = open(self.file_name, "wb")
+		self.file.write(FILE_MAGIC)
+
+		self.backend.recorder = self
+		for name in INTERCEPTED:
+			setattr(self.backend, name, self.__intercept(name, getattr(self.backend, name)))
+
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		try:
+			_sync(self.backend)
+		finally:
+			for name in INTERCEPTED:
+				delattr(self.backend, name)
+
+			self.backend.recorder = None
+			self.file.close()
+
+	def __intercept(self, name, method):
+		def call(*args):
+			# Calls the backend makes to itself are part of the outer call,
+			# resources released before they were ever recorded aren't needed
+			if self.depth or (name in RELEASED_BY and handleKey(args[0]) not in self.ids):
+				return method(*args)
+
+			self.depth += 1
+			try:
+				record_name, record_args = self.__arguments(name, args)
+				result = method(*args)
+				self.__command(record_name, record_args, result)
+
+				if name in RELEASED_BY:
+					self.ids.pop(handleKey(args[0]), None)
+			finally:
+				self.depth -= 1
+
+			return result
+
+		return call
+
+	def __newId(self, handle):
+		resource_id = self.next_id
+		self.next_id += 1
+		self.ids[handleKey(handle)] = resource_id
+
+		return resource_id
+
+	def __blob(self, data):
+		data = bytes(data)
+		digest = hashlib.sha1(data).digest()
+
+		blob_id = self.blobs.get(digest)
+		if blob_id is None:
+			blob_id = self.blobs[digest] = len(self.blobs) + 1
+
+			packed = zlib.compress(data, 1)
+			compressed = len(packed) < len(data)
+			if not compressed:
+				packed = data
+
+			self.file.write(b"D" + struct.pack("<IBQ", blob_id, compressed, len(packed)))
+			self.file.write(packed)
+			self.data_bytes += len(packed)
+
+		return Blob(blob_id)
+
+	def __arguments(self, name, args):
+		"""(method, arguments) to record for a call, with handles and data replaced"""
+		if name == "loadTexture":
+			with open(args[0], "rb") as f:
+				name, args = "loadTextureFromMemory", (f.read(),) + tuple(args[1:])
+
+		kinds = COMMANDS[name][0]
+		recorded = []
+
+		for kind, value in zip(kinds, args):
+			if kind in "teb" and value is not None:
+				value = self.__resource(kind, value, name)
+			elif kind == "l":
+				value = tuple(self.__resource("t", handle, name) for handle in value)
+			elif kind == "v" or kind == "f":
+				value = self.__blob(memoryview(value).tobytes())
+			elif kind == "i":
+				view = memoryview(value)
+				value = (view.itemsize, self.__blob(view.tobytes()))
+			elif kind == "a":
+				import numpy as np
+				data = np.ascontiguousarray(value)
+				value = (data.dtype.str, data.shape, self.__blob(data.tobytes()))
+			elif kind == "y":
+				value = self.__blob(value)
+			elif kind == "k":
+				value = kernelName(value)
+			elif kind == "o":
+				value = None
+
+			recorded.append(value)
+
+		return name, tuple(recorded)
+
+	def __resource(self, kind, handle, method):
+		resource_id = self.ids.get(handleKey(handle))
+
+		if resource_id is None:
+			if kind == "t":
+				resource_id = self.__snapshotTexture(handle)
+			elif kind == "e":
+				resource_id = self.__effectSource(handle)
+			else:
+				raise RuntimeError("Buffer used by %s was created before recording started" % (method))
+
+		return Ref(resource_id)
+
+	def __snapshotTexture(self, handle):
+		kind, format_str, width, height, levels, slices = self.backend.describeTexture(handle)
+		resource_id = self.__newId(handle)
+
+		try:
+			contents = [(level, face, self.backend.readTexture(handle, level, face))
+				for level in range(levels) for face in range(6 if kind == "cube" else 1)]
+		except TypeError:
+			# No NumPy layout for the format, keep it as a DDS file
+			dds = self.backend.saveTextureToMemory(handle, D3DXIMAGE_FILEFORMAT.by_str["dds"])
+			self.__write("loadTextureFromMemory", (self.__blob(dds), levels), resource_id)
+			return resource_id
+
+		self.__write("createTexture", (kind, width, height, format_str, levels, slices), resource_id)
+
+		for level, face, data in contents:
+			self.__write("writeTexture", (Ref(resource_id), (data.dtype.str, data.shape, self.__blob(data.tobytes())), level, face))
+
+		return resource_id
+
+	def __effectSource(self, handle):
+		entry = Effect.all_effects.get(handleKey(handle))
+		alive = entry[0].peek() if entry is not None else None
+		effect = alive[0] if alive is not None else None
+
+		if effect is None or effect.origin is None:
+			raise RuntimeError("Effect has no source to record, only effects from Effect.open() or fromstring() can be")
+
+		fx_name, text, defines, optimize = effect.origin
+
+		if fx_name is not None:
+			fx_name = os.path.abspath(fx_name)
+			with open(fx_name, "rb") as f:
+				source = f.read()
+			files = [(fx_name, source)] + includedFiles(source, os.path.dirname(fx_name))
+		else:
+			files = includedFiles(text.encode('ascii'), os.getcwd())
+
+		resource_id = self.__newId(handle)
+
+		out = [b"E" + struct.pack("<I", resource_id)]
+		_pack(out, (fx_name, text, defines, optimize, os.getcwd(), tuple((path, self.__blob(data)) for path, data in files)))
+		self.file.write(b"".join(out))
+
+		# Kernels registered before recording started
+		for technique_name, kernel in sorted(effect.kernels.items()):
+			self.__write("registerTechnique", (Ref(resource_id), technique_name, kernelName(kernel)))
+
+		return resource_id
+
+	def __write(self, name, args, result_id=0):
+		out = [b"C" + struct.pack("<BI", METHOD_CODES[name], result_id)]
+		_pack(out, args)
+		self.file.write(b"".join(out))
+
+		self.calls += 1
+
+	def __command(self, name, args, result):
+		result_kind = COMMANDS[name][1]
+		result_id = self.__newId(result) if result_kind is not None else 0
+
+		self.__write(name, args, result_id)
+
+
+class Replayer :
+
+	def __init__(self, file_name, backend=None, kernels=None, output_dir=None):
+		self.file_name = file_name
+		self.backend = backend or getBackend()
+		self.kernels = dict(kernels or {})
+		self.output_dir = output_dir
+
+		# (function(args), args, positions of resource numbers in args, result number)
+		self.commands = []
+		self.effects = {}
+		self.blobs = {}
+
+		# Where effect sources are written during a run
+		self.directory = None
+
+		self.runs = 0
+		self.seconds = 0.0
+
+		self.__load()
+
+	def __str__(self):
+		return (
+			"commands=" + str(len(self.commands)) +
+			" effects=" + str(len(self.effects)) +
+			" runs=" + str(self.runs) +
+			" seconds=" + str(self.seconds) +
+			" file=" + '"' + self.file_name + '"'
+			)
+
+	def __load(self):
+		with open(self.file_name, "rb") as f:
+			reader = _Reader(memoryview(f.read()))
+
+		if bytes(reader.take(len(FILE_MAGIC))) != FILE_MAGIC:
+			raise IOError('"%s" is not an fxproc trace' % (self.file_name))
+
+		kinds = {}
+		released = set()
+
+		while reader.pos < len(reader.data):
+			tag = reader.take(1)
+
+			if tag == b"D":
+				blob_id, compressed, size = reader.unpack("<IBQ")
+				data = reader.take(size)
+				self.blobs[blob_id] = zlib.decompress(data) if compressed else bytes(data)
+
+			elif tag == b"E":
+				effect_id = reader.unpack("<I")[0]
+				self.effects[effect_id] = reader.value()
+				self.commands.append((self.__openEffect, (effect_id,), (), effect_id))
+				kinds[effect_id] = "e"
+
+			elif tag == b"C":
+				code, result_id = reader.unpack("<BI")
+				name = METHODS[code]
+				args = reader.value()
+
+				if name in RELEASED_BY:
+					released.add(args[0].id)
+				if result_id:
+					kinds[result_id] = COMMANDS[name][1]
+
+				command = self.__command(name, args, result_id)
+				if command is not None:
+					self.commands.append(command)
+
+			else:
+				raise IOError("Bad record tag %r in trace" % (bytes(tag)))
+
+		# What the trace leaves alive, released after each run
+		self.leftover = [(RELEASE_METHODS[kind], resource_id) for resource_id, kind in sorted(kinds.items()) if resource_id not in released]
+
+	def __command(self, name, args, result_id):
+		kinds = COMMANDS[name][0]
+		decoded = []
+		refs = []
+
+		if name == "registerTechnique" and self.backend.compiles_effects:
+			return None
+
+		for i, (kind, value) in enumerate(zip(kinds, args)):
+			if isinstance(value, Ref):
+				refs.append(i)
+				value = value.id
+			elif kind == "l":
+				refs.append(i)
+				value = tuple(ref.id for ref in value)
+			elif kind == "v":
+				data = self.blobs[value.id]
+				value = (TRI_VTX * (len(data) // ctypes.sizeof(TRI_VTX))).from_buffer_copy(data)
+			elif kind == "i":
+				itemsize, blob = value
+				data = self.blobs[blob.id]
+				value = ((ctypes.c_uint16 if itemsize == 2 else ctypes.c_uint32) * (len(data) // itemsize)).from_buffer_copy(data)
+			elif kind == "f":
+				floats = array.array('f')
+				floats.frombytes(self.blobs[value.id])
+				value = floats
+			elif kind == "a":
+				import numpy as np
+				dtype, shape, blob = value
+				value = np.frombuffer(bytearray(self.blobs[blob.id]), dtype).reshape(shape)
+			elif kind == "y":
+				value = self.blobs[value.id]
+			elif kind == "k":
+				value = self.__kernel(args[1], value)
+
+			decoded.append(value)
+
+		run = self.backend.run
+
+		if name == "saveTexture":
+			if self.output_dir:
+				decoded[1] = os.path.join(self.output_dir, os.path.basename(decoded[1]))
+			else:
+				name = "saveTextureToMemory"
+				decoded = [decoded[0], decoded[2]]
+
+		return (lambda args, name=name: run(name, args)), tuple(decoded), tuple(refs), result_id
+
+	def __kernel(self, technique_name, name):
+		kernel = self.kernels.get(technique_name)
+
+		if kernel is None and name is not None:
+			try:
+				kernel = importKernel(name)
+			except (ImportError, AttributeError):
+				pass
+
+		if kernel is None:
+			raise ValueError('No kernel for technique "%s", pass it in kernels' % (technique_name))
+
+		return kernel
+
+	def __openEffect(self, args):
+		fx_name, text, defines, optimize, cwd, files = self.effects[args[0]]
+
+		if fx_name is None and not files:
+			return Effect.cache.createEffect(self.backend, text, defines, optimize)
+
+		# Write the sources where their #includes find each other
+		paths = [path for path, blob in files] + ([os.path.join(cwd, "string.fx")] if fx_name is None else [])
+		root = os.path.commonpath([os.path.dirname(path) for path in paths])
+
+		for path, blob in files:
+			local = os.path.join(self.directory, os.path.relpath(path, root))
+			os.makedirs(os.path.dirname(local), exist_ok=True)
+
+			with open(local, "wb") as f:
+				f.write(self.blobs[blob.id])
+
+		if fx_name is None:
+			local = os.path.join(self.directory, os.path.relpath(paths[-1], root))
+			os.makedirs(os.path.dirname(local), exist_ok=True)
+
+			with open(local, "wb") as f:
+				f.write(text.encode('ascii'))
+		else:
+			local = os.path.join(self.directory, os.path.relpath(fx_name, root))
+
+		return Effect.cache.openEffect(self.backend, local, defines, optimize)
+
+	def run(self):
+		"""Issue every recorded call once; returns the seconds it took"""
+		handles = {}
+
+		with tempfile.TemporaryDirectory(prefix="fxtrace") as directory:
+			self.directory = directory
+			start = time.perf_counter()
+
+			try:
+				for function, args, refs, result_id in self.commands:
+					if refs:
+						args = list(args)
+						for i in refs:
+							if type(args[i]) is tuple:
+								args[i] = tuple(handles[x] for x in args[i])
+							else:
+								args[i] = handles[args[i]]
+
+					result = function(args)
+
+					if result_id:
+						handles[result_id] = result
+			finally:
+				for method, resource_id in self.leftover:
+					handle = handles.get(resource_id)
+					if handle is not None:
+						getattr(self.backend, method)(handle)
+
+			seconds = time.perf_counter() - start
+
+		self.runs += 1
+		self.seconds += seconds
+
+		return seconds